@@ -0,0 +1,103 @@
+"""
+Scaling of modify_trade_list on synthetic trade files.
+
+    python -m benchmarks.bench_modify_trade_list --sizes 1000 10000 100000
+
+The old quadratic implementation is kept here as a reference and is only run
+up to --quadratic-max fills, past that it takes minutes.
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import write_trade_files
+from src.data_processing import add_cum_qty, calculate_pnl_2, get_common_cum_qty, modify_trade_list
+
+
+def modify_trade_list_quadratic(common_cum_qtys, trade_list):
+    # modify_trade_list before it walked both lists with two cursors
+    for common_cum_qty in common_cum_qtys:
+        for i in range(len(trade_list)):
+            cum_qty = trade_list[i]['cum_qty']
+            if common_cum_qty == cum_qty:
+                break
+            if common_cum_qty < cum_qty:
+                diff = cum_qty - common_cum_qty
+                price = trade_list[i]['price']
+                qty = trade_list[i]['qty']
+                commission = trade_list[i]['commission']
+                trade_list[i]['qty'] = qty - diff
+                trade_list[i]['commission'] = commission * ((qty - diff) / qty)
+                trade_list[i]['quoteQty'] = price * trade_list[i]['qty']
+                trade_list[i]['cum_qty'] = cum_qty - diff
+                trade_list.insert(i + 1, {
+                    "symbol": trade_list[i]['symbol'],
+                    "open_time": trade_list[i]['open_time'],
+                    "cum_qty": cum_qty,
+                    "qty": diff,
+                    "price": price,
+                    "quoteQty": price * diff,
+                    "commission": commission * (diff / qty),
+                    "commissionAsset": trade_list[i]['commissionAsset'],
+                })
+                break
+
+
+def load_orders(path):
+    trades = pd.read_csv(path).sort_values('datetime', kind='mergesort')
+    orders = {'sell': [], 'buy': []}
+    for row in trades.itertuples(index=False):
+        orders[row.side].append({
+            'symbol': row.symbol,
+            'qty': float(row.qty),
+            'price': float(row.price),
+            'commission': float(row.commission),
+            'quoteQty': float(row.quoteQty),
+            'commissionAsset': row.commissionAsset,
+            'open_time': row.datetime,
+        })
+    return add_cum_qty(orders['sell']), add_cum_qty(orders['buy'])
+
+
+def time_split(split, sell_orders, buy_orders):
+    sell_orders, buy_orders = copy.deepcopy(sell_orders), copy.deepcopy(buy_orders)
+    common_cum_qty = get_common_cum_qty(sell_orders, buy_orders)
+    started = time.perf_counter()
+    split(common_cum_qty, sell_orders)
+    split(common_cum_qty, buy_orders)
+    return time.perf_counter() - started, sell_orders, buy_orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--quadratic-max', type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'fills':>8} {'linear s':>10} {'quadratic s':>12} {'calculate_pnl_2 s':>18}")
+        for n_fills in args.sizes:
+            path, = write_trade_files(os.path.join(folder, str(n_fills)), n_fills)
+            sell_orders, buy_orders = load_orders(path)
+
+            linear, sells, buys = time_split(modify_trade_list, sell_orders, buy_orders)
+
+            quadratic = float('nan')
+            if n_fills <= args.quadratic_max:
+                quadratic, ref_sells, ref_buys = time_split(modify_trade_list_quadratic, sell_orders, buy_orders)
+                assert sells == ref_sells and buys == ref_buys
+
+            trades = pd.read_csv(path)
+            started = time.perf_counter()
+            calculate_pnl_2(trades)
+            vectorized = time.perf_counter() - started
+
+            print(f"{n_fills:>8} {linear:>10.3f} {quadratic:>12.3f} {vectorized:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Timings of the report pipeline stages on synthetic data, saved as JSON.
+
+    python -m benchmarks.bench_pipeline --sizes 1000 100000 1000000
+    python -m benchmarks.bench_pipeline --sizes 1000 100000 --compare benchmarks/results/<commit>.json
+
+Stages, each at every size (fills per run):
+    calculate_pnl_2   lot matching of one symbol's fills
+    gbp_conversion    rate lookups and exact Decimal GBP columns (main.add_gbp_values)
+    interest          allocation of hourly margin interest to lots (main.allocate_interest)
+    pdf               generate_uk_crypto_tax_pdf_report
+
+Results go to benchmarks/results/<commit>.json unless --output is given.
+The pdf stage is slow past 100k lots (over ten minutes at 1M).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_trades
+from main import add_gbp_values, allocate_interest
+from src.data_processing import calculate_pnl_2
+from src.gbp_conversion import convert_interest_to_gbp
+from src.price_series import write_price_series
+from src.report_generation import generate_uk_crypto_tax_pdf_report
+
+STAGES = ['calculate_pnl_2', 'gbp_conversion', 'interest', 'pdf']
+RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def make_rates(folder, start, end, seed=0):
+    """Minute BNB/USDT and daily USD/GBP series covering start..end."""
+    rng = np.random.default_rng(seed)
+    minutes = pd.date_range(start.floor('D'), end.ceil('D'), freq='min')
+    days = pd.date_range(start.floor('D') - pd.Timedelta(days=7), end.ceil('D'), freq='D')
+    bnb_usdt = write_price_series(os.path.join(folder, 'bnb_usdt'), minutes,
+                                  600 * np.exp(np.cumsum(rng.normal(0, 1e-4, len(minutes)))))
+    usd_gbp = write_price_series(os.path.join(folder, 'usd_gbp'), days, 0.78 + 0.01 * rng.random(len(days)))
+    return usd_gbp, bnb_usdt
+
+
+def make_interest(start, end, usd_gbp, bnb_usdt):
+    """Hourly BNB interest over start..end, converted to GBP like get_report does."""
+    hours = pd.date_range(start.floor('h'), end.ceil('h'), freq='h').astype('datetime64[ns]')
+    interest = pd.DataFrame({'interestAccuredTime': hours, 'asset': 'BNB', 'interest': 1e-6})
+    interest['bnb_usdt'] = bnb_usdt.asof(interest['interestAccuredTime'])
+    interest['usd_to_gbp'] = usd_gbp.asof(interest['interestAccuredTime'])
+    return convert_interest_to_gbp(interest)
+
+
+def timed(func, *args, repeat=1):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run_size(n_fills, stages, folder, repeat):
+    trades = make_trades(n_fills, seed=n_fills)
+    start, end = trades['datetime'].min(), trades['datetime'].max()
+    usd_gbp, bnb_usdt = make_rates(folder, start, end)
+    results = []
+
+    seconds, (lots, _) = timed(calculate_pnl_2, trades, repeat=repeat)
+    lots = pd.DataFrame(lots)
+    if 'calculate_pnl_2' in stages:
+        results.append({'stage': 'calculate_pnl_2', 'rows': n_fills, 'seconds': seconds})
+
+    lots['market'] = 'margin'
+    lots['exchange'] = 'BINANCE'
+    seconds, converted = timed(lambda: add_gbp_values(lots.copy(), usd_gbp, bnb_usdt), repeat=repeat)
+    if 'gbp_conversion' in stages:
+        results.append({'stage': 'gbp_conversion', 'rows': len(lots), 'seconds': seconds})
+
+    if 'interest' in stages or 'pdf' in stages:
+        interest = make_interest(start, end, usd_gbp, bnb_usdt)
+        seconds, combined = timed(allocate_interest, converted, interest, repeat=repeat)
+        if 'interest' in stages:
+            results.append({'stage': 'interest', 'rows': len(converted), 'interest_rows': len(interest),
+                            'seconds': seconds})
+
+    if 'pdf' in stages:
+        path = os.path.join(folder, 'report.pdf')
+        seconds, _ = timed(lambda: generate_uk_crypto_tax_pdf_report(combined.copy(), output_path=path))
+        results.append({'stage': 'pdf', 'rows': len(combined), 'seconds': seconds})
+
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['stage'], r['fills']): r['seconds'] for r in json.load(f)['results']}
+    print(f"\n{'stage':<16} {'fills':>9} {'baseline s':>11} {'now s':>9} {'ratio':>7}")
+    for r in results:
+        before = baseline.get((r['stage'], r['fills']))
+        if before:
+            print(f"{r['stage']:<16} {r['fills']:>9} {before:>11.3f} {r['seconds']:>9.3f} {r['seconds'] / before:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage, the fastest is kept')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='earlier results JSON to print ratios against')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for n_fills in args.sizes:
+            for r in run_size(n_fills, args.stages, folder, args.repeat):
+                r['fills'] = n_fills
+                print(f"{r['stage']:<16} {r['fills']:>9} fills {r['rows']:>9} rows {r['seconds']:>9.3f} s")
+                results.append(r)
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f'{commit}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=1)
+    print(f"Saved to: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def make_trades(n_fills, symbol='CTXCUSDT', seed=0, start='2024-04-06'):
+    """
+    Synthetic trade history shaped like a Binance myTrades export.
+
+    Orders alternate sell/buy and each order is filled in several partial
+    fills with the same timestamp, like the multi-fill orders in
+    tests/test_data_processing.py. Both sides trade the same total quantity
+    so every fill gets matched.
+    """
+    rng = np.random.default_rng(seed)
+
+    fills_per_order = rng.integers(1, 40, size=n_fills)
+    order_of_fill = np.repeat(np.arange(len(fills_per_order)), fills_per_order)[:n_fills]
+    n_orders = order_of_fill[-1] + 1
+
+    side = np.where(order_of_fill % 2 == 0, 'sell', 'buy')
+    qty = rng.integers(1, 2000, size=n_fills).astype(float)
+
+    # make the buy side close exactly what the sell side opened
+    sell_total = qty[side == 'sell'].sum()
+    buy_total = qty[side == 'buy'].sum()
+    last_buy = np.flatnonzero(side == 'buy')[-1]
+    last_sell = np.flatnonzero(side == 'sell')[-1]
+    if buy_total < sell_total:
+        qty[last_buy] += sell_total - buy_total
+    else:
+        qty[last_sell] += buy_total - sell_total
+
+    order_time = pd.Timestamp(start) + pd.to_timedelta(
+        np.cumsum(rng.integers(1_000, 3_600_000, size=n_orders)), unit='ms')
+    price = np.round(0.3 * np.exp(np.cumsum(rng.normal(0, 0.002, size=n_orders))), 4)[order_of_fill]
+    price = price + np.round(rng.integers(-3, 4, size=n_fills) * 0.0001, 4)
+    commission_asset = np.where(rng.random(n_fills) < 0.9, 'BNB', 'USDT')
+    commission = np.where(commission_asset == 'BNB', qty * price * 1e-6, qty * price * 1e-3)
+
+    return pd.DataFrame({
+        'datetime': order_time[order_of_fill],
+        'symbol': symbol,
+        'side': side,
+        'price': price,
+        'qty': qty,
+        'quoteQty': price * qty,
+        'commission': np.round(commission, 8),
+        'commissionAsset': commission_asset,
+        'orderId': 500_000_000 + order_of_fill,
+    })
+
+
+def write_trade_files(folder, n_fills, n_symbols=1, seed=0):
+    """Write one synthetic trades CSV per symbol into folder, like ./data/raw/<market>."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(n_symbols):
+        symbol = f'SYN{i}USDT'
+        path = os.path.join(folder, f'{symbol}_margin_trades.csv')
+        make_trades(n_fills, symbol=symbol, seed=seed + i).to_csv(path, index=False)
+        paths.append(path)
+    return paths
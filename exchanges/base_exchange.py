@@ -1,8 +1,29 @@
 from abc import ABC, abstractmethod
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+from src.trade_store import FILL_SCHEMA, fills_frame
+
 
 class BaseExchange(ABC):
+    """
+    What the report pipeline needs from an exchange.
+
+    An adapter implements fetch_trades, yielding its fills as Arrow record
+    batches in the one FILL_SCHEMA (symbol, datetime, id, orderId, side
+    'buy'/'sell', price, qty, quoteQty, commission, commissionAsset,
+    realizedPnl), so the store and the PnL engine take them as they are.
+    """
+
+    schema = FILL_SCHEMA
+
     @abstractmethod
-    def get_trades(self, symbol: str, start_time: str, end_time: str):
+    def fetch_trades(self, symbols, start: str, end: str, market: str = 'spot') -> Iterator[pa.RecordBatch]:
+        """Fills of each symbol from start to end (inclusive dates) as FILL_SCHEMA record batches."""
         pass
 
-
+    def get_trades(self, symbol: str, start_time: str, end_time: str, market: str = 'spot') -> pd.DataFrame:
+        """All fills of one symbol as a DataFrame in FILL_SCHEMA columns."""
+        return fills_frame(self.fetch_trades([symbol], start_time, end_time, market=market))
@@ -4,12 +4,19 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 import pandas as pd
-import requests
+import pyarrow as pa
 
 from exchanges.base_exchange import BaseExchange
+from exchanges.downloads import stream_download
+from exchanges.fetch_scheduler import (ENDPOINT_WEIGHTS, INVALID_SYMBOL, RATE_LIMIT_STATUS, WeightRateLimiter,
+                                      fetch_symbols, retry_after)
+from exchanges.windowing import DAY_MS, fetch_adaptive
+from src.archive_ingest import ingest_trade_archive
+from src.price_cache import MINUTE_MS, PriceCache
+from src.sync_manifest import SyncManifest
+from src.trade_store import FILL_SCHEMA, list_symbols, read_trades, write_trades
 from binance.spot import Spot
 from binance.um_futures import UMFutures
-from ratelimit import limits, sleep_and_retry
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -18,62 +25,75 @@ from selenium.webdriver.common.by import By
 
 
 
-from binance.error import ClientError
+
+
+def binance_fill_batch(rows, symbol) -> pa.RecordBatch:
+    """Spot, margin or futures fills as the Binance API returns them, as one FILL_SCHEMA batch."""
+    def column(key, type_):
+        return pa.array([row.get(key) for row in rows]).cast(type_)
+
+    # spot and margin fills flag the buyer, futures fills carry the side
+    sides = [('buy' if row['isBuyer'] else 'sell') if 'isBuyer' in row else str(row['side']).lower() for row in rows]
+    return pa.RecordBatch.from_arrays([
+        pa.array([symbol] * len(rows), pa.string()),
+        column('time', pa.int64()).cast(pa.timestamp('ms')),
+        column('id', pa.int64()),
+        column('orderId', pa.int64()),
+        pa.array(sides, pa.string()),
+        column('price', pa.float64()),
+        column('qty', pa.float64()),
+        column('quoteQty', pa.float64()),
+        column('commission', pa.float64()),
+        column('commissionAsset', pa.string()),
+        column('realizedPnl', pa.float64()),
+    ], schema=FILL_SCHEMA)
 
 
 class BinanceExchange(BaseExchange):
     def __init__(self, api_key, api_secret, start_time, end_time):
         self.client = Spot(api_key=api_key, api_secret=api_secret)
         self.futures_client = UMFutures(key=api_key, secret=api_secret)
+        # one request weight budget shared by every fetch, whichever thread it runs on
+        self.rate_limiter = WeightRateLimiter()
+        self.price_cache = PriceCache()
 
         self.start_time = start_time
         self.end_time = end_time
 
-    def get_trades(self, symbol, start, end):
-
-        ...
-
-    @sleep_and_retry
-    @limits(calls=600, period=60)
-    def get_price_minute(self, asset1, asset2):
-        start_date = self.start_time
-        end_date = self.end_time
-        symbol = str(asset1).upper() + str(asset2).upper()
-        interval = '1m'
-        limit = 1000
+    def fetch_trades(self, symbols, start, end, market='spot'):
+        """
+        Fills of each symbol in [start, end] (dates) for market spot, margin or
+        futures, one FILL_SCHEMA record batch per symbol that traded.
+        """
+        start_ms = int(datetime.strptime(start, "%Y-%m-%d").timestamp() * 1000)
+        end_ms = int((datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        for symbol in symbols:
+            if market == 'futures':
+                def fetch(window_start, window_end):
+                    return self._fetch_with_retry(self.futures_client.get_account_trades, symbol=symbol,
+                                                  startTime=window_start, endTime=window_end, limit=1000)
 
-        start_ts = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
-        end_ts = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000)
+                def fetch_from_id(from_id):
+                    return self._fetch_with_retry(self.futures_client.get_account_trades, symbol=symbol,
+                                                  fromId=from_id, limit=1000)
 
-        all_klines = []
+                rows = fetch_adaptive(fetch, start_ms, end_ms, 1000, 7 * DAY_MS, fetch_from_id=fetch_from_id)
+            else:
+                method, limit = {'spot': ('my_trades', 1000), 'margin': ('margin_my_trades', 500)}[market]
+                rows = self._fetch_trades_adaptive(getattr(self.client, method), symbol, start_ms, end_ms, limit)
+            if rows:
+                yield binance_fill_batch(rows, symbol)
 
-        while start_ts < end_ts:
-            try:
-                klines = self.client.klines(
-                    symbol=symbol,
-                    interval=interval,
-                    startTime=start_ts,
-                    endTime=min(start_ts + limit * 60_000, end_ts),
-                    limit=limit
-                )
-                if not klines:
-                    break
-                all_klines.extend(klines)
-                start_ts = klines[-1][0] + 60_000  # next minute
-                print(pd.to_datetime(start_ts, unit='ms'))
+    def get_price_minute(self, asset1, asset2):
+        """
+        Minute closes of asset1/asset2 for the report period, also written to ./data/<a>_<b>.csv.
 
-            except Exception as e:
-                print(f"Error: {e}")
-                time.sleep(1)
-
-        df = pd.DataFrame(all_klines, columns=[
-            'open_time', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'number_of_trades',
-            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-        ])
-        df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
-        df = df[['datetime', 'close']]
-        df['close'] = df['close'].astype(float)
+        Klines come from the local PriceCache; only minutes it has not covered
+        yet are requested, so a second run or a longer period costs just the gaps.
+        """
+        symbol, start_ts, end_ts = self.cache_price_minute(asset1, asset2)
+        df = self.price_cache.load(symbol, start_ts, end_ts)
+        df = pd.DataFrame({'datetime': pd.to_datetime(df['open_time'], unit='ms'), 'close': df['close']})
 
         folder = './data'
         filename = asset1.lower() + '_' + asset2.lower() + '.csv'
@@ -83,249 +103,377 @@ class BinanceExchange(BaseExchange):
 
         return df
 
+    def price_period(self):
+        """(start_ms, end_ms) of the report period's minutes, ending at the last finished minute."""
+        start_ts = int(datetime.strptime(self.start_time, "%Y-%m-%d").timestamp() * 1000)
+        end_ts = int((datetime.strptime(self.end_time, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        # the running minute is not final yet, so never mark it covered
+        return start_ts, min(end_ts, int(time.time() * 1000) // MINUTE_MS * MINUTE_MS - 1)
+
+    def cache_price_minute(self, asset1, asset2):
+        """Fill the PriceCache with asset1/asset2 minute klines for the report period; returns (symbol, start_ms, end_ms)."""
+        symbol = str(asset1).upper() + str(asset2).upper()
+        start_ts, end_ts = self.price_period()
+        if self.price_cache.is_unavailable(symbol):
+            return symbol, start_ts, end_ts
+
+        try:
+            for gap_start, gap_end in self.price_cache.missing(symbol, start_ts, end_ts):
+                self._fetch_klines(symbol, gap_start, gap_end)
+        except Exception as e:
+            if getattr(e, 'error_code', None) != INVALID_SYMBOL:
+                raise
+            # invalid or delisted pair: remembered, so later runs do not ask again
+            print(f"{symbol} is not a Binance symbol, skipped from now on")
+            self.price_cache.mark_unavailable(symbol)
+        return symbol, start_ts, end_ts
+
+    def _fetch_klines(self, symbol, start_ts, end_ts, limit=1000, flush_pages=100):
+        # pages are added to the cache in batches, so an interrupted download keeps most of its progress
+        buffered, buffer_start = [], start_ts
+        while start_ts <= end_ts:
+            page_end = min(start_ts + limit * MINUTE_MS - 1, end_ts)
+            klines = self._fetch_with_retry(self.client.klines, symbol=symbol, interval='1m',
+                                            startTime=start_ts, endTime=page_end, limit=limit)
+            if klines is None:
+                break
+            buffered.extend(klines)
+            start_ts = page_end + 1
+            if start_ts > end_ts or (start_ts - buffer_start) >= flush_pages * limit * MINUTE_MS:
+                self.price_cache.add(symbol, buffered, buffer_start, page_end)
+                print(f"{symbol} cached to {pd.to_datetime(page_end, unit='ms')}")
+                buffered, buffer_start = [], start_ts
+        if buffered:
+            self.price_cache.add(symbol, buffered, buffer_start, start_ts - 1)
+
     def get_usdt_price_in_gbp(self, ts):
 
         pass
 
-    def get_margin_trades(self, symbol, start_date, end_date, file_path):
+    def get_margin_trades(self, symbol, start_date, end_date, file_path=None):
         # api_key    = os.environ["BINANCE_API_KEY"]
         # api_secret = os.environ["BINANCE_SECRET_KEY"]
 
-        all_trades = []
-        current_start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
         end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        all_trades = self._fetch_trades_adaptive(self.client.margin_my_trades, symbol, start, end, 500)
+        print(f"{symbol} fetched: {len(all_trades)} trades total")
 
-        while current_start < end:
-            current_end = min(current_start + 86399999, end)
-            start_ms = current_start
-            end_ms = current_end
-
-            from_id = None
-            while True:
-                params = {
-                    'symbol': symbol,
-                    'startTime': start_ms,
-                    'endTime': end_ms,
-                    'limit': 500
-                }
-                if from_id:
-                    params['fromId'] = from_id
-                for i in range(5):
-                    try:
-                        trades = self.client.margin_my_trades(**params)
-                        print(f"Fetching: {params}")
-                        break
-                    except Exception as e:
-                        print(
-                            f"Error fetching {datetime.fromtimestamp(start_ms / 1000)} – {datetime.fromtimestamp(end_ms / 1000)}: {e}")
-                    time.sleep(3)
+        if not all_trades:
+            return pd.DataFrame()
+        df = binance_fill_batch(all_trades, symbol).to_pandas()
 
-                all_trades.extend(trades)
-                if len(trades) < 500:
-                    break
+        write_trades(df, 'margin')
+        if file_path:
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(file_path, index=False)
 
-                from_id = trades[-1]['id'] + 1
-                time.sleep(0.3)
+        return df[
+            ['datetime', 'symbol', 'side', 'price', 'qty', 'quoteQty', 'commission', 'commissionAsset', 'orderId']]
 
-            print(f"{datetime.fromtimestamp(current_start / 1000).date()} fetched: {len(all_trades)} trades total")
-            current_start = current_end + 1
+    def get_spot_trades(self, symbol, start_date, end_date, file_path=None):
 
-        df = pd.DataFrame(all_trades)
-        if df.empty:
-            return df
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        all_trades = self._fetch_trades_adaptive(self.client.my_trades, symbol, start, end, 1000)
+        print(f"{symbol} fetched: {len(all_trades)} trades total")
 
-        df['datetime'] = pd.to_datetime(df['time'], unit='ms')
-        df['side'] = df['isBuyer'].map({True: 'buy', False: 'sell'})
-        df['price'] = df['price'].astype(float)
-        df['qty'] = df['qty'].astype(float)
-        df['quoteQty'] = df['quoteQty'].astype(float)
-        df['commission'] = df['commission'].astype(float)
+        if not all_trades:
+            print("No trades found.")
+            return pd.DataFrame()
 
-        Path("./data/tax").mkdir(parents=True, exist_ok=True)
-        df.to_csv(file_path, index=False)
+        df = binance_fill_batch(all_trades, symbol).to_pandas()
+
+        write_trades(df, 'spot')
+        if file_path:
+            df.to_csv(file_path, index=False)
+            print(f"Saved to: {os.path.abspath(file_path)}")
 
         return df[
             ['datetime', 'symbol', 'side', 'price', 'qty', 'quoteQty', 'commission', 'commissionAsset', 'orderId']]
 
-    @sleep_and_retry
-    @limits(calls=60, period=60)
-    def get_spot_trades(self, symbol, start_date, end_date, file_path):
+    def _fetch_with_retry(self, fetch, **params):
+        # every request takes its weight from the shared limiter; a 429/418 pauses all fetch threads
+        weight = ENDPOINT_WEIGHTS.get(fetch.__name__, 1)
+        for i in range(5):  # Retry up to 5 times
+            self.rate_limiter.acquire(weight)
+            try:
+                trades = fetch(**params)
+                print(f"Fetching: {params}")
+                return trades
+            except Exception as e:
+                print(f"Error fetching {params}: {e}")
+                if getattr(e, 'error_code', None) == INVALID_SYMBOL:
+                    raise
+                if getattr(e, 'status_code', None) in RATE_LIMIT_STATUS:
+                    self.rate_limiter.backoff(retry_after(e))
+                else:
+                    time.sleep(3)
+        print("Failed after 5 retries.")
+        return None
 
-        all_trades = []
-        current_start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
-        end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+    def _fetch_trades_adaptive(self, fetch, symbol, start, end, limit):
+        """
+        Spot/margin fills in [start, end] (ms) with as few requests as the activity allows.
 
-        while current_start < end:
-            current_end = min(current_start + 86399999, end)
-            start_ms = current_start
-            end_ms = current_end
-
-            from_id = None
-            while True:
-                params = {
-                    'symbol': symbol,
-                    'startTime': start_ms,
-                    'endTime': end_ms,
-                    'limit': 500
-                }
-                if from_id:
-                    params['fromId'] = from_id
-
-                for i in range(5):  # Retry up to 5 times
-                    try:
-                        trades = self.client.my_trades(**params)
-                        print(f"Fetching: {params}")
+        One fromId=0 probe finds the symbol's first fill. A symbol never traded, or
+        first traded after end, costs that single request; one first traded inside
+        the range is paged by id with no windows at all. Otherwise the range is
+        walked with adaptive windows, capped at the endpoints' 24 hour maximum.
+        """
+        first = self._fetch_with_retry(fetch, symbol=symbol, fromId=0, limit=1)
+        if first is not None:
+            if not first or first[0]['time'] > end:
+                return []
+            if first[0]['time'] >= start:
+                trades = []
+                from_id = first[0]['id']
+                while True:
+                    page = self._fetch_with_retry(fetch, symbol=symbol, fromId=from_id, limit=limit)
+                    if not page:
                         break
-                    except Exception as e:
-                        print(
-                            f"Error fetching {datetime.fromtimestamp(start_ms / 1000)} – {datetime.fromtimestamp(end_ms / 1000)}: {e}")
-                        time.sleep(3)
-                else:
-                    print("Failed after 5 retries.")
-                    break
-
-                if not trades:
-                    break
+                    in_range = [trade for trade in page if trade['time'] <= end]
+                    trades.extend(in_range)
+                    if len(in_range) < limit:
+                        break
+                    from_id = page[-1]['id'] + 1
+                return trades
 
-                all_trades.extend(trades)
-                if len(trades) < 500:
-                    break
+        def fetch_window(start_ms, end_ms):
+            return self._fetch_with_retry(fetch, symbol=symbol, startTime=start_ms, endTime=end_ms, limit=limit)
 
-                from_id = trades[-1]['id'] + 1
-                time.sleep(0.3)
+        def fetch_from_id(from_id):
+            return self._fetch_with_retry(fetch, symbol=symbol, fromId=from_id, limit=limit)
 
-            print(f"{datetime.fromtimestamp(current_start / 1000).date()} fetched: {len(all_trades)} trades total")
-            current_start = current_end + 1
+        return fetch_adaptive(fetch_window, start, end, limit, DAY_MS, fetch_from_id=fetch_from_id)
 
-        if not all_trades:
-            print("No trades found.")
-            return pd.DataFrame()
+    def _store_trades_page(self, market, symbol, trades, manifest):
+        write_trades(binance_fill_batch(trades, symbol).to_pandas(), market, append=True)
+        last = trades[-1]
+        manifest.update(symbol, last_id=last['id'], last_time=last['time'])
 
-        df = pd.DataFrame(all_trades)
+    def sync_trades(self, market, symbol, start_date=None, end_date=None, manifest=None):
+        """
+        Incrementally fetch spot or margin fills for symbol into the trade store.
+
+        Resumes from the SyncManifest high-water mark: with fromId after the last
+        stored fill, or with the day window after the last one fetched while the
+        symbol has no fills yet. A symbol stored by a full fetch before its first
+        sync resumes after its highest stored id. Windows stop at now, so a sync
+        during the tax year is picked up by the next one. Every page is appended
+        and checkpointed as soon as it arrives, so an interrupted sync carries on
+        where it stopped. Returns the number of new fills.
+        """
+        if not start_date:
+            start_date = self.start_time
+        if not end_date:
+            end_date = self.end_time
+        method, limit = {'spot': ('my_trades', 1000), 'margin': ('margin_my_trades', 500)}[market]
+        fetch = getattr(self.client, method)
+
+        if manifest is None:
+            manifest = SyncManifest(market)
+        entry = manifest.get(symbol)
+        if 'last_id' not in entry and symbol in list_symbols(market):
+            # written by get_spot_trades / get_margin_trades, not synced yet: going from the start would append it twice
+            stored = read_trades(market, symbol=symbol, columns=['id', 'datetime'])
+            if len(stored):
+                last = stored.loc[stored['id'].idxmax()]
+                manifest.update(symbol, last_id=last['id'], last_time=pd.Timestamp(last['datetime']).value // 1_000_000)
+                entry = manifest.get(symbol)
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        # windows after now would be marked synced before their fills exist
+        end = min(end, int(time.time() * 1000) - 1)
+        fetched = 0
 
-        df['datetime'] = pd.to_datetime(df['time'], unit='ms')
-        df['side'] = df['isBuyer'].map({True: 'buy', False: 'sell'})
-        df['price'] = df['price'].astype(float)
-        df['qty'] = df['qty'].astype(float)
-        df['quoteQty'] = df['quoteQty'].astype(float)
-        df['commission'] = df['commission'].astype(float)
-        df['symbol'] = symbol  # Add symbol for completeness
+        # No fill stored yet: walk one day windows until the first fill turns up
+        current_start = max(start, entry.get('synced_until', start - 1) + 1)
+        while 'last_id' not in entry and current_start < end:
+            current_end = min(current_start + 86399999, end)
+            trades = self._fetch_with_retry(fetch, symbol=symbol, startTime=current_start,
+                                            endTime=current_end, limit=limit)
+            if trades is None:
+                return fetched
+            if trades:
+                self._store_trades_page(market, symbol, trades, manifest)
+                fetched += len(trades)
+            manifest.update(symbol, synced_until=current_end)
+            entry = manifest.get(symbol)
+            current_start = current_end + 1
 
-        df.to_csv(file_path, index=False)
-        print(f"Saved to: {os.path.abspath(file_path)}")
+        # After the first fill page forward by id, the rest of the year needs no windows
+        while 'last_id' in entry:
+            trades = self._fetch_with_retry(fetch, symbol=symbol, fromId=entry['last_id'] + 1, limit=limit)
+            if not trades:
+                break
+            in_range = [trade for trade in trades if trade['time'] <= end]
+            if in_range:
+                self._store_trades_page(market, symbol, in_range, manifest)
+                fetched += len(in_range)
+            if len(in_range) < limit:
+                break
+            entry = manifest.get(symbol)
 
-        return df[
-            ['datetime', 'symbol', 'side', 'price', 'qty', 'quoteQty', 'commission', 'commissionAsset', 'orderId']]
+        print(f"{symbol} synced: {fetched} new trades")
+        return fetched
 
-    def get_spot_records(self, symbols):
+    def get_spot_records(self, symbols, incremental=False, workers=4):
         # print(get_available_usdt_symbols())
+        # incremental=True resumes every symbol from its sync manifest instead of skipping stored ones
+        # workers symbols are fetched at once, sharing self.rate_limiter
 
-        symbols = [symbol for symbol in symbols if symbol >= 'ACAUSDT']
+        symbols = [symbol for symbol in symbols if symbol >= 'ACAUSDT' and symbol.endswith('USDT')]
         start_date, end_date = '2024-04-06', '2025-04-05'  ##In the tax year 6 April 2024 to 5 April 2025:
-        for symbol in symbols:
-            if symbol.endswith('USDT'):
-                print(symbol)
-                file_path = Path(f"./analyse/data/tax/spot/{symbol}_margin_trades.csv")
+        stored = set(list_symbols('spot'))
+        manifest = SyncManifest('spot')
 
-                if file_path.exists():
-                    continue
+        def fetch(symbol):
+            print(symbol)
+            if incremental:
+                return self.sync_trades('spot', symbol, start_date, end_date, manifest=manifest)
+            if symbol not in stored:
+                return self.get_spot_trades(symbol, start_date, end_date)
 
+        return fetch_symbols(fetch, symbols, workers=workers)
 
-                else:
-                    self.get_spot_trades(symbol, start_date, end_date, file_path)
-
-    def get_trade_records(self, symbols):
+    def get_trade_records(self, symbols, incremental=False, workers=4):
         # print(get_available_usdt_symbols())
+        # incremental=True resumes every symbol from its sync manifest instead of skipping stored ones
+        # workers symbols are fetched at once, sharing self.rate_limiter
         symbols = ['CTXCUSDT']
         start_date, end_date = '2024-04-06', '2025-04-05'  ##In the tax year 6 April 2024 to 5 April 2025:
-        for symbol in symbols:
-            if symbol.endswith('USDT'):
-                print(symbol)
-                file_path = Path(f"./data/tax/margin/{symbol}_margin_trades.csv")
+        stored = set(list_symbols('margin'))
+        manifest = SyncManifest('margin')
 
-                if file_path.exists():
-                    continue
+        def fetch(symbol):
+            print(symbol)
+            if incremental:
+                return self.sync_trades('margin', symbol, start_date, end_date, manifest=manifest)
+            if symbol not in stored:
+                return self.get_margin_trades(symbol, start_date, end_date)
 
-
-                else:
-                    self.get_margin_trades(symbol, start_date, end_date, file_path)
+        return fetch_symbols(fetch, [symbol for symbol in symbols if symbol.endswith('USDT')], workers=workers)
 
     def get_margin_interest_history_all_year(self, isolatedSymbol=None):
-        start_date_str = self.start_time
-        end_date_str = self.end_time
-
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        """
+        Margin interest for the whole period, rewritten to ./data/raw/interest and returned.
 
-        all_records = []
+        Each 30 day window is fetched (every page of it), appended to the CSV
+        once and kept; the records are combined and checked for date gaps
+        once at the end. A window that still fails after retries is reported
+        and skipped, so the rest of the year is still fetched.
+        """
+        start_date = datetime.strptime(self.start_time, "%Y-%m-%d")
+        end_date = datetime.strptime(self.end_time, "%Y-%m-%d")
+
+        raw_folder = './data/raw/interest'
+        if isolatedSymbol:
+            filename = 'interest_margin_' + isolatedSymbol + '.csv'
+        else:
+            filename = 'interest_margin.csv'
+        os.makedirs(raw_folder, exist_ok=True)
+        filepath = os.path.join(raw_folder, filename)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+        windows = []
         current_start = start_date
-
         while current_start < end_date:
-
             current_end = min(current_start + timedelta(days=30), end_date)
             print(f" Fetching {current_start.date()} to {current_end.date()}")
-
-            # Implement pagination for each time window
-            page = 1
-            while True:
-                try:
-                    response = self.client.margin_interest_history(
-                        isolatedSymbol=isolatedSymbol,
-                        startTime=int(current_start.timestamp() * 1000),
-                        endTime=int(current_end.timestamp() * 1000),
-                        current=page,
-                        size=100
-                    )
-
-                    if not response.get('rows'):
-                        break
-
-                    all_records.extend(response['rows'])
-
-                    # Check if we've got all records for this period
-                    if len(response['rows']) < 100:
-                        break
-
-                    page += 1
-                    time.sleep(0.1)  # Small delay between pagination requests
-
-                except Exception as e:
-                    print(f"Error from {current_start.date()} to {current_end.date()}, page {page}: {e}")
-                    time.sleep(2)  # Wait before continuing
-                    smtp_send_mail('error in get_margin_interest_history_all_year', '')
-                    break
-
-            # Move to next period without gaps
+            start_ms = int(current_start.timestamp() * 1000)
+            # the next window starts where this one ends, so its end ms is left to the next one
+            end_ms = int(current_end.timestamp() * 1000) - (1 if current_end < end_date else 0)
+            rows = self._fetch_interest_window(isolatedSymbol, start_ms, end_ms)
+            if rows is None:
+                print(f"Error from {current_start.date()} to {current_end.date()}, window skipped")
+            elif rows:
+                df = pd.DataFrame(rows)
+                df['interestAccuredTime'] = pd.to_datetime(df['interestAccuredTime'], unit='ms')
+                df.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=False)
+                windows.append(df)
             current_start = current_end
-            time.sleep(0.5)
 
-            df = pd.DataFrame(all_records)
-
-            if not df.empty:
-                # Add validation
-                print(f"Total interest records fetched: {len(df)}")
-                if 'interestAccuredTime' in df.columns:
-                    df['interestAccuredTime'] = pd.to_datetime(df['interestAccuredTime'], unit='ms')
-                    print(f"Date range: {df['interestAccuredTime'].min()} to {df['interestAccuredTime'].max()}")
+        if not windows:
+            return pd.DataFrame()
+        df = pd.concat(windows, ignore_index=True)
+        print(f"Total interest records fetched: {len(df)}")
+        print(f"Date range: {df['interestAccuredTime'].min()} to {df['interestAccuredTime'].max()}")
+        date_gaps = df['interestAccuredTime'].sort_values().diff().dt.days
+        large_gaps = date_gaps[date_gaps > 2]  # Gaps larger than 2 days
+        if not large_gaps.empty:
+            print(f"Warning: Found {len(large_gaps)} potential date gaps in interest data")
+        return df
 
-                    # Check for date gaps
-                    df_sorted = df.sort_values('interestAccuredTime')
-                    date_gaps = df_sorted['interestAccuredTime'].diff().dt.days
-                    large_gaps = date_gaps[date_gaps > 2]  # Gaps larger than 2 days
-                    if not large_gaps.empty:
-                        print(f"Warning: Found {len(large_gaps)} potential date gaps in interest data")
+    def get_isolated_margin_symbols(self, quote='USDT'):
+        """Margin enabled <quote> pairs from exchange info, the pairs that can carry isolated margin interest."""
+        exchange_info = self._fetch_with_retry(self.client.exchange_info)
+        if not exchange_info:
+            return []
+        # delisted pairs stay listed (status BREAK) and may still have interest in the tax year
+        return sorted(s['symbol'] for s in exchange_info['symbols']
+                      if s.get('isMarginTradingAllowed') and s.get('quoteAsset') == quote)
+
+    def _fetch_interest_window(self, isolated_symbol, start_ms, end_ms, size=100):
+        # every page of one (at most 30 day) window, None when a page could not be fetched
+        rows = []
+        page = 1
+        while True:
+            response = self._fetch_with_retry(self.client.margin_interest_history, isolatedSymbol=isolated_symbol,
+                                              startTime=start_ms, endTime=end_ms, current=page, size=size)
+            if response is None:
+                return None
+            rows.extend(response.get('rows') or [])
+            if len(response.get('rows') or []) < size:
+                return rows
+            page += 1
+
+    def sync_margin_interest(self, isolated_symbol=None, manifest=None, window_days=30):
+        """
+        Incrementally fetch cross (or one isolated pair's) margin interest into ./data/raw/interest.
 
+        Each 30 day window is appended to interest_margin[_<symbol>].csv and
+        checkpointed in the 'interest' SyncManifest as soon as it arrives, so an
+        interrupted sync resumes after the last window stored; windows stop at
+        now, so a sync during the tax year is continued by the next one.
+        Returns the number of new records.
+        """
+        key = isolated_symbol or 'CROSS'
+        if manifest is None:
+            manifest = SyncManifest('interest')
+        raw_folder = './data/raw/interest'
+        os.makedirs(raw_folder, exist_ok=True)
+        filename = 'interest_margin_' + isolated_symbol + '.csv' if isolated_symbol else 'interest_margin.csv'
+        filepath = os.path.join(raw_folder, filename)
+
+        start = int(datetime.strptime(self.start_time, "%Y-%m-%d").timestamp() * 1000)
+        end = int((datetime.strptime(self.end_time, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
+        # accruals after now do not exist yet, so never mark those windows synced
+        end = min(end, int(time.time() * 1000) - 1)
+        entry = manifest.get(key)
+        if 'synced_until' not in entry and os.path.exists(filepath):
+            os.remove(filepath)  # written outside the manifest, start over rather than append duplicates
+        current_start = max(start, entry.get('synced_until', start - 1) + 1)
+        fetched = 0
+
+        while current_start <= end:
+            current_end = min(current_start + window_days * DAY_MS - 1, end)
+            rows = self._fetch_interest_window(isolated_symbol, current_start, current_end)
+            if rows is None:
+                break
+            if rows:
+                df = pd.DataFrame(rows)
                 df['interestAccuredTime'] = pd.to_datetime(df['interestAccuredTime'], unit='ms')
+                if isolated_symbol:
+                    df['isolatedSymbol'] = isolated_symbol
+                df.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=False)
+                fetched += len(df)
+            manifest.update(key, synced_until=current_end)
+            current_start = current_end + 1
 
-                raw_folder = './data/raw/interest'
-                if isolatedSymbol:
-                    filename = 'interest_margin_' + isolatedSymbol + '.csv'
-                else:
-                    filename = 'interest_margin.csv'
-                os.makedirs(raw_folder, exist_ok=True)
-                filepath = os.path.join(raw_folder, filename)
-                df.to_csv(filepath)
-            return df
+        print(f"{key} interest synced: {fetched} new records")
+        return fetched
 
     def get_available_spot_usdt_symbols(self):
         BASE_URL = "https://data.binance.vision/?prefix=data/spot/daily/trades/"
@@ -350,14 +498,15 @@ class BinanceExchange(BaseExchange):
         finally:
             driver.quit()
 
-    def get_all_isolated_margin_interest_history_all_year(self):
-        symbols = self.get_available_spot_usdt_symbols()
-        for symbol in symbols:
-            print(f'fetch  {symbol}')
-            self.get_margin_interest_history_all_year(symbol)
+    def get_all_isolated_margin_interest_history_all_year(self, symbols=None, workers=8):
+        # every margin pair from exchange info, workers pairs at once sharing self.rate_limiter
+        if symbols is None:
+            symbols = self.get_isolated_margin_symbols()
+        manifest = SyncManifest('interest')
+        print(f"Syncing isolated margin interest for {len(symbols)} symbols")
+        return fetch_symbols(lambda symbol: self.sync_margin_interest(symbol, manifest=manifest), symbols,
+                             workers=workers)
 
-    @sleep_and_retry
-    @limits(calls=1200, period=60)
     def get_futures_trades(self, symbol, start_date=None, end_date=None, file_path=None):
         """
         Get futures trading history for a specific symbol,not for tax as time range is short
@@ -367,67 +516,28 @@ class BinanceExchange(BaseExchange):
         if not end_date:
             end_date = self.end_time
 
-        all_trades = []
-        current_start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
         end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
 
-        while current_start < end:
-            current_end = min(current_start + 86399999, end)  # 1 day window
-            start_ms = current_start
-            end_ms = current_end
-
-            from_id = None
-            while True:
-                params = {
-                    'symbol': symbol,
-                    'startTime': start_ms,
-                    'endTime': end_ms,
-                    'limit': 1000  # Futures API allows up to 1000
-                }
-                if from_id:
-                    params['fromId'] = from_id
-
-                for i in range(5):  # Retry up to 5 times
-                    try:
-                        trades = self.futures_client.get_account_trades(**params)
-                        print(f"Fetching futures trades: {params}")
-                        break
-                    except Exception as e:
-                        print(
-                            f"Error fetching {datetime.fromtimestamp(start_ms / 1000)} – {datetime.fromtimestamp(end_ms / 1000)}: {e}")
-                        time.sleep(3)
-                else:
-                    print("Failed after 5 retries.")
-                    break
-
-                if not trades:
-                    break
+        def fetch(start_ms, end_ms):
+            return self._fetch_with_retry(self.futures_client.get_account_trades, symbol=symbol,
+                                          startTime=start_ms, endTime=end_ms, limit=1000)
 
-                all_trades.extend(trades)
-                if len(trades) < 1000:
-                    break
+        def fetch_from_id(from_id):
+            return self._fetch_with_retry(self.futures_client.get_account_trades, symbol=symbol,
+                                          fromId=from_id, limit=1000)
 
-                from_id = trades[-1]['id'] + 1
-                time.sleep(0.1)  # Small delay between requests
-
-            print(
-                f"{datetime.fromtimestamp(current_start / 1000).date()} fetched: {len(all_trades)} futures trades total")
-            current_start = current_end + 1
+        # userTrades accepts windows of up to 7 days
+        all_trades = fetch_adaptive(fetch, start, end, 1000, 7 * DAY_MS, fetch_from_id=fetch_from_id)
+        print(f"{symbol} fetched: {len(all_trades)} futures trades total")
 
         if not all_trades:
             print("No futures trades found.")
             return pd.DataFrame()
 
-        df = pd.DataFrame(all_trades)
+        df = binance_fill_batch(all_trades, symbol).to_pandas()
 
-        # Process the data
-        df['datetime'] = pd.to_datetime(df['time'], unit='ms')
-        df['side'] = df['side'].str.lower()
-        df['price'] = df['price'].astype(float)
-        df['qty'] = df['qty'].astype(float)
-        df['quoteQty'] = df['quoteQty'].astype(float)
-        df['commission'] = df['commission'].astype(float)
-        df['realizedPnl'] = df['realizedPnl'].astype(float)
+        write_trades(df, 'futures')
 
         # Save to file if path provided
         if file_path:
@@ -438,8 +548,6 @@ class BinanceExchange(BaseExchange):
         return df[['datetime', 'symbol', 'side', 'price', 'qty', 'quoteQty',
                    'commission', 'commissionAsset', 'realizedPnl', 'orderId']]
 
-    @sleep_and_retry
-    @limits(calls=600, period=60)
     def get_futures_income_history(self, symbol=None, income_type=None, start_date=None, end_date=None, file_path=None):
         """
         Get futures income history (funding fees, realized PnL, etc.),not for tax as time range is short
@@ -449,40 +557,23 @@ class BinanceExchange(BaseExchange):
         if not end_date:
             end_date = self.end_time
 
-        all_income = []
-        current_start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
+        start = int(datetime.strptime(start_date, "%Y-%m-%d").timestamp() * 1000)
         end = int((datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).timestamp() * 1000) - 1
 
-        while current_start < end:
-            current_end = min(current_start + 86399999 * 7, end)  # 7 day window
-
+        def fetch(start_ms, end_ms):
             params = {
-                'startTime': current_start,
-                'endTime': current_end,
+                'startTime': start_ms,
+                'endTime': end_ms,
                 'limit': 1000
             }
             if symbol:
                 params['symbol'] = symbol
             if income_type:
                 params['incomeType'] = income_type
+            return self._fetch_with_retry(self.futures_client.get_income_history, **params)
 
-            for i in range(5):
-                try:
-                    income = self.futures_client.get_income_history(**params)
-                    print(f"Fetching income history: {params}")
-                    break
-                except Exception as e:
-                    print(f"Error fetching income history: {e}")
-                    time.sleep(3)
-            else:
-                print("Failed to fetch income history after 5 retries.")
-                break
-
-            if income:
-                all_income.extend(income)
-
-            current_start = current_end + 1
-            time.sleep(0.2)
+        # a busy week returns more than one page of funding rows, so full pages split the window
+        all_income = fetch_adaptive(fetch, start, end, 1000, 7 * DAY_MS, id_key='tranId')
 
         if not all_income:
             print("No income history found.")
@@ -499,7 +590,7 @@ class BinanceExchange(BaseExchange):
 
         return df
 
-    def get_futures_records(self, symbols=None):
+    def get_futures_records(self, symbols=None, workers=4):
         """
         Get futures trading records for multiple symbols,not for tax as time range is short
         """
@@ -516,7 +607,7 @@ class BinanceExchange(BaseExchange):
 
         start_date, end_date = self.start_time, self.end_time
 
-        for symbol in symbols:
+        def fetch(symbol):
             print(f"Processing futures data for {symbol}...")
 
             # Check if files already exist
@@ -525,77 +616,58 @@ class BinanceExchange(BaseExchange):
 
             if trades_file_path.exists() and income_file_path.exists():
                 print(f"Files for {symbol} already exist, skipping...")
-                continue
+                return
 
-            try:
-                # Get futures trades
-                if not trades_file_path.exists():
-                    self.get_futures_trades(symbol, start_date, end_date, trades_file_path)
-
-                # Get futures income history
-                if not income_file_path.exists():
-                    self.get_futures_income_history(symbol, file_path=income_file_path)
+            # Get futures trades
+            if not trades_file_path.exists():
+                self.get_futures_trades(symbol, start_date, end_date, trades_file_path)
 
-                time.sleep(1)  # Pause between symbols
-
-            except Exception as e:
-                print(f"Error processing {symbol}: {e}")
-                continue
+            # Get futures income history
+            if not income_file_path.exists():
+                self.get_futures_income_history(symbol, file_path=income_file_path)
 
+        # workers symbols are fetched at once, sharing self.rate_limiter
+        fetch_symbols(fetch, symbols, workers=workers)
 
-    def get_future_download_link(self):
 
-        try:
-            start_dt = datetime.strptime(self.start_time, '%Y-%m-%d')
-            end_dt = datetime.strptime(self.end_time, '%Y-%m-%d')
-
-            start_dt=int(start_dt.timestamp()* 1000)
-            end_dt = int(end_dt.timestamp() * 1000)
-
-            #response = self.futures_client.download_transactions_asyn(startTime=start_dt, endTime=end_dt)
-            response = self.futures_client.download_trade_asyn(startTime=start_dt, endTime=end_dt)
-
-            print(response)
-            d_id=response['downloadId']
-
-        except ClientError as error:
-            print(
-                "Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-
-        try:
-            for i in range(100):
-                #994254225955278848
-                #response = self.futures_client.aysnc_download_info(downloadId=d_id)
-                response = self.futures_client.async_download_trade_id(downloadId=d_id)
-                print(response)
-
-                if response["status"]=='completed':
-                    url = response['url']
-                    break
-                time.sleep(10)
-        except ClientError as error:
-            print(
-                "Found error. status: {}, error code: {}, error message: {}".format(
-                    error.status_code, error.error_code, error.error_message
-                )
-            )
-
-
-        try:
-            local_path = "./data/raw/future/trades.zip"
+    def get_future_download_link(self, poll_seconds=10, timeout=1800):
+        """
+        Request an export of every futures trade in the period and wait for its download url.
 
-            folder = os.path.dirname(local_path)
-            os.makedirs(folder, exist_ok=True)
+        The export id is polled (weighted like every other request) until
+        Binance reports it completed; returns None if it failed or did not
+        complete within timeout seconds.
+        """
+        start_ms = int(datetime.strptime(self.start_time, '%Y-%m-%d').timestamp() * 1000)
+        end_ms = int((datetime.strptime(self.end_time, '%Y-%m-%d') + timedelta(days=1)).timestamp() * 1000) - 1
+
+        response = self._fetch_with_retry(self.futures_client.download_trade_asyn, startTime=start_ms, endTime=end_ms)
+        if not response or 'downloadId' not in response:
+            print(f"Export request failed: {response}")
+            return None
+        download_id = response['downloadId']
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            response = self._fetch_with_retry(self.futures_client.async_download_trade_id, downloadId=download_id)
+            if response and response.get('status') == 'completed':
+                return response['url']
+            time.sleep(poll_seconds)
+        print(f"Export {download_id} not completed after {timeout}s")
+        return None
+
+    def ingest_futures_trade_archive(self, archive_path='./data/raw/futures/trades.zip'):
+        """
+        Fetch all futures trades of the period as one bulk export instead of paging userTrades.
 
-            response = requests.get(url)
-            if response.status_code == 200:
-                with open(local_path, "wb") as f:
-                    f.write(response.content)
-                print(f" Sucess : {local_path}")
-            else:
-                print(f" Failure {response.status_code}")
-        except Exception as e:
-            print(e)
\ No newline at end of file
+        The zip is streamed to archive_path, then its CSV members are read in
+        place, normalized and written to the trade store. Returns the number
+        of fills stored.
+        """
+        url = self.get_future_download_link()
+        if url is None:
+            return 0
+        print(f"Downloaded {stream_download(url, archive_path)} bytes to {archive_path}")
+        rows = ingest_trade_archive(archive_path, 'futures')
+        print(f"{rows} futures trades stored from {archive_path}")
+        return rows
@@ -0,0 +1,26 @@
+import os
+
+import requests
+
+CHUNK_BYTES = 1 << 20
+
+
+def stream_download(url, path, chunk_size=CHUNK_BYTES, timeout=60, session=None):
+    """
+    Download url to path a chunk at a time, never holding the file in memory.
+
+    The body goes to <path>.part and is renamed when complete, so an
+    interrupted download never leaves a truncated file at path. Returns the
+    number of bytes written; raises requests.HTTPError on a bad status.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.part'
+    written = 0
+    with (session or requests).get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+    os.replace(tmp_path, path)
+    return written
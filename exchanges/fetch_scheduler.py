@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Request weight of the Binance endpoints the fetchers call, keyed by connector method name
+ENDPOINT_WEIGHTS = {
+    'my_trades': 20,  # GET /api/v3/myTrades
+    'margin_my_trades': 10,  # GET /sapi/v1/margin/myTrades
+    'margin_interest_history': 1,  # GET /sapi/v1/margin/interestHistory
+    'klines': 2,  # GET /api/v3/klines
+    'exchange_info': 20,  # GET /api/v3/exchangeInfo
+    'get_account_trades': 5,  # GET /fapi/v1/userTrades
+    'get_income_history': 30,  # GET /fapi/v1/income
+    'download_trade_asyn': 1000,  # GET /fapi/v1/trade/asyn
+    'async_download_trade_id': 10,  # GET /fapi/v1/trade/asyn/id
+}
+
+# status codes Binance answers with when the request weight budget is exceeded (418 = IP ban)
+RATE_LIMIT_STATUS = (429, 418)
+# Binance error code for a symbol that does not exist (never listed, or delisted): retrying cannot help
+INVALID_SYMBOL = -1121
+
+
+class WeightRateLimiter:
+    """
+    Token bucket counted in Binance request weight, shared by every fetch thread.
+
+    The bucket refills continuously at weight_per_minute. acquire() blocks until
+    the request's weight is available; backoff() stops every thread for the
+    Retry-After period after a 429/418.
+    """
+
+    def __init__(self, weight_per_minute=6000, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60
+        self.tokens = weight_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight=1):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = max(self.paused_until - now, (weight - self.tokens) / self.rate)
+            self.sleep(wait)
+
+    def backoff(self, seconds):
+        with self.lock:
+            now = self.clock()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+
+
+def retry_after(error, default=60):
+    """Seconds to wait after a rate limit error, from its Retry-After header when present."""
+    header = getattr(error, 'header', None) or {}
+    try:
+        return float(header.get('Retry-After', default))
+    except (TypeError, ValueError):
+        return default
+
+
+def fetch_symbols(fetch, symbols, workers=4):
+    """
+    Run fetch(symbol) for every symbol on a thread pool.
+
+    Returns {symbol: result}; a symbol whose fetch raises is reported and left
+    out so one bad pair does not stop the rest.
+    """
+    results = {}
+
+    def run(symbol):
+        try:
+            results[symbol] = fetch(symbol)
+        except Exception as e:
+            print(f"Error processing {symbol}: {e}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, symbols))
+    return results
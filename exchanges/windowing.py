@@ -0,0 +1,75 @@
+DAY_MS = 86_400_000
+
+
+class WindowFetchError(RuntimeError):
+    """A time window that still failed after its retries; the rows fetched before it are not returned."""
+
+    def __init__(self, start_ms, end_ms):
+        super().__init__(f"window {start_ms}-{end_ms} ms could not be fetched")
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+
+def fetch_adaptive(fetch, start_ms, end_ms, limit, max_window_ms, min_window_ms=60_000, id_key='id',
+                   fetch_from_id=None):
+    """
+    Fetch every row in [start_ms, end_ms] with time windows that follow activity.
+
+    fetch(window_start_ms, window_end_ms) returns at most limit rows (None on
+    failure). Windows start at max_window_ms. A full page means the window may
+    hold more rows, so it is halved and fetched again, down to min_window_ms,
+    where pages carry on from the last row's time. An empty window doubles the
+    next one again, up to max_window_ms, so quiet stretches cost few requests.
+    More than limit rows in one millisecond cannot be paged by time; they are
+    paged with fetch_from_id(first_id) (at most limit rows from that id, None
+    on failure) when the endpoint has one. A window that fails, or such a
+    millisecond without fetch_from_id, raises WindowFetchError rather than
+    leaving a hole the caller would take as fetched.
+    """
+    rows = []
+    seen = set()
+    window = max_window_ms
+    current = start_ms
+
+    while current <= end_ms:
+        window_end = min(current + window - 1, end_ms)
+        page = fetch(current, window_end)
+        if page is None:
+            raise WindowFetchError(current, window_end)
+
+        if len(page) >= limit and window > min_window_ms:
+            window = max(window // 2, min_window_ms)
+            continue
+
+        new = [row for row in page if row[id_key] not in seen]
+        rows.extend(new)
+        seen.update(row[id_key] for row in new)
+
+        if len(page) >= limit and new:
+            # smallest window is still full, page on from the last row's time
+            current = page[-1]['time']
+            continue
+        if len(page) >= limit:
+            # a whole page within one millisecond: only ids tell the rest of it apart
+            busy_ms = page[-1]['time']
+            if fetch_from_id is None:
+                raise WindowFetchError(busy_ms, busy_ms)
+            from_id = max(row[id_key] for row in page) + 1
+            while True:
+                id_page = fetch_from_id(from_id)
+                if id_page is None:
+                    raise WindowFetchError(busy_ms, busy_ms)
+                new = [row for row in id_page if row['time'] <= busy_ms and row[id_key] not in seen]
+                rows.extend(new)
+                seen.update(row[id_key] for row in new)
+                if len(id_page) < limit or id_page[-1]['time'] > busy_ms:
+                    break
+                from_id = id_page[-1][id_key] + 1
+            current = busy_ms + 1
+            continue
+
+        if not page:
+            window = min(window * 2, max_window_ms)
+        current = window_end + 1
+
+    return rows
@@ -1,12 +1,27 @@
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from decimal import Decimal
+from functools import partial
+
 import pandas as pd
 from dotenv import load_dotenv
 
 from exchanges.binance import BinanceExchange
-from src.data_processing import calculate_pnl_2
-from src.report_generation import generate_uk_crypto_tax_pdf_report
-from src.utils import  get_usd_to_gbp_from_yahoo
-from decimal import Decimal
+from src.chunked_pipeline import BATCH_ROWS, SPILL_ROOT, SortedSpill, SpillRuns
+from src.commission_valuation import PriceIndex, commission_assets, value_commissions, value_interest
+from src.data_processing import calculate_pnl_file, calculate_pnl_stored
+from src.futures_processing import FUTURES_FOLDER, futures_daily_totals, futures_in_gbp
+from src.fx_store import CsvFxProvider, FxStore
+from src.gbp_conversion import add_interest_in_gbp, convert_interest_to_gbp, convert_trades_to_gbp
+from src.instrumentation import StageTracer
+from src.interest_allocation import InterestSweep, interest_per_trade
+from src.price_series import series_from_csv
+from src.report_generation import (EMPTY_TOTALS, TABLE_COLUMNS, TABLE_DTYPES, add_totals, build_uk_crypto_tax_pdf_report,
+                                   disposal_totals, generate_uk_crypto_tax_pdf_report, prepare_disposals)
+from src.stage_cache import CACHE_ROOT, StageCache, code_digest, file_digest, fingerprint, folder_digest
+from src.trade_store import STORE_ROOT, list_symbols, read_trades
 load_dotenv()
 
 
@@ -21,24 +36,89 @@ exchange = BinanceExchange(api_key=api_key, api_secret=api_secret,start_time=sta
 
 
 
-def calculate_pnl(market,usdt_to_gbp_df,bnb_to_usdt_df):
-    # market is spot, margin, or future
+# modules whose code each cached stage depends on, part of the stage's cache key
+PNL_CODE = ('src.data_processing', 'src.trade_store')
+GBP_CODE = ('src.commission_valuation', 'src.gbp_conversion', 'src.price_series')
+FUTURES_CODE = ('src.futures_processing', 'src.commission_valuation', 'src.gbp_conversion', 'src.trade_store')
+INTEREST_CODE = ('src.interest_allocation', 'src.gbp_conversion')
+# row order of combined.csv and the report's disposal table, the same in memory and chunked;
+# lots still tied keep the order the symbol's matching produced them in
+DISPOSAL_ORDER = ['disposal_date', 'market', 'symbol', 'open_time']
+
+
+def pnl_sources(market):
+    # (names, sources, task, paths) for calculate_pnl_2 per symbol, paths holding each symbol's trades
+    # trades come from the parquet store when the market has been fetched into it, else ./data/raw CSVs
     raw_folder = './data/raw/'+market
     os.makedirs(raw_folder, exist_ok=True)
+
+    symbols = list_symbols(market)
+    if symbols:
+        paths = [os.path.join(STORE_ROOT, f'market={market}', f'symbol={symbol}') for symbol in symbols]
+        return symbols, symbols, partial(calculate_pnl_stored, market, start=start_time, end=end_time), paths
+    names = sorted(filename for filename in os.listdir(raw_folder) if filename.endswith('.csv'))
+    paths = [os.path.join(raw_folder, filename) for filename in names]
+    return names, paths, calculate_pnl_file, paths
+
+
+def pnl_keys(market):
+    # cache key per symbol: its trades' content, the tax year and the matching code
+    names, _, _, paths = pnl_sources(market)
+    code = code_digest(*PNL_CODE)
+    return [fingerprint(market, name, start_time, end_time, code,
+                        folder_digest(path) if os.path.isdir(path) else file_digest(path))
+            for name, path in zip(names, paths)]
+
+
+def gbp_key(market, usd_gbp, bnb_usdt, price_index=None):
+    # cache key of a market's GBP-converted lots: its symbols' keys, the rates and the conversion code
+    # (add_gbp_values is in this file, hashed directly as importing main would rerun its setup)
+    return fingerprint(pnl_keys(market), usd_gbp, bnb_usdt, price_index, code_digest(*GBP_CODE), file_digest(__file__))
+
+
+def pnl_per_symbol(market, workers=1, cache=None):
+    # (name, lots, summary) per symbol of market, in name order
+    # workers > 1 runs the symbols on a process pool
+    # with a StageCache only symbols whose trades (or the matching code) changed are matched again
+    names, sources, task, _ = pnl_sources(market)
+    stages = [f'pnl/{market}/{name}' for name in names]
+    keys = pnl_keys(market) if cache is not None else [None] * len(names)
+    todo = [i for i, (stage, key) in enumerate(zip(stages, keys)) if cache is None or not cache.has(stage, key)]
+    cached = set(range(len(names))) - set(todo)
+
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as pool:
+        computed = (pool.map if pool else map)(task, [sources[i] for i in todo])
+        for i, name in enumerate(names):
+            if i in cached:
+                result, summary = cache.load(stages[i], keys[i])
+            else:
+                result, summary = next(computed)
+                if cache is not None:
+                    cache.save(stages[i], keys[i], (result, summary))
+            yield name, result, summary
+
+
+def calculate_pnl(market,usd_gbp,bnb_usdt,workers=1,price_index=None,cache=None):
+    # market is spot, margin, or future
+    # usd_gbp and bnb_usdt are memory-mapped PriceSeries, looked up as-of each trade's day / minute
+    # price_index values commissions in any asset, BNB from bnb_usdt only when not given
+    # cache (a StageCache) keeps the GBP-converted lots, recomputed only when a symbol, the rates or the code change
+    if cache is not None:
+        return cache.get(f'gbp/{market}', gbp_key(market, usd_gbp, bnb_usdt, price_index),
+                         lambda: _calculate_pnl(market, usd_gbp, bnb_usdt, workers, price_index, cache))
+    return _calculate_pnl(market, usd_gbp, bnb_usdt, workers, price_index)
+
+
+def _calculate_pnl(market, usd_gbp, bnb_usdt, workers=1, price_index=None, cache=None):
     processed_folder = './data/processed/'+market
     os.makedirs(processed_folder, exist_ok=True)
     results = []
     results_summary = []
 
-    for filename in os.listdir(raw_folder):
-        if filename.endswith('.csv'):
-            filepath = os.path.join(raw_folder, filename)
-            trades = pd.read_csv(filepath)
-
-            result, summary = calculate_pnl_2(trades)
-            print(f"{filename}:\n{summary}\n")
-            results.extend(result)
-            results_summary.append(summary)
+    for name, result, summary in pnl_per_symbol(market, workers, cache):
+        print(f"{name}:\n{summary}\n")
+        results.extend(result)
+        results_summary.append(summary)
 
     
     df = pd.DataFrame(results)
@@ -46,166 +126,282 @@ def calculate_pnl(market,usdt_to_gbp_df,bnb_to_usdt_df):
     df['exchange'] = 'BINANCE'
     df_summary = pd.DataFrame(results_summary)
     print(df.head())
-    df.sort_values('open_time',inplace=True)
+    df.sort_values('open_time',inplace=True,kind='mergesort')
     print('Summary:',df_summary['profit'].sum(),df_summary['commission_usdt'].sum(),df_summary['commission_bnb'].sum())
 
     output_path = os.path.join(processed_folder, 'combined_pnl.csv')
     df.to_csv(output_path, index=False)
     print(f"Saved to: {output_path}")
 
+    return add_gbp_values(df, usd_gbp, bnb_usdt, price_index)
+
+
+def add_gbp_values(df, usd_gbp, bnb_usdt, price_index=None):
+    # rates as-of each lot's open day (USD/GBP) and minute (BNB/USDT, commission assets), then the exact GBP columns
     df['open_time'] = pd.to_datetime(df['open_time'])
     df['open_time_minute'] = (df['open_time']).dt.floor('min')
     df['open_time_day'] = (df['open_time']).dt.floor('D')
 
-    df = pd.merge_asof(
-        df.sort_values('open_time_day'),
-        usdt_to_gbp_df[['USD_to_GBP']].sort_index().rename(columns={'USD_to_GBP': 'usd_gbp'}),
-        left_on='open_time_day',
-
-        right_index=True,
-        direction='backward'
-    )
-
-    df = pd.merge_asof(
-        df.sort_values('open_time_minute'),
-        bnb_to_usdt_df[['close']].sort_index().rename(columns={'close': 'bnb_usdt'}),
-        left_on='open_time_minute',
-
-        right_index=True,
-        direction='backward'
-    )
-
-
-    df['proceeds'] = df['proceeds'].apply(Decimal)
-    df['usd_gbp'] = df['usd_gbp'].apply(Decimal)
+    df = df.reset_index(drop=True)
+    df['usd_gbp'] = usd_gbp.asof(df['open_time_day'])
+    df['bnb_usdt'] = bnb_usdt.asof(df['open_time_minute'])
+    df = value_commissions(df, price_index or PriceIndex({'BNB': bnb_usdt}))
 
-    df['cost'] = df['cost'].apply(Decimal)
-    df['usd_gbp'] = df['usd_gbp'].apply(Decimal)
-
-    df['commission_usdt'] = df['commission_usdt'].apply(Decimal)
-    df['commission_bnb'] = df['commission_bnb'].apply(Decimal)
-    df['bnb_usdt'] = df['bnb_usdt'].apply(Decimal)
-
-
-
-
-
-
-
-    df['proceeds_in_gbp'] = df['proceeds'] * df['usd_gbp']
-    df['proceeds_in_gbp'] = df['proceeds_in_gbp'].apply(Decimal)
-
-    df['cost_in_gbp'] = df['cost'] * df['usd_gbp']
-    df['cost_in_gbp'] = df['cost_in_gbp'].apply(Decimal)
-
-    df['profit_in_gbp'] = df['proceeds_in_gbp']-df['cost_in_gbp']
-    df['profit_in_gbp'] = df['profit_in_gbp'].apply(Decimal)
-
-    df['commission_in_gbp'] = df['commission_usdt'] * df['usd_gbp'] + df['commission_bnb'] * \
-                               df['bnb_usdt'] * df['usd_gbp']
-    df['commission_in_gbp'] = df['commission_in_gbp'].apply(Decimal)
-
-    df['cost_in_gbp']= df['cost_in_gbp']+df['commission_in_gbp']
-    df['cost_in_gbp'] = df['cost_in_gbp'].apply(Decimal)
-
-    df['net_profit_in_gbp'] = df['profit_in_gbp'] - df['commission_in_gbp']
-    df['net_profit_in_gbp'] = df['net_profit_in_gbp'].apply(Decimal)
+    df = convert_trades_to_gbp(df)
 
     return df
 
  
 
-def get_report():
-
-    #exchange.get_price_minute('BNB','USDT')
-    get_usd_to_gbp_from_yahoo(start = '2024-04-01',end=end_time)
-
-    usdt_to_gbp_df = pd.read_csv('./data/usd_gbp.csv', index_col=0)
-    # df[Price   ,     Date,  USD_to_GBP]
-    usdt_to_gbp_df = usdt_to_gbp_df.iloc[1:]
-    usdt_to_gbp_df['Date'] = pd.to_datetime(usdt_to_gbp_df['Date'])
-    usdt_to_gbp_df.set_index('Date')
-    usdt_to_gbp_df = usdt_to_gbp_df.set_index('Date')
-    usdt_to_gbp_df = usdt_to_gbp_df.sort_index()
-
-    bnb_to_usdt_df = pd.read_csv('./data/bnb_usdt.csv', index_col=0)
-    # df[datetime  close]
-    bnb_to_usdt_df['datetime'] = pd.to_datetime(bnb_to_usdt_df['datetime'])
-    bnb_to_usdt_df = bnb_to_usdt_df.set_index('datetime')
-    bnb_to_usdt_df = bnb_to_usdt_df.sort_index()
-
-    trades_spot_df = calculate_pnl('spot', usdt_to_gbp_df, bnb_to_usdt_df)
-    trades_margin_df = calculate_pnl('margin', usdt_to_gbp_df, bnb_to_usdt_df)
+def raw_commission_assets(markets):
+    # every commissionAsset in the raw trades, from the store or the same ./data/raw CSVs pnl_sources reads
+    # (one column only; files without the column, like futures income, add nothing)
+    columns = []
+    for market in markets:
+        if list_symbols(market):
+            columns.append(read_trades(market, columns=['commissionAsset'], start=start_time, end=end_time)['commissionAsset'])
+            continue
+        for path in pnl_sources(market)[3]:
+            df = pd.read_csv(path, usecols=lambda column: column == 'commissionAsset')
+            if 'commissionAsset' in df.columns:
+                columns.append(df['commissionAsset'])
+    return commission_assets(*columns)
+
+
+def raw_interest_assets(folder='./data/raw/interest'):
+    # every asset interest was charged in (the borrowed asset, or BNB when converted) that needs a USDT price
+    if not os.path.isdir(folder):
+        return []
+    return commission_assets(*[pd.read_csv(os.path.join(folder, filename), usecols=['asset'])['asset']
+                               for filename in sorted(os.listdir(folder))
+                               if filename.startswith('interest_margin') and filename.endswith('.csv')])
+
+
+def priced_assets(markets):
+    # fee assets of the raw trades and interest assets, all valued from <asset>USDT minutes
+    return sorted(set(raw_commission_assets(markets)).union(raw_interest_assets()))
+
+
+def sync_commission_prices(markets):
+    # fetch the minutes of each fee and interest asset's USDT pair the local price cache has not covered yet
+    for asset in priced_assets(markets):
+        if asset != 'BNB':
+            exchange.cache_price_minute(asset, 'USDT')
+
+
+def commission_price_index(markets, bnb_usdt):
+    # BNB keeps the bnb_usdt series, other fee and interest assets are only read from the local price
+    # cache (filled by sync_commission_prices), so building a report makes no requests
+    assets = priced_assets(markets)
+    start_ms, end_ms = exchange.price_period()
+    uncovered = [asset for asset in assets if asset != 'BNB'
+                 and exchange.price_cache.missing(asset + 'USDT', start_ms, end_ms)
+                 and not exchange.price_cache.is_unavailable(asset + 'USDT')]
+    if uncovered:
+        print(f"Warning: USDT prices of asset(s) {', '.join(uncovered)} are not cached for the whole "
+              f"period, run with --sync-prices to fetch them")
+    return PriceIndex.from_price_cache(exchange.price_cache, assets, series={'BNB': bnb_usdt})
+
+
+def read_interest_files(folder='./data/raw/interest'):
+    # cross margin interest_margin.csv and every isolated pair's interest_margin_<SYMBOL>.csv in one frame;
+    # isolatedSymbol is empty for cross rows, so allocation keeps isolated interest on its own pair
+    frames = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.startswith('interest_margin') and filename.endswith('.csv'):
+            df = pd.read_csv(os.path.join(folder, filename))
+            if 'isolatedSymbol' not in df.columns:
+                symbol = filename[len('interest_margin_'):-len('.csv')] if filename != 'interest_margin.csv' else None
+                df['isolatedSymbol'] = symbol
+            frames.append(df)
+    if not frames:
+        raise FileNotFoundError(f"no interest_margin*.csv in {folder}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def allocate_interest(df_combined, interest_df):
+    # add interest charge to trade cost, only margin trades take interest (per isolated symbol or borrowed asset)
+    return add_interest_in_gbp(df_combined, interest_per_trade(df_combined, interest_df))
+
+
+
+def build_report(tracer, usd_gbp, bnb_usdt, price_index, interest_df, futures_df, workers=1, cache=None):
+    # the pnl, interest, csv and pdf stages with every disposal in one frame
+    # cache (a StageCache) reuses lots and interest allocation whose inputs are unchanged, csv and pdf always rerun
+    with tracer.stage('pnl_spot') as stage:
+        trades_spot_df = calculate_pnl('spot', usd_gbp, bnb_usdt, workers=workers, price_index=price_index,
+                                       cache=cache)
+        stage['rows'] = len(trades_spot_df)
+    with tracer.stage('pnl_margin') as stage:
+        trades_margin_df = calculate_pnl('margin', usd_gbp, bnb_usdt, workers=workers, price_index=price_index,
+                                         cache=cache)
+        stage['rows'] = len(trades_margin_df)
     # open_time,close_time,symbol,qty,profit,commission_usdt,commission_bnb
     df_combined = pd.concat([trades_spot_df, trades_margin_df], ignore_index=True)
 
-    interest_df = pd.read_csv('./data/raw/interest/interest_margin.csv')
-    interest_df['interestAccuredTime'] = pd.to_datetime(interest_df['interestAccuredTime'])
-    interest_df = pd.merge_asof(
-        interest_df.sort_values('interestAccuredTime'),
-        bnb_to_usdt_df[['close']].sort_index().rename(columns={'close': 'bnb_usdt'}),
-        left_on='interestAccuredTime',
-        right_index=True,
-        direction='backward'
-    )
-    interest_df = pd.merge_asof(
-        interest_df.sort_values('interestAccuredTime'),
-        usdt_to_gbp_df[['USD_to_GBP']].sort_index().rename(columns={'USD_to_GBP': 'usd_to_gbp'}),
-        left_on='interestAccuredTime',
-        right_index=True,
-        direction='backward'
-    )
-
-    interest_df['interest'] = interest_df['interest'].apply(Decimal)
-    interest_df['bnb_usdt'] = interest_df['bnb_usdt'].apply(Decimal)
-
-    interest_df['usd_to_gbp'] = interest_df['usd_to_gbp'].apply(Decimal)
-    interest_df['usd_to_gbp'] = interest_df['usd_to_gbp'].apply(Decimal)
-
-    interest_df['interest_in_usd'] = interest_df['interest'] * interest_df['bnb_usdt']
-    interest_df['interest_in_usd'] = interest_df['interest_in_usd'].apply(Decimal)
-
-    interest_df['interest_in_gbp'] = interest_df['interest_in_usd'] * interest_df['usd_to_gbp']
-    interest_df['interest_in_gbp'] = interest_df['interest_in_gbp'].apply(Decimal)
-
-    df_combined['disposal_date'] = pd.to_datetime(df_combined['disposal_date'])
-
-    # add interest charge to trade cost, use data only from margin as interest only in margin
-    trades_sorted = df_combined[df_combined['market'] == 'margin'][['disposal_date']].reset_index().rename(
-        columns={'index': 'trade_id'}).sort_values('disposal_date')
-    interest_sorted = interest_df.sort_values('interestAccuredTime')
-    merged = pd.merge_asof(
-        interest_sorted,
-        trades_sorted,
-        left_on='interestAccuredTime',
-        right_on='disposal_date',
-        direction='nearest'
-    )
-    merged['interest_in_gbp'] = merged['interest_in_gbp'].apply(Decimal)
-    assigned = merged.groupby('trade_id')['interest_in_gbp'].sum().reset_index()
-    df_combined = df_combined.reset_index().rename(columns={'index': 'trade_id'})
-    df_combined = df_combined.merge(assigned, on='trade_id', how='left').fillna({'interest_in_gbp': 0})
-    df_combined['interest_in_gbp'] = df_combined['interest_in_gbp'].apply(Decimal)
-    df_combined['cost_in_gbp'] = df_combined['cost_in_gbp'].apply(Decimal)
-    df_combined['cost_in_gbp'] += df_combined['interest_in_gbp']
-    df_combined['cost_in_gbp'] = df_combined['cost_in_gbp'].apply(Decimal)
-
-    df_combined['proceeds_in_gbp'] = df_combined['proceeds_in_gbp'].apply(Decimal)
-    df_combined['net_profit_in_gbp'] = df_combined['proceeds_in_gbp']-df_combined['cost_in_gbp']
-    df_combined['net_profit_in_gbp'] = df_combined['net_profit_in_gbp'].apply(Decimal)
-    df_combined = df_combined.drop(columns=['trade_id'])
+    with tracer.stage('interest_allocation') as stage:
+        df_combined['disposal_date'] = pd.to_datetime(df_combined['disposal_date'])
+        df_combined = df_combined.sort_values(DISPOSAL_ORDER, kind='mergesort', ignore_index=True)
 
-    print(trades_margin_df.tail())
+        if cache is not None:
+            key = fingerprint([gbp_key(market, usd_gbp, bnb_usdt, price_index) for market in ['spot', 'margin']],
+                              interest_df, code_digest(*INTEREST_CODE))
+            allocated = cache.get('interest_allocation', key, lambda: interest_per_trade(df_combined, interest_df))
+            df_combined = add_interest_in_gbp(df_combined, allocated)
+        else:
+            df_combined = allocate_interest(df_combined, interest_df)
+        stage['rows'] = len(df_combined)
 
-    df_combined.to_csv('combined.csv')
+    if not futures_df.empty:
+        df_combined = pd.concat([df_combined, futures_df], ignore_index=True)
 
-    generate_uk_crypto_tax_pdf_report(df_combined)
+    print(trades_margin_df.tail())
 
-def get_report1():
-    df_combined=pd.read_csv('combined.csv')
+    with tracer.stage('csv_write', rows=len(df_combined)):
+        df_combined.to_csv('combined.csv')
+
+    with tracer.stage('pdf_build', rows=len(df_combined)):
+        generate_uk_crypto_tax_pdf_report(df_combined)
+
+
+
+def build_report_chunked(tracer, usd_gbp, bnb_usdt, price_index, interest_df, futures_df, workers=1,
+                         batch_rows=BATCH_ROWS, spill_folder=SPILL_ROOT, cache=None):
+    # out-of-core version of the pnl, interest, csv and pdf stages: each symbol's lots get their GBP values and are
+    # spilled as a sorted run, the runs are merged back by disposal date batch_rows at a time (once to allocate
+    # interest, once to write combined.csv and the report), and totals are kept as running sums
+    # cache (a StageCache) reuses the lots of symbols whose trades are unchanged
+    runs = SpillRuns(os.path.join(spill_folder, 'runs'), sort_columns=DISPOSAL_ORDER)
+    for market in ['spot', 'margin']:
+        with tracer.stage(f'pnl_{market}') as stage:
+            for name, result, summary in pnl_per_symbol(market, workers, cache):
+                print(f"{name}:\n{summary}\n")
+                if not result:
+                    continue
+                df = pd.DataFrame(result)
+                df['market'] = market
+                df['exchange'] = 'BINANCE'
+                df = add_gbp_values(df, usd_gbp, bnb_usdt, price_index)
+                df['disposal_date'] = pd.to_datetime(df['disposal_date'])
+                runs.add(df)
+            stage['rows'] = len(runs)
+
+    with tracer.stage('interest_allocation', rows=len(runs)):
+        sweep = InterestSweep(interest_df)
+        for batch in runs.merged(columns=['market', 'symbol', 'disposal_date'], batch_rows=batch_rows):
+            sweep.add(batch)
+        allocated = sweep.allocation()
+
+    with tracer.stage('csv_write') as stage:
+        columns = runs.columns + ['interest_in_gbp']
+        if not futures_df.empty:
+            columns += [column for column in futures_df.columns if column not in columns]
+        disposals = SortedSpill(os.path.join(spill_folder, 'disposals'), dtypes=TABLE_DTYPES)
+        totals = EMPTY_TOTALS
+        position = 0
+        with open('combined.csv', 'w', newline='') as f:
+            for batch in runs.merged(batch_rows=batch_rows):
+                batch.index = pd.RangeIndex(position, position + len(batch))
+                batch = add_interest_in_gbp(batch, [allocated.get(i, Decimal(0)) for i in batch.index])
+                batch.reindex(columns=columns).to_csv(f, header=position == 0)
+                position += len(batch)
+
+                batch = prepare_disposals(batch)
+                totals = add_totals(totals, disposal_totals(batch))
+                disposals.add(batch[TABLE_COLUMNS])
+            if not futures_df.empty:
+                futures = futures_df.reindex(columns=columns)
+                futures.index = pd.RangeIndex(position, position + len(futures))
+                futures.to_csv(f, header=position == 0)
+                position += len(futures)
+        stage['rows'] = position
+
+    with tracer.stage('pdf_build', rows=position):
+        build_uk_crypto_tax_pdf_report(disposals, totals, futures_df)
+
+
+
+def get_report(workers=1, trace_path=None, profile_dir=None, fx_provider=None, chunked=False, batch_rows=BATCH_ROWS,
+               cache_root=CACHE_ROOT):
+    # every stage is timed; trace_path writes the JSON trace, profile_dir a profile per stage
+    # fx_provider fills missing FX dates, Yahoo Finance by default
+    # chunked keeps disposals on disk and batch_rows of them in memory, for histories that do not fit in RAM
+    # stage results are cached under cache_root by the hash of their inputs (trades, rates, code); None disables it
+    tracer = StageTracer(profile_dir=profile_dir)
+    cache = StageCache(cache_root) if cache_root else None
 
-    generate_uk_crypto_tax_pdf_report(df_combined)
-#exchange.get_all_isolated_margin_interest_history_all_year()
-#exchange.get_margin_interest_history_all_year()
-get_report()
-#get_report1()
+    #exchange.get_price_minute('BNB','USDT')
+    with tracer.stage('fx_load') as stage:
+        # USD/GBP comes from the local FX store, which only downloads days it has not stored yet
+        usd_gbp = FxStore(fx_provider).series('USD', 'GBP', '2024-04-01', end_time)
+        # df[datetime  close], converted once to a memory-mapped series
+        bnb_usdt = series_from_csv('./data/bnb_usdt.csv', 'datetime', 'close')
+        stage['rows'] = len(usd_gbp) + len(bnb_usdt)
+
+    with tracer.stage('commission_prices') as stage:
+        price_index = commission_price_index(['spot', 'margin', 'futures'], bnb_usdt)
+        stage['rows'] = len(price_index.keys)
+        stage['assets'] = price_index.assets
+
+    with tracer.stage('interest_merge') as stage:
+        interest_df = read_interest_files()
+        interest_df['interestAccuredTime'] = pd.to_datetime(interest_df['interestAccuredTime']).astype('datetime64[ns]')
+        interest_df = interest_df.sort_values('interestAccuredTime').reset_index(drop=True)
+        interest_df['bnb_usdt'] = bnb_usdt.asof(interest_df['interestAccuredTime'])
+        interest_df['usd_to_gbp'] = usd_gbp.asof(interest_df['interestAccuredTime'])
+        # each record in its own asset: isolated interest is charged in the borrowed asset, not BNB
+        interest_df = convert_interest_to_gbp(value_interest(interest_df, price_index))
+        stage['rows'] = len(interest_df)
+
+    with tracer.stage('pnl_futures') as stage:
+        # daily realized PnL, fees and funding, for Other Gains and Costs & Expenses
+        def futures_rows():
+            return futures_in_gbp(futures_daily_totals(price_index=price_index, start=start_time, end=end_time),
+                                  usd_gbp)
+
+        if cache is not None:
+            key = fingerprint(folder_digest(FUTURES_FOLDER), folder_digest(os.path.join(STORE_ROOT, 'market=futures')),
+                              start_time, end_time, usd_gbp, price_index, code_digest(*FUTURES_CODE))
+            futures_df = cache.get('pnl_futures', key, futures_rows)
+        else:
+            futures_df = futures_rows()
+        stage['rows'] = len(futures_df)
+
+    if chunked:
+        build_report_chunked(tracer, usd_gbp, bnb_usdt, price_index, interest_df, futures_df, workers=workers,
+                             batch_rows=batch_rows, cache=cache)
+    else:
+        build_report(tracer, usd_gbp, bnb_usdt, price_index, interest_df, futures_df, workers=workers, cache=cache)
+
+    if cache is not None:
+        print(f"Cache: {len(cache.hits)} stages reused, {len(cache.misses)} recomputed")
+    print(tracer.summary())
+    if trace_path:
+        tracer.write(trace_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the UK crypto tax report')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes used to calculate PnL per symbol, 1 runs serially')
+    parser.add_argument('--trace', help='write stage timings as JSON to this file')
+    parser.add_argument('--profile', help='folder for a cProfile dump of each stage')
+    parser.add_argument('--fx-csv', help='fill missing FX dates from this CSV (Date, USD_to_GBP) instead of Yahoo')
+    parser.add_argument('--chunked', action='store_true',
+                        help='keep disposals on disk and merge them back in batches, for very large histories')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS,
+                        help='disposals held in memory at a time with --chunked')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='recompute every stage instead of reusing results whose inputs are unchanged')
+    parser.add_argument('--sync-prices', action='store_true',
+                        help='first fetch USDT prices of commission assets missing from the local price cache; '
+                             'the report itself only reads the cache')
+    args = parser.parse_args()
+
+    if args.sync_prices:
+        sync_commission_prices(['spot', 'margin', 'futures'])
+
+    #exchange.get_all_isolated_margin_interest_history_all_year()
+    #exchange.get_margin_interest_history_all_year()
+    get_report(workers=args.workers, trace_path=args.trace, profile_dir=args.profile,
+               fx_provider=CsvFxProvider(args.fx_csv) if args.fx_csv else None,
+               chunked=args.chunked, batch_rows=args.batch_rows, cache_root=None if args.no_cache else CACHE_ROOT)
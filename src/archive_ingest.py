@@ -0,0 +1,113 @@
+import os
+import shutil
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from src.trade_store import STORE_ROOT, write_trades
+
+CHUNK_ROWS = 500_000
+
+# header names used by Binance trade exports (and the API field names), per store column
+ARCHIVE_COLUMNS = {
+    'datetime': ('Date(UTC)', 'Time(UTC)', 'Date', 'time'),
+    'symbol': ('Symbol', 'Pair', 'symbol'),
+    'side': ('Side', 'side'),
+    'price': ('Price', 'price'),
+    'qty': ('Quantity', 'Executed', 'qty'),
+    'quoteQty': ('Amount', 'quoteQty'),
+    'commission': ('Fee', 'commission'),
+    'commissionAsset': ('Fee Coin', 'Fee Asset', 'commissionAsset'),
+    'realizedPnl': ('Realized Profit', 'Realized PnL', 'realizedPnl'),
+    'orderId': ('Order ID', 'orderId'),
+    'id': ('Trade ID', 'id'),
+}
+NUMERIC_COLUMNS = ['price', 'qty', 'quoteQty', 'commission', 'realizedPnl']
+# "0.0123 USDT" style cells: the number, then an optional asset
+AMOUNT_PATTERN = r'^\s*([-+]?[0-9.,]+(?:[eE][-+]?\d+)?)\s*([A-Za-z0-9]*)\s*$'
+
+
+def _amounts(values: pd.Series):
+    # numbers and the assets written after them, for columns exported as text
+    if values.dtype != object and not pd.api.types.is_string_dtype(values):
+        return values.astype(float), None
+    parts = values.astype(str).str.extract(AMOUNT_PATTERN)
+    numbers = pd.to_numeric(parts[0].str.replace(',', '', regex=False), errors='coerce')
+    return numbers, parts[1].replace('', np.nan)
+
+
+def normalize_archive_trades(raw: pd.DataFrame, row_offset=0) -> pd.DataFrame:
+    """
+    Exported trades in the store's columns (datetime, symbol, side, price,
+    qty, quoteQty, commission, commissionAsset, realizedPnl, orderId, id).
+
+    Headers are matched through ARCHIVE_COLUMNS. A fee written as
+    "0.0123 USDT" gives both commission and commissionAsset; trades without
+    a trade id are numbered by their row in the archive (row_offset + i).
+    """
+    found = {}
+    for column, names in ARCHIVE_COLUMNS.items():
+        name = next((name for name in names if name in raw.columns), None)
+        if name is not None:
+            found[column] = raw[name]
+    missing = {'datetime', 'symbol', 'side', 'price', 'qty'} - set(found)
+    if missing:
+        raise ValueError(f"trade archive lacks columns for {sorted(missing)}: {list(raw.columns)}")
+
+    df = pd.DataFrame(index=raw.index)
+    times = found['datetime']
+    df['datetime'] = (pd.to_datetime(times, unit='ms') if pd.api.types.is_numeric_dtype(times)
+                      else pd.to_datetime(times, format='ISO8601'))
+    df['symbol'] = found['symbol'].astype(str).str.upper()
+    df['side'] = found['side'].astype(str).str.lower()
+    for column in NUMERIC_COLUMNS:
+        if column not in found:
+            df[column] = np.nan
+            continue
+        df[column], asset = _amounts(found[column])
+        if column == 'commission' and asset is not None and 'commissionAsset' not in found:
+            found['commissionAsset'] = asset
+    if 'quoteQty' not in found:
+        df['quoteQty'] = df['price'] * df['qty']
+    df['commissionAsset'] = found['commissionAsset'] if 'commissionAsset' in found else None
+    df['orderId'] = pd.to_numeric(found['orderId'], errors='coerce') if 'orderId' in found else np.nan
+    df['id'] = (pd.to_numeric(found['id'], errors='coerce') if 'id' in found
+                else pd.Series(np.arange(row_offset, row_offset + len(raw)), index=raw.index))
+    return df
+
+
+def read_trade_archive(zip_path, chunksize=CHUNK_ROWS):
+    """Normalized trades from every CSV member of a zip, chunksize rows at a time, read without extracting."""
+    offset = 0  # rows read so far, across members, numbering trades without an id
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in sorted(archive.namelist()):
+            if not member.lower().endswith('.csv'):
+                continue
+            with archive.open(member) as f:
+                for chunk in pd.read_csv(f, chunksize=chunksize):
+                    yield normalize_archive_trades(chunk, row_offset=offset)
+                    offset += len(chunk)
+
+
+def ingest_trade_archive(zip_path, market='futures', root=STORE_ROOT, chunksize=CHUNK_ROWS) -> int:
+    """
+    Load an exported trade archive into the trade store; returns the number of fills.
+
+    Every symbol and month the archive covers is replaced: its stored
+    partition is cleared the first time the archive touches it, then the
+    chunks are appended, so only one chunk is in memory at a time.
+    """
+    cleared = set()
+    rows = 0
+    for df in read_trade_archive(zip_path, chunksize=chunksize):
+        if df.empty:
+            continue
+        months = df['datetime'].dt.strftime('%Y-%m')
+        for symbol, month in set(zip(df['symbol'], months)) - cleared:
+            shutil.rmtree(os.path.join(root, f'market={market}', f'symbol={symbol}', f'month={month}'),
+                          ignore_errors=True)
+            cleared.add((symbol, month))
+        write_trades(df, market, root=root, append=True)
+        rows += len(df)
+    return rows
@@ -0,0 +1,169 @@
+import os
+import shutil
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.gbp_conversion import to_decimal
+
+SPILL_ROOT = './data/spill'
+# disposals per batch when merging spill files back, the unit of memory in the chunked pipeline
+BATCH_ROWS = 50_000
+# fewest rows read from each run at a time, however many runs are merged
+MIN_RUN_ROWS = 1024
+
+
+class SpillFiles:
+    """
+    Frames written to numbered parquet files in a folder, cleared when opened.
+
+    Decimal columns (the exact *_in_gbp values) are stored as their exact
+    strings, parquet having no arbitrary precision decimal, and are turned
+    back into Decimals on read.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+        self.paths = []
+        self.lengths = []
+        self.columns = []
+        self.decimal_columns = set()
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def add(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        stored = {}
+        for column in df.columns:
+            values = df[column]
+            if values.dtype == object and isinstance(values.dropna().iloc[0] if values.notna().any() else None,
+                                                     Decimal):
+                self.decimal_columns.add(column)
+            if column in self.decimal_columns:
+                values = values.map(lambda v: 'NaN' if v is None else str(v)).astype(object)
+            stored[column] = values
+            if column not in self.columns:
+                self.columns.append(column)
+        path = os.path.join(self.folder, f'part-{len(self.paths):06d}.parquet')
+        pq.write_table(pa.Table.from_pandas(pd.DataFrame(stored), preserve_index=False), path,
+                       row_group_size=BATCH_ROWS)
+        self.paths.append(path)
+        self.lengths.append(len(df))
+
+    def restore(self, df: pd.DataFrame) -> pd.DataFrame:
+        for column in self.decimal_columns.intersection(df.columns):
+            df[column] = to_decimal(df[column].to_numpy(dtype=object))
+        return df
+
+
+class SpillRuns(SpillFiles):
+    """
+    Sorted runs of disposals on disk, merged back in sort order a batch at a time.
+
+    add() sorts each frame (one symbol's lots) by sort_columns and writes it
+    as a run; merged() k-way merges the runs, reading each a slice at a time,
+    so memory holds about one batch however many disposals were spilled. Rows
+    with equal keys come back in run order, then in their order within the
+    run, as one stable sort of all the runs added one after another would
+    return them.
+    """
+
+    def __init__(self, folder, sort_columns=('disposal_date',)):
+        super().__init__(folder)
+        self.sort_columns = [sort_columns] if isinstance(sort_columns, str) else list(sort_columns)
+
+    def add(self, df: pd.DataFrame):
+        super().add(df.sort_values(self.sort_columns, kind='mergesort'))
+
+    def merged(self, columns=None, batch_rows=BATCH_ROWS):
+        """Every spilled row in sort order (stable across runs), as frames of about batch_rows."""
+        run_rows = max(MIN_RUN_ROWS, batch_rows // max(len(self.paths), 1))
+        if columns is not None:
+            columns = list(columns) + [c for c in self.sort_columns if c not in columns]
+        readers = []
+        for path in self.paths:
+            parquet = pq.ParquetFile(path)
+            read = None if columns is None else [c for c in columns if c in parquet.schema_arrow.names]
+            readers.append(parquet.iter_batches(batch_size=run_rows, columns=read))
+        buffers = [self._next(reader) for reader in readers]
+
+        pending = []
+        while True:
+            live = [i for i, buffer in enumerate(buffers) if buffer is not None]
+            if not live:
+                break
+            # rows up to the smallest (last key, run) of the buffers can be emitted: no run holds anything earlier,
+            # and rows equal to that key wait in later runs until the run it came from has none left
+            frontier, frontier_run = min((self._key(buffers[i].iloc[-1]), i) for i in live)
+            parts = []
+            for i in live:
+                cut = self._rows_before(buffers[i], frontier, inclusive=i <= frontier_run)
+                parts.append(buffers[i].iloc[:cut])
+                rest = buffers[i].iloc[cut:]
+                buffers[i] = rest if len(rest) else self._next(readers[i])
+            pending.append(pd.concat(parts, ignore_index=True).sort_values(self.sort_columns, kind='mergesort'))
+            if sum(len(part) for part in pending) >= batch_rows:
+                yield self.restore(pd.concat(pending, ignore_index=True))
+                pending = []
+        if pending:
+            yield self.restore(pd.concat(pending, ignore_index=True))
+
+    def _key(self, row):
+        return tuple(row[column] for column in self.sort_columns)
+
+    def _rows_before(self, buffer, key, inclusive):
+        # rows of the sorted buffer before key (or equal to it when inclusive), compared column by column
+        before = np.full(len(buffer), inclusive)
+        for column, value in reversed(list(zip(self.sort_columns, key))):
+            values = buffer[column]
+            before = ((values < value) | ((values == value) & before)).to_numpy()
+        return int(before.sum())
+
+    @staticmethod
+    def _next(reader):
+        batch = next(reader, None)
+        return None if batch is None else batch.to_pandas()
+
+
+class SortedSpill(SpillFiles):
+    """
+    Frames appended in order and read back by row position, as the report's
+    disposal table does (len() and .iloc[start:stop]); one file is cached, so
+    a page costs a file read only when it crosses into the next one. dtypes
+    ({column: dtype}) shapes the empty frame returned when nothing was added.
+    """
+
+    def __init__(self, folder, dtypes=None):
+        super().__init__(folder)
+        self.dtypes = dtypes or {}
+        self._cached = (None, None)
+
+    @property
+    def iloc(self):
+        return self
+
+    def __getitem__(self, rows: slice):
+        start, stop, _ = rows.indices(len(self))
+        offsets = np.cumsum([0] + self.lengths)
+        parts = []
+        for i in range(int(np.searchsorted(offsets, start, side='right')) - 1, len(self.paths)):
+            if offsets[i] >= stop:
+                break
+            parts.append(self._file(i).iloc[max(start - offsets[i], 0):stop - offsets[i]])
+        if not parts:
+            if self.paths:
+                return self._file(0).iloc[:0]
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in self.dtypes.items()})
+        return pd.concat(parts, ignore_index=True)
+
+    def _file(self, i):
+        if self._cached[0] != i:
+            self._cached = (i, self.restore(pq.read_table(self.paths[i]).to_pandas()))
+        return self._cached[1]
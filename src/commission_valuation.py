@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from src.price_series import to_minutes
+
+# fee assets worth one USDT, needing no price series
+USD_ASSETS = ('USDT', 'BUSD', 'USDC', 'FDUSD', 'TUSD', 'USDP', 'DAI')
+
+# composite key = asset code * 2**32 + minute, minutes since 1970 stay far below 2**32
+_CODE_SHIFT = np.int64(2 ** 32)
+
+
+def commission_assets(*asset_columns) -> list:
+    """Distinct fee assets in the given commissionAsset columns that need a USDT price."""
+    assets = set()
+    for column in asset_columns:
+        assets.update(str(asset) for asset in pd.unique(np.asarray(column, dtype=object)) if pd.notna(asset))
+    return sorted(assets.difference(USD_ASSETS))
+
+
+class PriceIndex:
+    """
+    USDT prices of many assets in one sorted array for batched as-of lookups.
+
+    Every asset's minute series is stored under the key code * 2**32 + minute,
+    so all series sit in one sorted int64 array and rates() values a whole
+    column of (asset, time) pairs with a single searchsorted, however many fee
+    assets there are.
+
+        index = PriceIndex({'BNB': bnb_usdt, 'ETH': eth_usdt})
+        index.rates(df['commission_asset_sell'], df['open_time_minute'])
+
+    Series are anything with int64 minute 'times' and float 'closes'
+    (PriceSeries), or DataFrames of open_time (ms) and close (PriceCache.load).
+    """
+
+    def __init__(self, series: dict):
+        self.codes = {}
+        keys, closes = [], []
+        for asset in sorted(series):
+            times, values = _minutes_and_closes(series[asset])
+            code = len(self.codes)
+            self.codes[asset] = code
+            keys.append(code * _CODE_SHIFT + times)
+            closes.append(values)
+        self.keys = np.concatenate(keys) if keys else np.array([], dtype='int64')
+        self.closes = np.concatenate(closes) if closes else np.array([], dtype='float64')
+
+    @classmethod
+    def from_price_cache(cls, cache, assets, quote='USDT', series=None):
+        """Index of each asset's <asset><quote> minutes stored in a PriceCache, plus any series given."""
+        series = dict(series or {})
+        for asset in assets:
+            if asset not in series:
+                series[asset] = cache.load(asset + quote)
+        return cls(series)
+
+    @property
+    def assets(self):
+        return list(self.codes)
+
+    def rates(self, assets, datetimes) -> np.ndarray:
+        """
+        USDT price of each asset as-of each datetime (last minute at or before it).
+
+        USD stablecoins are 1. Assets without a series, or times before an
+        asset's first price, are NaN.
+        """
+        assets = pd.Series(np.asarray(assets, dtype=object)).astype(str)
+        codes = assets.map(self.codes).fillna(-1).to_numpy(dtype='int64')
+        keys = codes * _CODE_SHIFT + to_minutes(datetimes)
+
+        idx = np.searchsorted(self.keys, keys, side='right') - 1
+        found = (codes >= 0) & (idx >= 0)
+        # a hit in the previous asset's block means there is no earlier price for this asset
+        found[found] = self.keys[idx[found]] // _CODE_SHIFT == codes[found]
+        rates = np.full(len(keys), np.nan)
+        rates[found] = self.closes[idx[found]]
+        rates[assets.isin(USD_ASSETS).to_numpy()] = 1.0
+        return rates
+
+
+def _minutes_and_closes(series):
+    if isinstance(series, pd.DataFrame):
+        times = series['open_time'].to_numpy(dtype='int64') // 60_000
+        closes = series['close'].to_numpy(dtype='float64')
+    else:
+        times = np.asarray(series.times, dtype='int64')
+        closes = np.asarray(series.closes, dtype='float64')
+    order = np.argsort(times, kind='stable')
+    return times[order], closes[order]
+
+
+def value_commissions(df: pd.DataFrame, index: PriceIndex, time_column='open_time_minute') -> pd.DataFrame:
+    """
+    Add commission_rate_sell and commission_rate_buy, the USDT price of each
+    side's commission asset as-of the lot's time, in one lookup for both sides.
+
+    Fee assets the index cannot price are reported and valued at 0, like
+    before, rather than turning the whole GBP total into NaN.
+    """
+    n = len(df)
+    assets = np.concatenate([df['commission_asset_sell'].to_numpy(dtype=object),
+                             df['commission_asset_buy'].to_numpy(dtype=object)])
+    times = np.concatenate([df[time_column].to_numpy(), df[time_column].to_numpy()])
+    rates = index.rates(assets, times)
+
+    commissions = np.concatenate([df['commission_sell'].to_numpy(dtype=float),
+                                  df['commission_buy'].to_numpy(dtype=float)])
+    unpriced = np.isnan(rates) & (commissions != 0)
+    if unpriced.any():
+        missing = sorted(set(pd.Series(assets[unpriced]).astype(str)))
+        print(f"Warning: no USDT price for commission asset(s) {', '.join(missing)} "
+              f"on {int(unpriced.sum())} fills, valued at 0")
+    rates = np.where(np.isnan(rates), 0.0, rates)
+
+    df['commission_rate_sell'] = rates[:n]
+    df['commission_rate_buy'] = rates[n:]
+    return df
+
+
+def value_interest(df: pd.DataFrame, index: PriceIndex, time_column='interestAccuredTime') -> pd.DataFrame:
+    """
+    Add interest_rate, the USDT price of each interest record's asset as-of
+    its accrual: isolated interest is charged in the borrowed asset, cross
+    interest in BNB once converted. Unpriced assets are reported and valued
+    at 0, as value_commissions does.
+    """
+    rates = index.rates(df['asset'], df[time_column])
+    unpriced = np.isnan(rates) & (df['interest'].to_numpy(dtype=float) != 0)
+    if unpriced.any():
+        missing = sorted(set(df['asset'].to_numpy(dtype=object)[unpriced].astype(str)))
+        print(f"Warning: no USDT price for interest asset(s) {', '.join(missing)} "
+              f"on {int(unpriced.sum())} records, valued at 0")
+    df['interest_rate'] = np.where(np.isnan(rates), 0.0, rates)
+    return df
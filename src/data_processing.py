@@ -2,8 +2,14 @@ import math
 import os
 from collections import deque
 
+import numpy as np
 import pandas as pd
 
+from src.trade_store import fills_frame, read_trades
+
+# columns calculate_pnl_2 reads from a trades frame
+PNL_COLUMNS = ['datetime', 'symbol', 'side', 'price', 'qty', 'quoteQty', 'commission', 'commissionAsset']
+
 
 def calculate_pnl(trades: pd.DataFrame) -> pd.DataFrame:
     """
@@ -169,6 +175,11 @@ def calculate_pnl_one(sell_orders, buy_orders):
             "profit": profit,
             "commission_usdt": commission_usdt,
             "commission_bnb": commission_bnb,
+            # each side's commission in its own asset, so any fee asset can be valued later
+            "commission_sell": sell_order['commission'],
+            "commission_asset_sell": sell_order['commissionAsset'],
+            "commission_buy": buy_order['commission'],
+            "commission_asset_buy": buy_order['commissionAsset'],
             # New fields for tax reporting
             "disposal_date": disposal_date,
             "asset": asset,
@@ -199,41 +210,42 @@ def calculate_pnl_one(sell_orders, buy_orders):
 
 def modify_trade_list(common_cum_qtys, trade_list):
     # modify open_shorts to match common_cum_qtys
-    for common_cum_qty in common_cum_qtys:
-        for i in range(len(trade_list)):
-            cum_qty = trade_list[i]['cum_qty']
+    # common_cum_qtys and trade_list cum_qty are both ascending, so walk them
+    # together and split each trade at every breakpoint that falls inside it
+    modified = []
+    j = 0
+    for trade in trade_list:
+        while j < len(common_cum_qtys) and common_cum_qtys[j] <= trade['cum_qty']:
+            common_cum_qty = common_cum_qtys[j]
+            j += 1
+            cum_qty = trade['cum_qty']
             if common_cum_qty == cum_qty:
                 break
-            if common_cum_qty < cum_qty:
-                diff = cum_qty - common_cum_qty
-
-                symbol = trade_list[i]['symbol']
-
-                price = trade_list[i]['price']
-                qty = trade_list[i]['qty']
-
-                commission = trade_list[i]['commission']
-                commissionAsset = trade_list[i]['commissionAsset']
-
-                open_time = trade_list[i]['open_time']
-                trade_list[i]['qty'] = qty - diff
-                trade_list[i]['commission'] = commission * ((qty - diff) / qty)
-
-                trade_list[i]['quoteQty'] = price * trade_list[i]['qty']
-                trade_list[i]['cum_qty'] = cum_qty - diff
-
-                trade_list.insert(i + 1,
-                                  {
-                                      "symbol": symbol,
-                                      "open_time": open_time,
-                                      "cum_qty": cum_qty,
-                                      "qty": diff,
-                                      "price": price,
-                                      "quoteQty": price * diff,
-                                      "commission": commission * ((diff) / qty),
-                                      "commissionAsset": commissionAsset,
-                                  })
-                break
+            diff = cum_qty - common_cum_qty
+
+            price = trade['price']
+            qty = trade['qty']
+            commission = trade['commission']
+
+            trade['qty'] = qty - diff
+            trade['commission'] = commission * ((qty - diff) / qty)
+            trade['quoteQty'] = price * trade['qty']
+            trade['cum_qty'] = cum_qty - diff
+            modified.append(trade)
+
+            trade = {
+                "symbol": trade['symbol'],
+                "open_time": trade['open_time'],
+                "cum_qty": cum_qty,
+                "qty": diff,
+                "price": price,
+                "quoteQty": price * diff,
+                "commission": commission * ((diff) / qty),
+                "commissionAsset": trade['commissionAsset'],
+            }
+        modified.append(trade)
+
+    trade_list[:] = modified
 
 
 def add_cum_qty(trades):
@@ -263,58 +275,170 @@ def get_common_cum_qty(sell_orders, buy_orders):
     return common_cum_qtys
 
 
+def get_common_cum_qty_array(sell_cum_qty, buy_cum_qty):
+    """
+    Array version of get_common_cum_qty: every cum qty of either side up to the
+    point where the shorter side runs out.
+    """
+    if len(sell_cum_qty) == 0 or len(buy_cum_qty) == 0:
+        return np.empty(0, dtype=float)
+    common_cum_qtys = np.union1d(sell_cum_qty, buy_cum_qty)
+    return common_cum_qtys[common_cum_qtys <= min(sell_cum_qty[-1], buy_cum_qty[-1])]
+
+
+def split_at_cum_qty(common_cum_qtys, cum_qty, qty):
+    """
+    Slice one side's fills at the common cum qtys in a single pass.
+
+    Returns the index of the fill each lot is cut from and the lot quantity.
+    Lot quantities are computed the same way modify_trade_list splits a fill,
+    so both paths give identical floats.
+    """
+    idx = np.searchsorted(cum_qty, common_cum_qtys, side='left')
+    fill_cum_qty = cum_qty[idx]
+
+    prev_cum_qty = np.empty_like(common_cum_qtys)
+    prev_cum_qty[:1] = 0.0
+    prev_cum_qty[1:] = common_cum_qtys[:-1]
+
+    # qty still left on the fill before this lot is cut off
+    first_lot = np.ones(len(idx), dtype=bool)
+    first_lot[1:] = idx[1:] != idx[:-1]
+    qty_left = np.where(first_lot, qty[idx], fill_cum_qty - prev_cum_qty)
+
+    closes_fill = fill_cum_qty == common_cum_qtys
+    lot_qty = np.where(closes_fill, qty_left, qty_left - (fill_cum_qty - common_cum_qtys))
+    return idx, lot_qty
+
+
+def _format_notes(direction, qty, asset, price_sell, price_buy):
+    # Format quantity to avoid long floating point numbers
+    qty_formatted = round(qty, 4)
+    if qty == int(qty):
+        qty_formatted = int(qty)
+
+    if direction == 'long':
+        notes = f"Long {qty_formatted} {asset} @ {price_buy:.5f}, closed @ {price_sell:.5f}"
+    else:
+        notes = f"Short {qty_formatted} {asset} @ {price_sell:.5f}, closed @ {price_buy:.5f}"
+
+    # Truncate notes if too long
+    if len(notes) > 60:
+        notes = notes[:57] + "..."
+    return notes
+
+
+def match_lots(sells: pd.DataFrame, buys: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pair sells with buys by cumulative quantity using NumPy arrays.
+
+    Same result as add_cum_qty -> get_common_cum_qty -> modify_trade_list ->
+    calculate_pnl_one, one row per matched lot.
+    """
+    sell_qty = sells['qty'].to_numpy(dtype=float)
+    buy_qty = buys['qty'].to_numpy(dtype=float)
+    sell_cum_qty = np.cumsum(sell_qty)
+    buy_cum_qty = np.cumsum(buy_qty)
+
+    common_cum_qtys = get_common_cum_qty_array(sell_cum_qty, buy_cum_qty)
+    sell_idx, sell_lot_qty = split_at_cum_qty(common_cum_qtys, sell_cum_qty, sell_qty)
+    buy_idx, buy_lot_qty = split_at_cum_qty(common_cum_qtys, buy_cum_qty, buy_qty)
+
+    if not np.allclose(sell_lot_qty, buy_lot_qty, rtol=1e-7, atol=1e-7):
+        raise ValueError('ValueError')
+
+    # Pro-rate commission by the share of the fill each lot takes
+    sell_commission = sells['commission'].to_numpy(dtype=float)[sell_idx] * (sell_lot_qty / sell_qty[sell_idx])
+    buy_commission = buys['commission'].to_numpy(dtype=float)[buy_idx] * (buy_lot_qty / buy_qty[buy_idx])
+    sell_commission_asset = sells['commissionAsset'].to_numpy()[sell_idx]
+    buy_commission_asset = buys['commissionAsset'].to_numpy()[buy_idx]
+
+    price_sell = sells['price'].to_numpy(dtype=float)[sell_idx]
+    price_buy = buys['price'].to_numpy(dtype=float)[buy_idx]
+    sell_time = sells['open_time'].to_numpy()[sell_idx]
+    buy_time = buys['open_time'].to_numpy()[buy_idx]
+    symbol = sells['symbol'].to_numpy()[sell_idx]
+
+    qty = sell_lot_qty + buy_lot_qty
+    proceeds = price_sell * sell_lot_qty
+    cost = price_buy * buy_lot_qty
+    direction = np.where(sell_time < buy_time, 'short', 'long')
+    asset = pd.Series(symbol, dtype=object).str.replace('USDT', '').to_numpy()
+
+    lots = pd.DataFrame({
+        "open_time": np.minimum(sell_time, buy_time),
+        "close_time": np.maximum(sell_time, buy_time),
+        "price_sell": price_sell,
+        "price_buy": price_buy,
+        "symbol": symbol,
+        "direction": direction,
+        "qty": qty,
+        "profit": (price_sell - price_buy) * sell_lot_qty,
+        "commission_usdt": (np.where(sell_commission_asset == 'USDT', sell_commission, 0.0)
+                            + np.where(buy_commission_asset == 'USDT', buy_commission, 0.0)),
+        "commission_bnb": (np.where(sell_commission_asset == 'BNB', sell_commission, 0.0)
+                           + np.where(buy_commission_asset == 'BNB', buy_commission, 0.0)),
+        "commission_sell": sell_commission,
+        "commission_asset_sell": sell_commission_asset,
+        "commission_buy": buy_commission,
+        "commission_asset_buy": buy_commission_asset,
+        # New fields for tax reporting
+        "disposal_date": np.maximum(sell_time, buy_time),
+        "asset": asset,
+        "proceeds": proceeds,
+        "cost": cost,
+        "gain_loss": proceeds - cost,
+    })
+    lots['notes'] = [
+        _format_notes(*row) for row in zip(direction, qty, asset, price_sell, price_buy)
+    ]
+    return lots
+
+
 def calculate_pnl_2(trades: pd.DataFrame):
     trades = trades.sort_values("datetime", kind="mergesort").reset_index(drop=True).copy()
+    trades['open_time'] = pd.to_datetime(trades['datetime'], format='ISO8601').astype('datetime64[ns]')
+
+    is_sell = (trades['side'] == 'sell').to_numpy()
+    is_buy = (trades['side'] == 'buy').to_numpy()
+    sell_orders = trades[is_sell]
+    buy_shorts = trades[is_buy]
+
+    lots = match_lots(sell_orders, buy_shorts)
+    results = lots.to_dict('records')
+
+    first = sell_orders if len(sell_orders) > 0 else buy_shorts
+    summary_result = {
+        "datetime": first['open_time'].iloc[0],
+        "symbol": first['symbol'].iloc[0],
+        "qty": lots['qty'].sum(),
+        "profit": lots['profit'].sum(),
+        "commission_usdt": lots['commission_usdt'].sum(),
+        "commission_bnb": lots['commission_bnb'].sum(),
+        # Summary tax fields
+        "total_proceeds": lots['proceeds'].sum(),
+        "total_cost": lots['cost'].sum(),
+        "total_gain_loss": lots['gain_loss'].sum(),
+        "asset": first['symbol'].iloc[0].replace('USDT', ''),
+        "disposal_date": lots['disposal_date'].max() if len(lots) else None,
+    }
+    return results, summary_result
 
-    sell_orders = []
-    buy_shorts = []
+def calculate_pnl_file(filepath):
+    """Run calculate_pnl_2 on one symbol's trades CSV, used as a process pool task."""
+    trades = pd.read_csv(filepath)
+    return calculate_pnl_2(trades)
 
-    for i, row in trades.iterrows():
 
-        ts: pd.Timestamp = row["datetime"]
-
-        symbol = row["symbol"]
-        side = row["side"]
-        price = float(row["price"])
-        qty = float(row["qty"])
-        quoteQty = float(row["quoteQty"])
-        commission = float(row["commission"])
-        commissionAsset = row["commissionAsset"]
-
-        if side == "sell":  # open short
-            sell_orders.append(
-                {
-                    "symbol": symbol,
-                    "qty": qty,
-                    "price": price,
-                    "commission": commission,
-                    "quoteQty": quoteQty,
-                    "commissionAsset": commissionAsset,
-                    "open_time": pd.to_datetime(ts),
-                }
-            )
-
-        if side == "buy":
-            buy_shorts.append(
-                {
-                    "symbol": symbol,
-                    "qty": qty,
-                    "price": price,
-                    "commission": commission,
-                    "quoteQty": quoteQty,
-                    "commissionAsset": commissionAsset,
-                    "open_time": pd.to_datetime(ts),
-                }
-            )
-
-    sell_orders = add_cum_qty(sell_orders)
-    buy_shorts = add_cum_qty(buy_shorts)
-    common_cum_qty = get_common_cum_qty(sell_orders, buy_shorts)
-    modify_trade_list(common_cum_qty, sell_orders)
-    modify_trade_list(common_cum_qty, buy_shorts)
-    results, summary_result = calculate_pnl_one(sell_orders, buy_shorts)
-    return results, summary_result
-    # print(summary_result)
+def calculate_pnl_stored(market, symbol, start=None, end=None):
+    """Run calculate_pnl_2 on one symbol from the parquet trade store, used as a process pool task."""
+    trades = read_trades(market, symbol=symbol, columns=PNL_COLUMNS, start=start, end=end)
+    return calculate_pnl_2(trades)
+
+
+def calculate_pnl_fills(batches):
+    """Run calculate_pnl_2 on one symbol's FILL_SCHEMA record batches, e.g. straight from BaseExchange.fetch_trades."""
+    return calculate_pnl_2(fills_frame(batches, PNL_COLUMNS))
 
 
 
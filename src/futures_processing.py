@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.commission_valuation import PriceIndex
+from src.gbp_conversion import to_decimal
+from src.trade_store import STORE_ROOT, list_symbols, read_trades
+
+FUTURES_FOLDER = './data/raw/futures'
+# income types counted as funding; REALIZED_PNL and COMMISSION rows repeat what the trade files hold
+FUNDING_TYPES = ('FUNDING_FEE',)
+CHUNK_ROWS = 1_000_000
+DAILY_COLUMNS = ['day', 'symbol', 'realized_pnl', 'commission', 'funding']
+
+
+def daily_sums(times, symbols, values: dict) -> pd.DataFrame:
+    """Each array in values summed per symbol and calendar day, one bincount per column."""
+    day = np.asarray(pd.to_datetime(times), dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+    if not len(day):
+        return pd.DataFrame(columns=['day', 'symbol', *values])
+    codes, names = pd.factorize(np.asarray(symbols, dtype=object))
+    first = day.min()
+    span = day.max() - first + 1
+    groups, inverse = np.unique(codes * span + (day - first), return_inverse=True)
+
+    sums = {
+        'day': (groups % span + first).astype('datetime64[D]').astype('datetime64[ns]'),
+        'symbol': np.asarray(names, dtype=object)[groups // span],
+    }
+    for name, column in values.items():
+        sums[name] = np.bincount(inverse, weights=np.asarray(column, dtype=float), minlength=len(groups))
+    return pd.DataFrame(sums)
+
+
+def _in_usdt(amounts, assets, times, index):
+    rates = index.rates(assets, times)
+    unpriced = np.isnan(rates) & (amounts != 0)
+    if unpriced.any():
+        print(f"Warning: no USDT price for futures asset(s) "
+              f"{', '.join(sorted(set(pd.Series(np.asarray(assets)[unpriced]).astype(str))))}, valued at 0")
+    return amounts * np.where(np.isnan(rates), 0.0, rates)
+
+
+def _trade_sums(times, symbols, realized_pnl, commission, commission_assets, index):
+    # realizedPnl is empty for fills the store holds without it
+    return daily_sums(times, symbols, {
+        'realized_pnl': np.nan_to_num(np.asarray(realized_pnl, dtype=float)),
+        'commission': _in_usdt(np.nan_to_num(np.asarray(commission, dtype=float)), commission_assets, times, index),
+    })
+
+
+def futures_daily_totals(folder=FUTURES_FOLDER, price_index: PriceIndex = None, chunksize=CHUNK_ROWS,
+                         start=None, end=None, store_root=STORE_ROOT) -> pd.DataFrame:
+    """
+    Futures realized PnL, trading fees and funding in USDT per symbol and day.
+
+    Fills come from the trade store when it holds futures (the bulk export
+    ingest and get_futures_trades write there), read a symbol at a time and
+    limited to start/end; otherwise from <symbol>_futures_trades.csv in
+    folder. Funding is the FUNDING_FEE rows of <symbol>_futures_income.csv as
+    written by BinanceExchange.get_futures_records. CSVs are read chunksize
+    rows at a time, so only the daily sums are ever held for all symbols.
+    Fees and funding in other assets than USD stablecoins are valued with
+    price_index.
+    """
+    index = price_index or PriceIndex({})
+    parts = []
+    stored = list_symbols('futures', root=store_root)
+    for symbol in stored:
+        fills = read_trades('futures', symbol=symbol, start=start, end=end, root=store_root,
+                            columns=['datetime', 'symbol', 'realizedPnl', 'commission', 'commissionAsset'])
+        parts.append(_trade_sums(fills['datetime'], fills['symbol'], fills['realizedPnl'], fills['commission'],
+                                 fills['commissionAsset'], index))
+
+    filenames = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+    for filename in filenames:
+        path = os.path.join(folder, filename)
+        if filename.endswith('_futures_trades.csv') and not stored:
+            for chunk in pd.read_csv(path, usecols=['time', 'symbol', 'realizedPnl', 'commission', 'commissionAsset'],
+                                     chunksize=chunksize):
+                parts.append(_trade_sums(pd.to_datetime(chunk['time'], unit='ms'), chunk['symbol'],
+                                         chunk['realizedPnl'], chunk['commission'], chunk['commissionAsset'], index))
+        elif filename.endswith('_futures_income.csv'):
+            for chunk in pd.read_csv(path, usecols=['time', 'symbol', 'incomeType', 'income', 'asset'],
+                                     chunksize=chunksize):
+                chunk = chunk[chunk['incomeType'].isin(FUNDING_TYPES)]
+                times = pd.to_datetime(chunk['time'], unit='ms')
+                parts.append(daily_sums(times, chunk['symbol'], {
+                    'funding': _in_usdt(chunk['income'].to_numpy(dtype=float), chunk['asset'], times, index),
+                }))
+
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame({'day': pd.to_datetime([]), 'symbol': [], 'realized_pnl': [], 'commission': [],
+                             'funding': []})
+    daily = pd.concat(parts, ignore_index=True).reindex(columns=DAILY_COLUMNS)
+    daily[DAILY_COLUMNS[2:]] = daily[DAILY_COLUMNS[2:]].fillna(0.0)
+    return daily.groupby(['day', 'symbol'], sort=True, as_index=False).sum()
+
+
+def futures_in_gbp(daily: pd.DataFrame, usd_gbp) -> pd.DataFrame:
+    """
+    Daily futures totals as rows of the combined frame (market 'futures'),
+    with exact Decimal realized_pnl_in_gbp, funding_in_gbp and
+    commission_in_gbp at the USD/GBP rate of the day.
+    """
+    usd_gbp_rate = to_decimal(usd_gbp.asof(daily['day']))
+    return pd.DataFrame({
+        'exchange': 'BINANCE',
+        'market': 'futures',
+        'symbol': daily['symbol'].to_numpy(dtype=object),
+        'disposal_date': daily['day'].to_numpy(),
+        'usd_gbp': usd_gbp.asof(daily['day']),
+        'realized_pnl_in_gbp': to_decimal(daily['realized_pnl']) * usd_gbp_rate,
+        'funding_in_gbp': to_decimal(daily['funding']) * usd_gbp_rate,
+        'commission_in_gbp': to_decimal(daily['commission']) * usd_gbp_rate,
+    })
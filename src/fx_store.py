@@ -0,0 +1,142 @@
+import json
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from src.price_cache import merge_ranges, missing_ranges
+from src.price_series import PriceSeries, to_minutes, write_price_series
+
+FX_ROOT = './data/store/fx'
+
+DAY_MINUTES = 24 * 60
+INTERVAL_MINUTES = {'1d': DAY_MINUTES, '1h': 60}
+
+
+class FxProvider(ABC):
+    @abstractmethod
+    def fetch(self, base: str, quote: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame:
+        """Rates for 1 base in quote over [start, end], as a DataFrame of datetime and rate."""
+        pass
+
+
+class YahooFxProvider(FxProvider):
+    """
+    Rates from Yahoo Finance. Yahoo quotes GBPUSD=X rather than USD in GBP, so
+    the <quote><base>=X ticker is downloaded and inverted, as
+    get_usd_to_gbp_from_yahoo did.
+    """
+
+    def fetch(self, base, quote, start, end, interval):
+        import yfinance as yf
+
+        ticker = yf.download(f"{quote}{base}=X", start=start.strftime('%Y-%m-%d'),
+                             end=(end + pd.Timedelta(days=1)).strftime('%Y-%m-%d'), interval=interval,
+                             progress=False)
+        if ticker.empty:
+            return pd.DataFrame({'datetime': [], 'rate': []})
+        close = ticker['Close']
+        if isinstance(close, pd.DataFrame):  # one column per ticker in newer yfinance
+            close = close.iloc[:, 0]
+        close = close.dropna()
+        return pd.DataFrame({'datetime': close.index.tz_localize(None) if close.index.tz else close.index,
+                             'rate': 1 / close.to_numpy(dtype=float)})
+
+
+class CsvFxProvider(FxProvider):
+    """
+    Stand-in provider reading a CSV of rates (e.g. an old ./data/usd_gbp.csv),
+    for tests and offline runs. Rows that do not parse are skipped.
+    """
+
+    def __init__(self, path, time_column='Date', rate_column='USD_to_GBP'):
+        self.path = path
+        self.time_column = time_column
+        self.rate_column = rate_column
+        self.calls = 0
+
+    def fetch(self, base, quote, start, end, interval):
+        self.calls += 1
+        df = pd.read_csv(self.path, usecols=[self.time_column, self.rate_column])
+        datetimes = pd.to_datetime(df[self.time_column], errors='coerce', format='ISO8601')
+        rates = pd.to_numeric(df[self.rate_column], errors='coerce')
+        keep = datetimes.notna() & rates.notna() & (datetimes >= start) & (datetimes < end + pd.Timedelta(days=1))
+        return pd.DataFrame({'datetime': datetimes[keep], 'rate': rates[keep]})
+
+
+class FxStore:
+    """
+    FX rates per currency pair and interval, kept across runs.
+
+    Rates live in the typed binary PriceSeries format (int64 minutes, float64
+    rates) next to a JSON list of the date ranges already requested from the
+    provider. series() asks the provider only for dates not covered yet, so
+    once a tax year is stored a report needs no network and always sees the
+    same rates. Days without a quote (weekends) count as covered when they
+    fall before the last rate of a non-empty response; an empty response
+    (which is also how a failed download shows) covers nothing.
+    """
+
+    def __init__(self, provider: FxProvider = None, root=FX_ROOT):
+        self.provider = provider or YahooFxProvider()
+        self.root = root
+
+    def _path(self, base, quote, interval):
+        return os.path.join(self.root, f'{base.lower()}_{quote.lower()}_{interval}')
+
+    def covered(self, base, quote, interval='1d'):
+        path = self._path(base, quote, interval) + '.json'
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def series(self, base, quote, start, end, interval='1d') -> PriceSeries:
+        """Rates of base in quote covering the dates start..end (inclusive)."""
+        path = self._path(base, quote, interval)
+        step = INTERVAL_MINUTES[interval]
+        start_minute = int(to_minutes([pd.Timestamp(start).floor('D')])[0])
+        # today is not over yet, so it is never marked covered
+        last_day = min(pd.Timestamp(end).floor('D'), pd.Timestamp.now().floor('D') - pd.Timedelta(days=1))
+        end_minute = int(to_minutes([last_day])[0]) + 24 * 60 - 1
+
+        covered = self.covered(base, quote, interval)
+        gaps = missing_ranges(covered, start_minute, end_minute) if end_minute >= start_minute else []
+        if gaps:
+            stored = self._load(path)
+            fetched = []
+            for gap_start, gap_end in gaps:
+                rates = self.provider.fetch(base, quote, pd.Timestamp(gap_start * 60, unit='s'),
+                                            pd.Timestamp(gap_end * 60, unit='s').floor('D'), interval)
+                minutes = to_minutes(rates['datetime']) // step * step
+                if not len(minutes):
+                    # nothing back (a provider error looks the same), so ask again next time
+                    continue
+                fetched.append(pd.DataFrame({'minute': minutes, 'rate': rates['rate'].to_numpy(dtype=float)}))
+                # days without a quote count as covered only up to the last day the provider answered for
+                covered = covered + [[gap_start, min(gap_end, int(minutes.max()) // DAY_MINUTES * DAY_MINUTES
+                                                     + DAY_MINUTES - 1)]]
+            if fetched:
+                merged = (pd.concat([stored] + fetched, ignore_index=True)
+                          .drop_duplicates('minute', keep='last').sort_values('minute'))
+                write_price_series(path, pd.to_datetime(merged['minute'].to_numpy() * 60, unit='s'), merged['rate'])
+                self._save_covered(path, merge_ranges(covered))
+
+        if not os.path.exists(path + '.close.npy'):
+            write_price_series(path, pd.to_datetime([]), [])
+        return PriceSeries(path)
+
+    @staticmethod
+    def _load(path):
+        if not os.path.exists(path + '.close.npy'):
+            return pd.DataFrame({'minute': np.array([], dtype='int64'), 'rate': np.array([], dtype='float64')})
+        series = PriceSeries(path)
+        return pd.DataFrame({'minute': np.array(series.times), 'rate': np.array(series.closes)})
+
+    @staticmethod
+    def _save_covered(path, covered):
+        tmp_path = path + '.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(covered, f)
+        os.replace(tmp_path, path + '.json')
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+_decimal = np.frompyfunc(Decimal, 1, 1)
+
+
+def to_decimal(values) -> np.ndarray:
+    """
+    Exact Decimal object array for a column of floats.
+
+    Float columns are converted one distinct value at a time (FX and BNB rates
+    repeat a lot), object columns (Decimal, int, str) element by element.
+    """
+    values = np.asarray(values)
+    if values.dtype == object:
+        return _decimal(values).astype(object)
+    uniques, inverse = np.unique(values.astype(float), return_inverse=True)
+    return _decimal(uniques).astype(object)[inverse.reshape(-1)]
+
+
+def convert_trades_to_gbp(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the GBP columns to matched trades in one pass.
+
+    Expects the merged rate 'usd_gbp' next to the USDT columns 'proceeds' and
+    'cost'. Commissions are valued from each side's own asset when the
+    'commission_rate_sell'/'commission_rate_buy' USDT prices are present
+    (src.commission_valuation), else from 'commission_usdt' and
+    'commission_bnb' at 'bnb_usdt'. The inputs stay floats, only the *_in_gbp
+    outputs are Decimal so the report can round them exactly.
+    """
+    usd_gbp = to_decimal(df['usd_gbp'])
+    proceeds = to_decimal(df['proceeds'])
+    cost = to_decimal(df['cost'])
+
+    proceeds_in_gbp = proceeds * usd_gbp
+    cost_in_gbp = cost * usd_gbp
+    profit_in_gbp = proceeds_in_gbp - cost_in_gbp
+    if 'commission_rate_sell' in df.columns:
+        commission_usd = (to_decimal(df['commission_sell']) * to_decimal(df['commission_rate_sell'])
+                          + to_decimal(df['commission_buy']) * to_decimal(df['commission_rate_buy']))
+        commission_in_gbp = commission_usd * usd_gbp
+    else:
+        commission_usdt = to_decimal(df['commission_usdt'])
+        commission_bnb = to_decimal(df['commission_bnb'])
+        bnb_usdt = to_decimal(df['bnb_usdt'])
+        commission_in_gbp = commission_usdt * usd_gbp + commission_bnb * bnb_usdt * usd_gbp
+
+    df['proceeds_in_gbp'] = proceeds_in_gbp
+    df['cost_in_gbp'] = cost_in_gbp + commission_in_gbp
+    df['profit_in_gbp'] = profit_in_gbp
+    df['commission_in_gbp'] = commission_in_gbp
+    df['net_profit_in_gbp'] = profit_in_gbp - commission_in_gbp
+    return df
+
+
+def convert_interest_to_gbp(interest_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add interest_in_usd and interest_in_gbp to interest records with a merged 'usd_to_gbp'.
+
+    Each record is valued at 'interest_rate', the USDT price of its own asset
+    (src.commission_valuation.value_interest), when present, else as BNB
+    interest at 'bnb_usdt'.
+    """
+    rate = interest_df['interest_rate'] if 'interest_rate' in interest_df.columns else interest_df['bnb_usdt']
+    interest_in_usd = to_decimal(interest_df['interest']) * to_decimal(rate)
+
+    interest_df['interest_in_usd'] = interest_in_usd
+    interest_df['interest_in_gbp'] = interest_in_usd * to_decimal(interest_df['usd_to_gbp'])
+    return interest_df
+
+
+def add_interest_in_gbp(df: pd.DataFrame, interest_in_gbp) -> pd.DataFrame:
+    """Charge the interest allocated to each trade to its cost and recompute net profit."""
+    interest_in_gbp = to_decimal(interest_in_gbp)
+    cost_in_gbp = to_decimal(df['cost_in_gbp']) + interest_in_gbp
+
+    df['interest_in_gbp'] = interest_in_gbp
+    df['cost_in_gbp'] = cost_in_gbp
+    df['net_profit_in_gbp'] = to_decimal(df['proceeds_in_gbp']) - cost_in_gbp
+    return df
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+SAME_DAY = 'Same Day'
+BED_AND_BREAKFAST = '30-Day Rule'
+SECTION_104 = 'Section 104'
+RULES = [SAME_DAY, BED_AND_BREAKFAST, SECTION_104]
+
+
+def classify_hmrc_rule(acquired_dates, disposal_dates) -> pd.Series:
+    """
+    HMRC matching rule of each matched lot, as a categorical column.
+
+    Compares calendar days of the two legs of a lot, in either order since a
+    short is disposed of before it is bought back: the same day is 'Same Day',
+    1 to 30 days apart is '30-Day Rule' (bed and breakfasting), anything
+    further falls to the 'Section 104' pool. Lots missing a date get NaN.
+    """
+    index = disposal_dates.index if isinstance(disposal_dates, pd.Series) else None
+    acquired = np.asarray(pd.to_datetime(acquired_dates), dtype='datetime64[D]')
+    disposed = np.asarray(pd.to_datetime(disposal_dates), dtype='datetime64[D]')
+
+    valid = ~(np.isnat(acquired) | np.isnat(disposed))
+    days = np.abs((disposed - acquired).astype('int64'))
+    codes = np.where(days == 0, 0, np.where(days <= 30, 1, 2))
+    codes = np.where(valid, codes, -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=RULES), index=index, name='notes')
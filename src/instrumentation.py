@@ -0,0 +1,106 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageTracer:
+    """
+    Wall time, CPU time, peak RSS and row counts per pipeline stage.
+
+        tracer = StageTracer(profile_dir='./data/profile')
+        with tracer.stage('pdf_build') as record:
+            record['rows'] = len(df)
+            ...
+        tracer.write('trace.json')
+
+    With profile_dir every stage is also run under a profiler and its stats
+    saved as <profile_dir>/<stage>.prof (cProfile, open with pstats or
+    snakeviz) or <stage>.html with profiler='pyinstrument'.
+    """
+
+    def __init__(self, profile_dir=None, profiler='cprofile'):
+        self.stages = []
+        self.profile_dir = profile_dir
+        self.profiler = profiler
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        record = {'stage': name, **fields}
+        profile = self._start_profile()
+        rss_before = peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(time.process_time() - cpu, 6)
+            record['peak_rss_mb'] = peak_rss_mb()
+            if rss_before is not None:
+                # growth of the process peak while this stage ran
+                record['peak_rss_growth_mb'] = round(record['peak_rss_mb'] - rss_before, 3)
+            self._stop_profile(profile, name)
+            self.stages.append(record)
+
+    def _start_profile(self):
+        if not self.profile_dir:
+            return None
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            profile = Profiler()
+            profile.start()
+            return profile
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _stop_profile(self, profile, name):
+        if profile is None:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profiler == 'pyinstrument':
+            profile.stop()
+            with open(os.path.join(self.profile_dir, f'{name}.html'), 'w') as f:
+                f.write(profile.output_html())
+        else:
+            profile.disable()
+            profile.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+
+    def trace(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'total_wall_s': round(sum(s['wall_s'] for s in self.stages), 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f, indent=1, default=str)
+        print(f"Trace saved to: {path}")
+
+    def summary(self):
+        lines = [f"{'stage':<20} {'rows':>9} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}"]
+        for s in self.stages:
+            peak = s.get('peak_rss_mb')
+            lines.append(f"{s['stage']:<20} {s.get('rows', ''):>9} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f} "
+                         f"{peak if peak is None else round(peak, 1):>9}")
+        return '\n'.join(lines)
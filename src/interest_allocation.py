@@ -0,0 +1,199 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.commission_valuation import USD_ASSETS
+from src.gbp_conversion import to_decimal
+
+# assets Binance pairs are quoted in, to split a pair into its base and quote asset
+QUOTE_ASSETS = USD_ASSETS + ('BTC', 'ETH', 'BNB', 'XRP', 'TRX', 'DOGE', 'EUR', 'GBP', 'TRY', 'BRL', 'AUD', 'JPY',
+                             'RUB', 'UAH', 'ZAR', 'PLN', 'RON', 'ARS', 'MXN', 'COP', 'CZK', 'IDR', 'BIDR',
+                             'IDRT', 'NGN', 'VAI', 'PAX', 'USDS')
+
+
+def nearest(times: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Position in sorted times of the entry nearest each target, ties to the
+    earlier one (merge_asof direction='nearest'). times must not be empty.
+    """
+    before = np.searchsorted(times, targets, side='right') - 1
+    after = np.minimum(before + 1, len(times) - 1)
+    before = np.maximum(before, 0)
+    take_after = np.abs(times[after] - targets) < np.abs(targets - times[before])
+    return np.where(take_after, after, before)
+
+
+def _as_ns(values) -> np.ndarray:
+    return np.asarray(pd.to_datetime(values), dtype='datetime64[ns]').astype('int64')
+
+
+def _borrowed_asset_groups(symbols: np.ndarray, assets) -> dict:
+    # cross margin: trades of pairs of the borrowed asset, all margin trades when none do
+    groups = {}
+    everything = np.arange(len(symbols))
+    for asset, involved in _trading(symbols, assets).items():
+        involved = np.flatnonzero(involved)
+        groups[asset] = involved if len(involved) else everything
+    return groups
+
+
+def split_pair(symbol: str) -> tuple:
+    """(base, quote) of a pair such as BTCUSDT, the longest known quote asset winning; (symbol, '') if none ends it."""
+    for quote in sorted(QUOTE_ASSETS, key=len, reverse=True):
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)], quote
+    return symbol, ''
+
+
+def _trading(symbols: np.ndarray, assets) -> dict:
+    # per asset, which trades are of a pair with it as base or quote (split once per distinct pair)
+    pair_of_trade, pairs = pd.factorize(symbols)
+    split = [split_pair(p) for p in pairs]
+    return {asset: np.array([asset in legs for legs in split], dtype=bool)[pair_of_trade] for asset in assets}
+
+
+def interest_per_trade(trades: pd.DataFrame, interest: pd.DataFrame, value_column='interest_in_gbp') -> np.ndarray:
+    """
+    Interest charged to each row of trades, as a Decimal object array.
+
+    Only margin trades (market == 'margin') take interest. An accrual with an
+    isolatedSymbol goes to the margin disposal of that symbol nearest its
+    interestAccuredTime; a cross margin accrual goes to the nearest disposal
+    of a pair with its borrowed asset (rawAsset, else asset) as base or quote, or of any
+    margin pair when none trades it. Each group is one searchsorted over sorted disposal times, and
+    accruals with no trade in their group are left out.
+    """
+    allocated = np.full(len(trades), Decimal(0), dtype=object)
+    margin = np.flatnonzero((trades['market'] == 'margin').to_numpy())
+    if not len(margin) or interest.empty:
+        return allocated
+
+    disposal = _as_ns(trades['disposal_date'].to_numpy()[margin])
+    order = np.argsort(disposal, kind='stable')
+    margin, disposal = margin[order], disposal[order]
+    symbols = trades['symbol'].to_numpy(dtype=object)[margin].astype(str)
+
+    accrued, isolated, assets = _accruals(interest)
+    groups = _borrowed_asset_groups(symbols, pd.unique(assets[isolated == '']))
+
+    target = np.full(len(interest), -1)
+    for symbol in pd.unique(isolated[isolated != '']):
+        rows = np.flatnonzero(isolated == symbol)
+        positions = np.flatnonzero(symbols == symbol)
+        if len(positions):
+            target[rows] = margin[positions[nearest(disposal[positions], accrued[rows])]]
+    for asset, positions in groups.items():
+        rows = np.flatnonzero((isolated == '') & (assets == asset))
+        target[rows] = margin[positions[nearest(disposal[positions], accrued[rows])]]
+
+    trade_rows, sums = _sum_per_trade(target, accrued, to_decimal(interest[value_column]))
+    allocated[trade_rows] = sums
+    return allocated
+
+
+def _accruals(interest):
+    # time (ns), isolated symbol ('' for cross margin) and borrowed asset of each accrual
+    # asset is what the interest was paid in (BNB when converted), rawAsset the asset borrowed
+    accrued = _as_ns(interest['interestAccuredTime'])
+    isolated = (interest['isolatedSymbol'].fillna('').astype(str).to_numpy()
+                if 'isolatedSymbol' in interest.columns else np.full(len(interest), ''))
+    borrowed = interest['asset']
+    if 'rawAsset' in interest.columns:
+        borrowed = interest['rawAsset'].where(interest['rawAsset'].notna() & (interest['rawAsset'] != ''),
+                                              interest['asset'])
+    return accrued, isolated, borrowed.astype(str).to_numpy()
+
+
+def _sum_per_trade(target, accrued, values):
+    # sum each trade's accruals in time order, the order the GBP values were summed in before
+    assigned = np.flatnonzero(target >= 0)
+    assigned = assigned[np.lexsort((accrued[assigned], target[assigned]))]
+    trade_rows, starts = np.unique(target[assigned], return_index=True)
+    if not len(trade_rows):
+        return trade_rows, np.array([], dtype=object)
+    return trade_rows, np.add.reduceat(values[assigned], starts)
+
+
+class InterestSweep:
+    """
+    interest_per_trade for disposals arriving in batches in disposal time
+    order, as the chunked pipeline reads them back from its spill files.
+
+    Only per accrual state is kept: the position of the last disposal at or
+    before it and of the first after it, in its own group and (for cross
+    margin, in case no pair trades its asset) among all margin disposals.
+    allocation() then picks the nearer one exactly as interest_per_trade
+    does, so memory follows the interest records, not the disposals.
+
+        sweep = InterestSweep(interest_df)
+        for batch in batches:  # market, symbol, disposal_date
+            sweep.add(batch)
+        allocated = sweep.allocation()  # {position: Decimal}
+    """
+
+    def __init__(self, interest: pd.DataFrame, value_column='interest_in_gbp'):
+        self.accrued, self.isolated, self.assets = _accruals(interest)
+        self.values = to_decimal(interest[value_column])
+        n = len(self.accrued)
+        self.before = {kind: np.full(n, -1) for kind in ('group', 'all')}
+        self.before_time = {kind: np.zeros(n, dtype='int64') for kind in ('group', 'all')}
+        self.after = {kind: np.full(n, -1) for kind in ('group', 'all')}
+        self.after_time = {kind: np.zeros(n, dtype='int64') for kind in ('group', 'all')}
+
+        cross = self.isolated == ''
+        self.cross_rows = np.flatnonzero(cross)
+        self.isolated_rows = {symbol: np.flatnonzero(self.isolated == symbol)
+                              for symbol in pd.unique(self.isolated[~cross])}
+        self.asset_rows = {asset: np.flatnonzero(cross & (self.assets == asset))
+                           for asset in pd.unique(self.assets[cross])}
+        self.assets_traded = set()
+        self.position = 0
+
+    def add(self, trades: pd.DataFrame):
+        """Next disposals (market, symbol, disposal_date), later than or equal to all added before."""
+        margin = np.flatnonzero((trades['market'] == 'margin').to_numpy())
+        positions = self.position + margin
+        self.position += len(trades)
+        if not len(margin) or not len(self.accrued):
+            return
+        times = _as_ns(trades['disposal_date'].to_numpy()[margin])
+        symbols = trades['symbol'].to_numpy(dtype=object)[margin].astype(str)
+
+        for symbol in pd.unique(symbols):
+            if symbol in self.isolated_rows:
+                chosen = symbols == symbol
+                self._update('group', self.isolated_rows[symbol], times[chosen], positions[chosen])
+        self._update('all', self.cross_rows, times, positions)
+        for asset, involved in _trading(symbols, self.asset_rows).items():
+            if involved.any():
+                self.assets_traded.add(asset)
+                self._update('group', self.asset_rows[asset], times[involved], positions[involved])
+
+    def _update(self, kind, rows, times, positions):
+        if not len(rows):
+            return
+        targets = self.accrued[rows]
+        before = np.searchsorted(times, targets, side='right') - 1
+        # later batches only hold later disposals, so the last one at or before an accrual wins
+        found = before >= 0
+        self.before[kind][rows[found]] = positions[before[found]]
+        self.before_time[kind][rows[found]] = times[before[found]]
+        # while the first one after it is the first ever seen
+        after = before + 1
+        found = (after < len(times)) & (self.after[kind][rows] < 0)
+        self.after[kind][rows[found]] = positions[after[found]]
+        self.after_time[kind][rows[found]] = times[after[found]]
+
+    def allocation(self) -> dict:
+        """Interest per disposal position (counted over every batch added), for disposals that take any."""
+        use_all = (self.isolated == '') & ~np.isin(self.assets, list(self.assets_traded))
+        before = np.where(use_all, self.before['all'], self.before['group'])
+        before_time = np.where(use_all, self.before_time['all'], self.before_time['group'])
+        after = np.where(use_all, self.after['all'], self.after['group'])
+        after_time = np.where(use_all, self.after_time['all'], self.after_time['group'])
+
+        take_after = (after >= 0) & ((before < 0) | (after_time - self.accrued < self.accrued - before_time))
+        target = np.where(take_after, after, before)
+        positions, sums = _sum_per_trade(target, self.accrued, self.values)
+        return dict(zip(positions.tolist(), sums))
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PRICE_ROOT = './data/store/prices'
+MINUTE_MS = 60_000
+
+PRICE_SCHEMA = pa.schema([
+    ('open_time', pa.int64()),
+    ('close', pa.float64()),
+])
+
+
+def merge_ranges(ranges):
+    """Sorted, non-overlapping [start, end] ms ranges; touching ranges are joined."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(covered, start, end):
+    """Parts of [start, end] not inside any covered range."""
+    gaps = []
+    current = start
+    for range_start, range_end in covered:
+        if range_end < current:
+            continue
+        if range_start > end:
+            break
+        if range_start > current:
+            gaps.append([current, range_start - 1])
+        current = max(current, range_end + 1)
+    if current <= end:
+        gaps.append([current, end])
+    return gaps
+
+
+class PriceCache:
+    """
+    Minute closes per symbol, kept across runs.
+
+    Each symbol has a parquet file of (open_time ms, close) sorted by time and
+    a JSON list of the [start, end] ms ranges already fetched, so a pair is
+    only ever downloaded once per minute and a longer period only fetches the
+    gaps. Ranges without klines (before listing, maintenance) count as covered.
+    Symbols the exchange does not know are listed in unavailable.json and not
+    fetched again.
+    """
+
+    def __init__(self, root=PRICE_ROOT):
+        self.root = root
+        self.lock = threading.Lock()
+        self._series = {}
+
+    def _path(self, symbol, ext):
+        return os.path.join(self.root, f'{symbol}.{ext}')
+
+    def covered(self, symbol):
+        path = self._path(symbol, 'json')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def unavailable(self):
+        path = os.path.join(self.root, 'unavailable.json')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def is_unavailable(self, symbol):
+        return symbol in self.unavailable()
+
+    def mark_unavailable(self, symbol):
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            symbols = sorted(set(self.unavailable()) | {symbol})
+            self._write(os.path.join(self.root, 'unavailable.json'), lambda path: self._dump(symbols, path))
+
+    def missing(self, symbol, start_ms, end_ms):
+        return missing_ranges(self.covered(symbol), start_ms, end_ms)
+
+    def add(self, symbol, klines, start_ms, end_ms):
+        """Store klines (rows starting [open_time, open, high, low, close, ...]) fetched for [start_ms, end_ms]."""
+        new = pd.DataFrame({
+            'open_time': np.array([k[0] for k in klines], dtype='int64'),
+            'close': np.array([k[4] for k in klines], dtype='float64'),
+        })
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            series = pd.concat([self.load(symbol), new], ignore_index=True)
+            series = (series.drop_duplicates('open_time', keep='last')
+                      .sort_values('open_time', kind='mergesort').reset_index(drop=True))
+            self._write(self._path(symbol, 'parquet'),
+                        lambda path: pq.write_table(pa.Table.from_pandas(series, schema=PRICE_SCHEMA,
+                                                                         preserve_index=False), path))
+            covered = merge_ranges(self.covered(symbol) + [[int(start_ms), int(end_ms)]])
+            self._write(self._path(symbol, 'json'), lambda path: self._dump(covered, path))
+            self._series[symbol] = series
+
+    @staticmethod
+    def _dump(covered, path):
+        with open(path, 'w') as f:
+            json.dump(covered, f)
+
+    @staticmethod
+    def _write(path, write):
+        # write then rename so a crash never leaves a half written file
+        tmp_path = path + '.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, symbol, start_ms=None, end_ms=None):
+        """DataFrame of open_time (ms) and close, optionally limited to [start_ms, end_ms]."""
+        series = self._series.get(symbol)
+        if series is None:
+            path = self._path(symbol, 'parquet')
+            if not os.path.exists(path):
+                return pd.DataFrame({'open_time': np.array([], dtype='int64'),
+                                     'close': np.array([], dtype='float64')})
+            series = pq.read_table(path).to_pandas()
+            self._series[symbol] = series
+        if start_ms is not None or end_ms is not None:
+            times = series['open_time'].to_numpy()
+            lo = 0 if start_ms is None else np.searchsorted(times, start_ms, side='left')
+            hi = len(times) if end_ms is None else np.searchsorted(times, end_ms, side='right')
+            series = series.iloc[lo:hi].reset_index(drop=True)
+        return series
+
+    def prices_at(self, symbol, timestamps_ms):
+        """Close of the last minute opened at or before each timestamp (NaN before the first)."""
+        series = self.load(symbol)
+        times = series['open_time'].to_numpy()
+        idx = np.searchsorted(times, np.asarray(timestamps_ms, dtype='int64'), side='right') - 1
+        closes = series['close'].to_numpy()
+        return np.where(idx >= 0, closes[np.maximum(idx, 0)] if len(closes) else np.nan, np.nan)
+
+    def price_at(self, symbol, timestamp_ms):
+        return float(self.prices_at(symbol, [timestamp_ms])[0])
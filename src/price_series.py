@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+SERIES_ROOT = './data/store/series'
+
+
+def to_minutes(datetimes) -> np.ndarray:
+    """int64 minutes since the epoch, floored, for datetimes of any unit."""
+    values = np.asarray(pd.to_datetime(datetimes), dtype='datetime64[ns]')
+    return values.astype('int64') // 60_000_000_000
+
+
+class PriceSeries:
+    """
+    Read-only price series memory-mapped from two .npy files: int64 minute
+    timestamps (sorted) and float64 closes.
+
+    Every process that opens the same files shares one copy through the page
+    cache, and pickling sends only the path, so worker pools start without
+    reparsing CSVs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.times = np.load(path + '.times.npy', mmap_mode='r')
+        self.closes = np.load(path + '.close.npy', mmap_mode='r')
+
+    def __reduce__(self):
+        return PriceSeries, (self.path,)
+
+    def __len__(self):
+        return len(self.times)
+
+    def asof(self, datetimes) -> np.ndarray:
+        """Close of the last entry at or before each datetime, NaN before the first (merge_asof backward)."""
+        idx = np.searchsorted(self.times, to_minutes(datetimes), side='right') - 1
+        if not len(self.closes):
+            return np.full(len(idx), np.nan)
+        return np.where(idx >= 0, self.closes[np.maximum(idx, 0)], np.nan)
+
+
+def write_price_series(path, datetimes, closes) -> PriceSeries:
+    times = to_minutes(datetimes)
+    closes = np.asarray(closes, dtype='float64')
+    keep = ~np.isnan(closes)
+    order = np.argsort(times[keep], kind='stable')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    for suffix, values in (('.times.npy', times[keep][order]), ('.close.npy', closes[keep][order])):
+        # write then rename so a reader never maps a half written file
+        tmp_path = path + suffix + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_path, path + suffix)
+    return PriceSeries(path)
+
+
+def series_from_csv(csv_path, time_column, value_column, root=SERIES_ROOT) -> PriceSeries:
+    """
+    PriceSeries for a price CSV (e.g. ./data/bnb_usdt.csv), converted once.
+
+    The binary files are rebuilt only when the CSV is newer. Rows whose time or
+    value does not parse (the extra header row yfinance writes) are dropped.
+    """
+    path = os.path.join(root, os.path.splitext(os.path.basename(csv_path))[0])
+    if os.path.exists(path + '.close.npy') and os.path.getmtime(path + '.close.npy') >= os.path.getmtime(csv_path):
+        return PriceSeries(path)
+
+    df = pd.read_csv(csv_path, usecols=[time_column, value_column])
+    datetimes = pd.to_datetime(df[time_column], errors='coerce', format='ISO8601')
+    values = pd.to_numeric(df[value_column], errors='coerce')
+    valid = datetimes.notna() & values.notna()
+    return write_price_series(path, datetimes[valid], values[valid])
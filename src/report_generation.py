@@ -2,42 +2,162 @@ from decimal import Decimal, ROUND_HALF_UP
 
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    SimpleDocTemplate, Flowable, Table, TableStyle, Paragraph, Spacer, PageBreak
 )
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
 import pandas as pd
 
-
-def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf',
-                                      tax_year_start='2025-04-06', tax_year_end='2026-04-05'):
-    # Prepare data
-    df['disposal_date'] = pd.to_datetime(df['disposal_date'])
-    df = df.sort_values('disposal_date')
-
-    df['profit_in_gbp'] = df['profit_in_gbp']
-    df['cost_in_gbp'] = df['cost_in_gbp']
-    df['net_profit_in_gbp'] = df['net_profit_in_gbp']
+from src.gbp_conversion import to_decimal
+from src.hmrc_rules import classify_hmrc_rule
+
+HEADER = ['#', 'Exchange', 'Market', 'Disposal Date', 'Acquired Date', 'Asset', 'Amount', 'Proceeds\n(GBP)',
+          'Cost\n(GBP)', 'Gain/Loss', 'Notes']
+
+# Define column widths (in points, 72 points = 1 inch)
+# Total available width is approximately 540 points for A4 with margins
+COL_WIDTHS = [
+    18,  # # (Index)
+    42,  # Exchange
+    42,  # Market
+    60,  # Disposal Date
+    60,  # Acquired Date
+    28,  # Asset
+    80,  # Amount
+    68,  # Proceeds
+    68,  # Cost
+    60,  # Gain/Loss
+    52,  # Notes (adjusted for new columns)
+]
+
+# Pre-measured row heights: text lines at the table's default 12pt leading plus 3pt top and
+# bottom padding. Fixed heights spare reportlab measuring every cell of every row.
+HEADER_ROW_HEIGHT = 2 * 12 + 6
+DATA_ROW_HEIGHT = 2 * 12 + 6
+TOTAL_ROW_HEIGHT = 12 + 6
+
+# disposal columns the table reads and their dtypes, all a chunked caller needs to keep for the report
+TABLE_DTYPES = {
+    'exchange': object, 'market': object, 'disposal_date': 'datetime64[ns]', 'acquired_date': 'datetime64[ns]',
+    'asset': object, 'amount': float, 'proceeds_in_gbp': object, 'cost_in_gbp': object,
+    'net_profit_in_gbp': object, 'notes': object,
+}
+TABLE_COLUMNS = list(TABLE_DTYPES)
+# disposal_totals of no disposals, the start for add_totals
+EMPTY_TOTALS = {'count': 0, 'proceeds': 0, 'cost': 0, 'gains': 0, 'losses': 0, 'amount': 0}
+
+
+def disposal_rows(df, start, stop):
+    """Table rows for disposals start..stop-1, formatted a column at a time."""
+    chunk = df.iloc[start:stop]
+    columns = [
+        [str(i) for i in range(start + 1, stop + 1)],
+        chunk['exchange'].astype(str).tolist(),
+        chunk['market'].astype(str).tolist(),
+        chunk['disposal_date'].dt.strftime('%Y-%m-%d\n%H:%M:%S').tolist(),
+        chunk['acquired_date'].dt.strftime('%Y-%m-%d\n%H:%M:%S').tolist(),
+        chunk['asset'].astype(str).tolist(),
+        [f"{v:,.4f}" for v in chunk['amount'].tolist()],
+        [f"{v:,.2f}" for v in chunk['proceeds_in_gbp'].tolist()],
+        [f"{v:,.2f}" for v in chunk['cost_in_gbp'].tolist()],
+        [f"{v:,.2f}" for v in chunk['net_profit_in_gbp'].tolist()],
+        chunk['notes'].astype(str).tolist(),
+    ]
+    return [list(row) for row in zip(*columns)]
 
 
+def disposal_table_style(has_totals):
+    last_data = -2 if has_totals else -1
+    commands = [
+        # Header styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#e6e6e6")),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
 
+        # Data styling
+        ('FONTSIZE', (0, 1), (-1, last_data), 7),  # All data rows except totals
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Index column center
+        ('ALIGN', (1, 0), (6, -1), 'LEFT'),  # Text columns left
+        ('ALIGN', (7, 1), (9, -1), 'RIGHT'),  # Number columns right
+        ('ALIGN', (10, 1), (10, -1), 'LEFT'),  # Notes column left
 
-    total_proceeds_in_gbp = df['proceeds_in_gbp'].sum()
-    total_cost = df['cost_in_gbp'].sum()
-    TWO_PLACES = Decimal("0.01")
-    # round first then minus
-    total_proceeds_in_gbp = Decimal(str(total_proceeds_in_gbp)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
-    total_cost = Decimal(str(total_cost)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+        # Vertical alignment
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
 
-    # didn't use df['cost_in_gbp'].sum() as it is different with total_proceeds_in_gbp - total_cost as the reason of round
-    total_net_profit = total_proceeds_in_gbp - total_cost
+        # Padding
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
 
-    # Calculate summary statistics
-    num_disposals = len(df)
-    total_gains = df[df['net_profit_in_gbp'] > 0]['net_profit_in_gbp'].sum()
-    total_losses = df[df['net_profit_in_gbp'] < 0]['net_profit_in_gbp'].sum()
-    net_gains = total_gains + total_losses  # losses are negative, so this gives net
+        # Grid lines
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]
+    if has_totals:
+        commands += [
+            # Totals row styling
+            ('BACKGROUND', (-5, -1), (-1, -1), colors.HexColor("#f0f0f0")),
+            ('FONTNAME', (-5, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (-5, -1), (-1, -1), 8),
+            ('TEXTCOLOR', (-5, -1), (-1, -1), colors.HexColor("#003366")),
+        ]
+    return TableStyle(commands)
+
+
+def disposal_table(df, start, stop, totals=None):
+    rows = [HEADER] + disposal_rows(df, start, stop)
+    heights = [HEADER_ROW_HEIGHT] + [DATA_ROW_HEIGHT] * (stop - start)
+    if totals is not None:
+        rows.append(totals)
+        heights.append(TOTAL_ROW_HEIGHT)
+    table = Table(rows, colWidths=COL_WIDTHS, rowHeights=heights, repeatRows=1)
+    table.setStyle(disposal_table_style(totals is not None))
+    return table
+
+
+class DisposalTable(Flowable):
+    """
+    The disposal table from row start on, laid out a page at a time.
+
+    Nothing is built up front: when the frame asks for a split, only the rows
+    that fit the space left are turned into a Table, and the rest stays a
+    DisposalTable for the next page. Memory holds one page of reportlab
+    objects and build time is linear in the number of disposals.
+    """
+
+    def __init__(self, df, start, totals):
+        super().__init__()
+        self.df = df
+        self.start = start
+        self.totals = totals
+
+    def wrap(self, availWidth, availHeight):
+        rows = len(self.df) - self.start
+        self.width = sum(COL_WIDTHS)
+        self.height = HEADER_ROW_HEIGHT + rows * DATA_ROW_HEIGHT + TOTAL_ROW_HEIGHT
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        rows = len(self.df) - self.start
+        fit = int((availHeight - HEADER_ROW_HEIGHT) // DATA_ROW_HEIGHT)
+        # keep at least one disposal above the totals row
+        fit = min(fit, rows - 1)
+        if fit <= 0:
+            return []
+        stop = self.start + fit
+        return [disposal_table(self.df, self.start, stop), DisposalTable(self.df, stop, self.totals)]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        table = disposal_table(self.df, self.start, len(self.df), self.totals)
+        table.wrap(sum(COL_WIDTHS), self.height)
+        table.drawOn(canvas, x, y, _sW)
+
+
+def prepare_disposals(df):
+    """Disposals sorted by date, with the acquired date, amount and HMRC rule the table shows."""
+    df['disposal_date'] = pd.to_datetime(df['disposal_date'])
+    df = df.sort_values('disposal_date')
 
     # Add acquired date and amount columns if they don't exist
     if 'acquired_date' not in df.columns:
@@ -47,21 +167,62 @@ def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf'
 
     df["acquired_date"] = pd.to_datetime(df["acquired_date"])
 
+    # Update notes column with HMRC rules
+    df['notes'] = classify_hmrc_rule(df['acquired_date'], df['disposal_date'])
+    return df
 
 
-    # Update notes column with HMRC rules
-    df['notes'] = ''
-    for idx, row in df.iterrows():
-        acquired_date = pd.to_datetime(row['acquired_date'])
-        disposal_date = pd.to_datetime(row['disposal_date'])
-
-        if acquired_date.date() == disposal_date.date():
-            df.at[idx, 'notes'] = 'Same Day'
-        #elif (disposal_date - acquired_date).days <= 30 and (disposal_date - acquired_date).days > 0:
-        #    df.at[idx, 'notes'] = '30-Day Rule'
-        else:
-            df.at[idx, 'notes'] = '30-Day Rule'
-        # else: leave empty
+def disposal_totals(df):
+    """Exact sums for the summary page and totals row; totals of several chunks combine with add_totals."""
+    net_profit = df['net_profit_in_gbp']
+    return {
+        'count': len(df),
+        'proceeds': df['proceeds_in_gbp'].sum(),
+        'cost': df['cost_in_gbp'].sum(),
+        'gains': net_profit[net_profit > 0].sum(),
+        'losses': net_profit[net_profit < 0].sum(),
+        'amount': df['amount'].sum(),
+    }
+
+
+def add_totals(totals, other):
+    return {key: totals[key] + other[key] for key in totals}
+
+
+def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf',
+                                      tax_year_start='2025-04-06', tax_year_end='2026-04-05'):
+    # futures rows are daily totals for Other Gains and Costs & Expenses, not disposals
+    if 'market' in df.columns:
+        futures = df[df['market'] == 'futures']
+        df = df[df['market'] != 'futures']
+    else:
+        futures = df.iloc[:0]
+    df = prepare_disposals(df)
+    build_uk_crypto_tax_pdf_report(df, disposal_totals(df), futures, output_path, tax_year_start, tax_year_end)
+
+
+def build_uk_crypto_tax_pdf_report(disposals, totals, futures, output_path='uk_crypto_tax_report.pdf',
+                                   tax_year_start='2025-04-06', tax_year_end='2026-04-05'):
+    """
+    Write the report for prepared disposals and their disposal_totals.
+
+    disposals is a frame from prepare_disposals, or anything with len() and
+    .iloc[start:stop] returning such a frame (the chunked pipeline's spilled
+    disposals); the table reads it a page at a time.
+    """
+    TWO_PLACES = Decimal("0.01")
+    # round first then minus
+    total_proceeds_in_gbp = Decimal(str(totals['proceeds'])).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+    total_cost = Decimal(str(totals['cost'])).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+    # didn't use df['cost_in_gbp'].sum() as it is different with total_proceeds_in_gbp - total_cost as the reason of round
+    total_net_profit = total_proceeds_in_gbp - total_cost
+
+    # Calculate summary statistics
+    num_disposals = totals['count']
+    total_gains = totals['gains']
+    total_losses = totals['losses']
+    net_gains = total_gains + total_losses  # losses are negative, so this gives net
 
     # Setup PDF
     doc = SimpleDocTemplate(output_path, pagesize=A4,
@@ -106,7 +267,14 @@ def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf'
 
     # Other Sections (with "No transactions" indication)
     elements.append(Paragraph("Other Gains:", styles['Heading3']))
-    elements.append(Paragraph("No transactions", styles['Normal']))
+    if futures.empty:
+        elements.append(Paragraph("No transactions", styles['Normal']))
+    else:
+        realized_pnl = to_decimal(futures['realized_pnl_in_gbp']).sum().quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+        funding = to_decimal(futures['funding_in_gbp']).sum().quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+        elements.append(Paragraph(f"Futures Realised Profit/Loss: {realized_pnl:,.2f} GBP", styles['Normal']))
+        elements.append(Paragraph(f"Futures Funding: {funding:,.2f} GBP", styles['Normal']))
+        elements.append(Paragraph(f"Net Other Gains: {realized_pnl + funding:,.2f} GBP", styles['Normal']))
     elements.append(Spacer(1, 6))
 
     elements.append(Paragraph("Income:", styles['Heading3']))
@@ -114,7 +282,11 @@ def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf'
     elements.append(Spacer(1, 6))
 
     elements.append(Paragraph("Costs & Expenses:", styles['Heading3']))
-    elements.append(Paragraph("No transactions", styles['Normal']))
+    if futures.empty:
+        elements.append(Paragraph("No transactions", styles['Normal']))
+    else:
+        futures_fees = to_decimal(futures['commission_in_gbp']).sum().quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+        elements.append(Paragraph(f"Futures Trading Fees: {futures_fees:,.2f} GBP", styles['Normal']))
     elements.append(Spacer(1, 6))
 
     elements.append(Paragraph("Gifts, Donations & Lost Coins:", styles['Heading3']))
@@ -128,93 +300,15 @@ def generate_uk_crypto_tax_pdf_report(df, output_path='uk_crypto_tax_report.pdf'
     elements.append(Paragraph("Capital Gains Transactions", styles['Heading2']))  # Renamed section title
     elements.append(Spacer(1, 10))
 
-    fields = ['exchange', 'market', 'disposal_date', 'acquired_date', 'asset', 'amount', 'proceeds_in_gbp',
-              'cost_in_gbp', 'net_profit_in_gbp', 'notes']
-    table_data = [
-        ['#', 'Exchange', 'Market', 'Disposal Date', 'Acquired Date', 'Asset', 'Amount', 'Proceeds\n(GBP)',
-         'Cost\n(GBP)', 'Gain/Loss', 'Notes']]
-
-    for idx, row in enumerate(df[fields].itertuples(index=False), start=1):
-        # Wrap the notes text in a Paragraph for proper text wrapping
-        notes_paragraph = Paragraph(str(row.notes), styles['SmallText'])
-
-        table_data.append([
-            str(idx),
-            row.exchange,
-            row.market,
-            row.disposal_date.strftime('%Y-%m-%d\n%H:%M:%S'),
-            row.acquired_date.strftime('%Y-%m-%d\n%H:%M:%S'),
-            row.asset,
-            f"{row.amount:,.4f}",
-            f"{row.proceeds_in_gbp:,.2f}",
-            f"{row.cost_in_gbp:,.2f}",
-            f"{row.net_profit_in_gbp:,.2f}",
-            notes_paragraph,
-        ])
-
-    # Totals row
-    table_data.append([
+    totals_row = [
         '', '', '', '', '', 'Total',
-        f"{df['amount'].sum():,.4f}",
+        f"{totals['amount']:,.4f}",
         f"{total_proceeds_in_gbp:,.2f}",
         f"{total_cost:,.2f}",
         f"{total_net_profit:,.2f}",
         ''
-    ])
-
-    # Define column widths (in points, 72 points = 1 inch)
-    # Total available width is approximately 540 points for A4 with margins
-    col_widths = [
-        18,  # # (Index)
-        42,  # Exchange
-        42,  # Market
-        60,  # Disposal Date
-        60,  # Acquired Date
-        28,  # Asset
-        80,  # Amount
-        68,  # Proceeds
-        68,  # Cost
-        60,  # Gain/Loss
-        52,  # Notes (adjusted for new columns)
     ]
-
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-    table.setStyle(TableStyle([
-        # Header styling
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#e6e6e6")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 8),
-
-        # Data styling
-        ('FONTSIZE', (0, 1), (-1, -2), 7),  # All data rows except totals
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Index column center
-        ('ALIGN', (1, 0), (6, -1), 'LEFT'),  # Text columns left
-        ('ALIGN', (7, 1), (9, -1), 'RIGHT'),  # Number columns right
-        ('ALIGN', (10, 1), (10, -1), 'LEFT'),  # Notes column left
-
-        # Vertical alignment
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-
-        # Padding
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('LEFTPADDING', (0, 0), (-1, -1), 3),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-
-        # Grid lines
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-
-        # Totals row styling
-        ('BACKGROUND', (-5, -1), (-1, -1), colors.HexColor("#f0f0f0")),
-        ('FONTNAME', (-5, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (-5, -1), (-1, -1), 8),
-        ('TEXTCOLOR', (-5, -1), (-1, -1), colors.HexColor("#003366")),
-
-        # Word wrapping for notes column
-        ('WORDWRAP', (10, 0), (10, -1), True),
-    ]))
-
-    elements.append(table)
+    elements.append(DisposalTable(disposals, 0, totals_row))
 
     # Build PDF
     doc.build(elements)
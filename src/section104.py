@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+from src.hmrc_rules import BED_AND_BREAKFAST, RULES, SAME_DAY, SECTION_104
+
+BED_AND_BREAKFAST_DAYS = 30
+# quantities below this are treated as fully matched (float dust from pro-rating)
+QTY_EPSILON = 1e-12
+
+DISPOSAL_COLUMNS = ['asset', 'disposal_date', 'acquired_date', 'rule', 'qty', 'proceeds', 'cost', 'gain_loss']
+
+
+def daily_totals(fills: pd.DataFrame, usd_gbp=None) -> pd.DataFrame:
+    """
+    Fills (datetime, asset or symbol, side, qty, price) summed per asset and
+    calendar day, as HMRC treats all of a day's acquisitions (and disposals)
+    of an asset as one.
+
+    Values are in GBP at each fill's own date: price times the fill's usd_gbp
+    column, or the usd_gbp PriceSeries as of its day (as add_gbp_values does).
+    """
+    if 'asset' in fills.columns:
+        asset = fills['asset'].to_numpy()
+    else:
+        asset = fills['symbol'].str.replace('USDT', '').to_numpy()
+    day = np.asarray(pd.to_datetime(fills['datetime'], format='ISO8601'), dtype='datetime64[ns]')
+    qty = fills['qty'].to_numpy(dtype=float)
+    if 'usd_gbp' in fills.columns:
+        rate = fills['usd_gbp'].to_numpy(dtype=float)
+    elif usd_gbp is not None:
+        rate = np.asarray(usd_gbp.asof(day.astype('datetime64[D]').astype('datetime64[ns]')), dtype=float)
+    else:
+        raise ValueError("fills need a usd_gbp column or a usd_gbp series to value them in GBP")
+    value = qty * fills['price'].to_numpy(dtype=float) * rate
+    is_buy = (fills['side'] == 'buy').to_numpy()
+
+    days = pd.DataFrame({
+        'asset': asset,
+        'day': day.astype('datetime64[D]').astype('datetime64[ns]'),
+        'buy_qty': np.where(is_buy, qty, 0.0),
+        'buy_cost': np.where(is_buy, value, 0.0),
+        'sell_qty': np.where(is_buy, 0.0, qty),
+        'sell_proceeds': np.where(is_buy, 0.0, value),
+    })
+    return days.groupby(['asset', 'day'], sort=True, as_index=False).sum()
+
+
+def _share(total, part, whole):
+    # value of part of a day's quantity, at that day's average
+    return total * part / whole if whole > 0 else 0.0
+
+
+class Section104Pool:
+    """
+    HMRC share matching for many assets, fed fills in time order.
+
+    Each disposal is matched against same-day acquisitions first, then
+    acquisitions in the following 30 days (bed and breakfasting), and the rest
+    comes out of the asset's Section 104 pool at average cost. The pools are
+    two float arrays (quantity, allowable cost) indexed by asset slot, updated
+    as each day is settled, so years of history cost one pass.
+
+    add_fills() settles every day more than 30 days before the latest fill
+    seen and keeps the later days pending, since their disposals may still be
+    matched by acquisitions not seen yet; finish() settles the rest.
+    Costs and proceeds are in GBP: each acquisition enters the pool at the
+    USD/GBP rate of its own date (see daily_totals), as HMRC requires.
+    """
+
+    def __init__(self, usd_gbp=None):
+        self.usd_gbp = usd_gbp
+        self.slots = {}
+        self.qty = np.zeros(16)
+        self.cost = np.zeros(16)
+        self.pending = daily_totals(pd.DataFrame({'datetime': [], 'asset': [], 'side': [], 'qty': [], 'price': [],
+                                                  'usd_gbp': []}))
+        self.last_day = None
+
+    def slot(self, asset):
+        if asset not in self.slots:
+            if len(self.slots) == len(self.qty):
+                self.qty = np.concatenate([self.qty, np.zeros(len(self.qty))])
+                self.cost = np.concatenate([self.cost, np.zeros(len(self.cost))])
+            self.slots[asset] = len(self.slots)
+        return self.slots[asset]
+
+    def holding(self, asset):
+        """(quantity, allowable cost in GBP) in the asset's pool."""
+        if asset not in self.slots:
+            return 0.0, 0.0
+        i = self.slots[asset]
+        return float(self.qty[i]), float(self.cost[i])
+
+    def add_fills(self, fills: pd.DataFrame) -> pd.DataFrame:
+        days = daily_totals(fills, self.usd_gbp)
+        if days.empty:
+            return self._disposals([])
+        self.pending = (pd.concat([self.pending, days], ignore_index=True)
+                        .groupby(['asset', 'day'], sort=True, as_index=False).sum())
+        latest = days['day'].max()
+        self.last_day = latest if self.last_day is None else max(self.last_day, latest)
+        # the last day may still get fills, so only days whose 30 day window closes before it are settled
+        return self._settle(self.last_day - pd.Timedelta(days=BED_AND_BREAKFAST_DAYS + 1))
+
+    def finish(self) -> pd.DataFrame:
+        return self._settle(None)
+
+    def _settle(self, cutoff):
+        records = []
+        rest = []
+        for asset, group in self.pending.groupby('asset', sort=True):
+            rest.append(self._settle_asset(asset, group, cutoff, records))
+        self.pending = pd.concat([self.pending.iloc[:0]] + rest, ignore_index=True)
+        return self._disposals(records)
+
+    def _settle_asset(self, asset, group, cutoff, records):
+        day = group['day'].to_numpy()
+        buy_qty = group['buy_qty'].to_numpy(dtype=float)
+        buy_cost = group['buy_cost'].to_numpy(dtype=float)
+        sell_qty = group['sell_qty'].to_numpy(dtype=float)
+        sell_proceeds = group['sell_proceeds'].to_numpy(dtype=float)
+        settled = len(day) if cutoff is None else int(np.searchsorted(day, np.datetime64(cutoff), side='right'))
+
+        # 1. same day: recomputed on pending days each time, so late fills on a day are included
+        same = np.minimum(buy_qty, sell_qty)
+        matched = np.flatnonzero(same[:settled] > QTY_EPSILON)
+        same_proceeds = sell_proceeds[matched] * same[matched] / sell_qty[matched]
+        same_cost = buy_cost[matched] * same[matched] / buy_qty[matched]
+        records.extend(zip([asset] * len(matched), day[matched], day[matched], [SAME_DAY] * len(matched),
+                           same[matched], same_proceeds, same_cost))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            left_buy_cost = np.where(buy_qty > 0, buy_cost * (buy_qty - same) / buy_qty, 0.0).tolist()
+            left_sell_proceeds = np.where(sell_qty > 0, sell_proceeds * (sell_qty - same) / sell_qty, 0.0).tolist()
+        left_buy = (buy_qty - same).tolist()
+        left_sell = (sell_qty - same).tolist()
+        day_number = day.astype('datetime64[D]').astype('int64').tolist()
+
+        # 2. 30 days: disposals in date order take the earliest acquisitions of the next 30 days
+        used_qty = [0.0] * len(day)
+        used_cost = [0.0] * len(day)
+        first = 0
+        for i in range(settled):
+            first = max(first, i + 1)
+            while first < len(day) and left_buy[first] <= QTY_EPSILON:
+                first += 1
+            k = first
+            while left_sell[i] > QTY_EPSILON and k < len(day) and day_number[k] - day_number[i] <= BED_AND_BREAKFAST_DAYS:
+                if left_buy[k] > QTY_EPSILON:
+                    q = min(left_sell[i], left_buy[k])
+                    cost = _share(left_buy_cost[k], q, left_buy[k])
+                    proceeds = _share(left_sell_proceeds[i], q, left_sell[i])
+                    records.append((asset, day[i], day[k], BED_AND_BREAKFAST, q, proceeds, cost))
+                    left_buy[k] -= q
+                    left_buy_cost[k] -= cost
+                    left_sell[i] -= q
+                    left_sell_proceeds[i] -= proceeds
+                    used_qty[k] += q
+                    used_cost[k] += cost
+                k += 1
+
+        # 3. Section 104 pool, a day at a time
+        s = self.slot(asset)
+        pool_qty, pool_cost = float(self.qty[s]), float(self.cost[s])
+        for i in range(settled):
+            if left_buy[i] > QTY_EPSILON:
+                pool_qty += left_buy[i]
+                pool_cost += left_buy_cost[i]
+            if left_sell[i] > QTY_EPSILON:
+                q = min(left_sell[i], pool_qty)
+                if q > QTY_EPSILON:
+                    cost = _share(pool_cost, q, pool_qty)
+                    records.append((asset, day[i], None, SECTION_104, q,
+                                    _share(left_sell_proceeds[i], q, left_sell[i]), cost))
+                    pool_qty -= q
+                    pool_cost -= cost
+                if left_sell[i] - q > QTY_EPSILON:
+                    # nothing left to match (a short held past 30 days): no rule, no allowable cost
+                    records.append((asset, day[i], None, None, left_sell[i] - q,
+                                    _share(left_sell_proceeds[i], left_sell[i] - q, left_sell[i]), 0.0))
+        self.qty[s], self.cost[s] = pool_qty, pool_cost
+
+        # pending days keep their own fills, less what earlier disposals took under the 30 day rule
+        rest = group.iloc[settled:].copy()
+        rest['buy_qty'] -= np.asarray(used_qty[settled:])
+        rest['buy_cost'] -= np.asarray(used_cost[settled:])
+        return rest
+
+    @staticmethod
+    def _disposals(records):
+        df = pd.DataFrame(records, columns=DISPOSAL_COLUMNS[:-1])
+        df['asset'] = df['asset'].astype(str)
+        df['disposal_date'] = pd.to_datetime(df['disposal_date'])
+        df['acquired_date'] = pd.to_datetime(df['acquired_date'])
+        df['rule'] = pd.Categorical(df['rule'], categories=RULES)
+        df['qty'] = df['qty'].astype(float)
+        df['proceeds'] = df['proceeds'].astype(float)
+        df['cost'] = df['cost'].astype(float)
+        df['gain_loss'] = df['proceeds'] - df['cost']
+        return df.sort_values(['disposal_date', 'asset', 'rule'], kind='mergesort').reset_index(drop=True)
+
+
+def section104_disposals(fills: pd.DataFrame, usd_gbp=None) -> pd.DataFrame:
+    """Match every disposal in fills under the HMRC rules, one row per rule and disposal day, in GBP."""
+    pool = Section104Pool(usd_gbp)
+    settled = pool.add_fills(fills)
+    return pd.concat([settled, pool.finish()], ignore_index=True)
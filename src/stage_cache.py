@@ -0,0 +1,128 @@
+import functools
+import hashlib
+import importlib
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+CACHE_ROOT = './data/cache'
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_digest(path) -> str:
+    """Content hash of a file, read a chunk at a time; repeated calls are free until the file changes."""
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path, size, mtime_ns):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def folder_digest(folder) -> str:
+    """Hash of every file under folder (relative paths and contents); a missing folder hashes as empty."""
+    files = []
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            files.append((os.path.relpath(path, folder), file_digest(path)))
+    return fingerprint(sorted(files))
+
+
+def code_digest(*modules) -> str:
+    """Hash of the source files of the named modules, so a stage reruns when its code changes."""
+    return fingerprint([file_digest(importlib.import_module(module).__file__) for module in modules])
+
+
+def fingerprint(*parts) -> str:
+    """
+    Hash of a stage's inputs.
+
+    parts may be strings, numbers, None, numpy arrays (hashed by dtype, shape
+    and bytes), DataFrames (pandas row hashes), lists, tuples and dicts of
+    these, or objects such as PriceSeries and PriceIndex, hashed by their
+    attributes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, parts)
+    return digest.hexdigest()
+
+
+def _update(digest, value):
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, (list, tuple)):
+        digest.update(b'%d' % len(value))
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        _update(digest, sorted((str(key), item) for key, item in value.items()))
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            _update(digest, [str(item) for item in value.tolist()])
+        else:
+            digest.update(f'{value.dtype}{value.shape}'.encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, pd.DataFrame):
+        _update(digest, [str(column) for column in value.columns])
+        _update(digest, pd.util.hash_pandas_object(value, index=False).to_numpy())
+    elif isinstance(value, (str, int, float, bool, type(None), pd.Timestamp)):
+        digest.update(repr(value).encode())
+    else:
+        _update(digest, vars(value))
+
+
+class StageCache:
+    """
+    Pipeline stage results stored under the fingerprint of their inputs.
+
+        cache = StageCache()
+        df = cache.get('gbp/margin', fingerprint(trades_key, usd_gbp), lambda: convert(...))
+
+    A stage is recomputed only when its key changes, and its new result
+    replaces the old one, so the cache holds one result per stage name.
+    Results are pickled, keeping Decimal columns exact. hits and misses
+    record which stages were loaded and which computed.
+    """
+
+    def __init__(self, root=CACHE_ROOT):
+        self.root = root
+        self.hits = set()
+        self.misses = set()
+
+    def _path(self, stage, key):
+        return os.path.join(self.root, stage, key + '.pkl')
+
+    def has(self, stage, key) -> bool:
+        return os.path.exists(self._path(stage, key))
+
+    def load(self, stage, key):
+        with open(self._path(stage, key), 'rb') as f:
+            value = pickle.load(f)
+        self.hits.add(stage)
+        return value
+
+    def save(self, stage, key, value):
+        folder = os.path.join(self.root, stage)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+        path = self._path(stage, key)
+        # written aside then renamed, so an interrupted run never leaves a truncated result
+        with open(path + '.part', 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.part', path)
+        self.misses.add(stage)
+        return value
+
+    def get(self, stage, key, compute):
+        """The stored result for key, else compute() saved under it."""
+        if self.has(stage, key):
+            return self.load(stage, key)
+        return self.save(stage, key, compute())
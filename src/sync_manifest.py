@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+
+MANIFEST_ROOT = './data/store/manifest'
+
+
+class SyncManifest:
+    """
+    High-water marks of an incremental trade sync, one JSON file per market.
+
+    For each symbol it keeps the id and time (ms) of the last fill stored and
+    the end (ms) of the last time window fetched, so a sync resumes with
+    fromId after the last fill, or after the last empty window when the
+    symbol has no fills yet. One instance can be shared by threads syncing
+    different symbols of the market.
+    """
+
+    def __init__(self, market, root=MANIFEST_ROOT):
+        self.path = os.path.join(root, f'{market}.json')
+        self.symbols = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.symbols = json.load(f)
+
+    def get(self, symbol):
+        with self.lock:
+            return dict(self.symbols.get(symbol, {}))
+
+    def update(self, symbol, last_id=None, last_time=None, synced_until=None):
+        with self.lock:
+            entry = self.symbols.setdefault(symbol, {})
+            if last_id is not None:
+                entry['last_id'] = int(last_id)
+                entry['last_time'] = int(last_time)
+            if synced_until is not None:
+                entry['synced_until'] = int(synced_until)
+            self._save()
+
+    def _save(self):
+        # write then rename so a crash never leaves a half written manifest
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.symbols, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
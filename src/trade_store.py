@@ -0,0 +1,152 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+STORE_ROOT = './data/store/trades'
+
+# Columns kept for every fill, whatever the market. realizedPnl is only set for futures.
+TRADE_SCHEMA = pa.schema([
+    ('datetime', pa.timestamp('ms')),
+    ('id', pa.int64()),
+    ('orderId', pa.int64()),
+    ('side', pa.string()),
+    ('price', pa.float64()),
+    ('qty', pa.float64()),
+    ('quoteQty', pa.float64()),
+    ('commission', pa.float64()),
+    ('commissionAsset', pa.string()),
+    ('realizedPnl', pa.float64()),
+])
+
+# One fill as exchange adapters yield it (BaseExchange.fetch_trades): the symbol, then the store columns
+FILL_SCHEMA = pa.schema([pa.field('symbol', pa.string()), *TRADE_SCHEMA])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('market', pa.string()), ('symbol', pa.string()), ('month', pa.string())]),
+    flavor='hive',
+)
+
+# rows per parquet row group, small enough that a tax year filter skips most of a busy symbol
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def to_trade_table(df: pd.DataFrame, market: str) -> pa.Table:
+    """Typed table for the store from a fetcher frame (datetime, symbol, side, price, qty, ...)."""
+    df = df.copy()
+    df['datetime'] = pd.to_datetime(df['datetime'], format='ISO8601')
+    if 'id' not in df.columns:
+        df['id'] = pd.NA
+    if 'realizedPnl' not in df.columns:
+        df['realizedPnl'] = float('nan')
+    df['market'] = market
+    df['month'] = df['datetime'].dt.strftime('%Y-%m')
+
+    table = pa.Table.from_pandas(df[TRADE_SCHEMA.names], schema=TRADE_SCHEMA, preserve_index=False)
+    return (table.append_column('market', pa.array(df['market'], pa.string()))
+            .append_column('symbol', pa.array(df['symbol'], pa.string()))
+            .append_column('month', pa.array(df['month'], pa.string())))
+
+
+def write_trades(df: pd.DataFrame, market: str, root: str = STORE_ROOT, append: bool = False):
+    """
+    Write fills to the store, partitioned as market=/symbol=/month=.
+
+    The fills are merged with those stored for the same symbol and month:
+    a stored fill is replaced when df has its id again or, for fills without
+    an id (CSV imports), when it lies within df's time span. Re-fetching part
+    of a month, e.g. from the 6th of April, keeps the fills stored for the
+    rest of it. With append=True the fills are added next to
+    what is stored instead; files are named after the first trade id, so
+    appending the same batch twice overwrites it rather than duplicating it.
+    """
+    if df.empty:
+        return
+    os.makedirs(root, exist_ok=True)
+    table = to_trade_table(df, market)
+    options = {'existing_data_behavior': 'delete_matching'}
+    if append:
+        options = {
+            'existing_data_behavior': 'overwrite_or_ignore',
+            'basename_template': f"part-{int(df['id'].min())}-{{i}}.parquet",
+        }
+    else:
+        table = _merge_stored(table, market, root)
+    ds.write_dataset(
+        table,
+        root,
+        format='parquet',
+        partitioning=PARTITIONING,
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=min(len(table), ROW_GROUP_SIZE),
+        **options,
+    )
+
+
+def _merge_stored(table: pa.Table, market: str, root: str) -> pa.Table:
+    # the stored fills of the partitions table is about to replace that table does not fetch again
+    if not os.path.isdir(os.path.join(root, f'market={market}')):
+        return table
+    expr = ((ds.field('market') == market)
+            & ds.field('symbol').isin(pc.unique(table['symbol']))
+            & ds.field('month').isin(pc.unique(table['month'])))
+    stored = trade_dataset(root).to_table(columns=table.schema.names, filter=expr).cast(table.schema)
+    # a fill with an id is kept unless table has it again; one without (a CSV import) unless table spans its time
+    fetched = pc.min_max(table['datetime'])
+    outside = pc.or_(pc.less(stored['datetime'], fetched['min']), pc.greater(stored['datetime'], fetched['max']))
+    kept = pc.if_else(pc.is_valid(stored['id']), pc.invert(pc.is_in(stored['id'], table['id'])), outside)
+    merged = pa.concat_tables([stored.filter(kept), table])
+    return merged.take(pc.sort_indices(merged, [('datetime', 'ascending')]))
+
+
+def trade_dataset(root: str = STORE_ROOT) -> ds.Dataset:
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+
+def list_symbols(market: str, root: str = STORE_ROOT) -> list:
+    folder = os.path.join(root, f'market={market}')
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(folder) if name.startswith('symbol='))
+
+
+def read_trades(market: str, symbol: str = None, columns=None, start=None, end=None,
+                root: str = STORE_ROOT) -> pd.DataFrame:
+    """
+    Load fills from the store.
+
+    Only the requested columns are read. start/end (inclusive dates, e.g. the tax
+    year) prune month partitions and row groups before anything is decoded.
+    """
+    expr = ds.field('market') == market
+    if symbol is not None:
+        expr &= ds.field('symbol') == symbol
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr &= (ds.field('month') >= start.strftime('%Y-%m')) & (ds.field('datetime') >= start)
+    if end is not None:
+        end = pd.Timestamp(end) + pd.Timedelta(days=1)
+        expr &= (ds.field('month') <= end.strftime('%Y-%m')) & (ds.field('datetime') < end)
+
+    table = trade_dataset(root).to_table(columns=columns, filter=expr)
+    df = table.to_pandas()
+    if 'datetime' in df.columns:
+        df = df.sort_values('datetime', kind='mergesort').reset_index(drop=True)
+    return df
+
+
+def fills_frame(batches, columns=None) -> pd.DataFrame:
+    """DataFrame of FILL_SCHEMA record batches, only the given columns converted."""
+    table = pa.Table.from_batches(list(batches), schema=FILL_SCHEMA)
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def import_csv_folder(folder: str, market: str, root: str = STORE_ROOT):
+    """Move existing per-symbol CSVs (./data/raw/<market>/*.csv) into the store."""
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.csv'):
+            write_trades(pd.read_csv(os.path.join(folder, filename)), market, root=root)
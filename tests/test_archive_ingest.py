@@ -0,0 +1,73 @@
+import functools
+import threading
+import zipfile
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from exchanges.binance import BinanceExchange
+from src.archive_ingest import read_trade_archive
+from src.trade_store import read_trades
+
+EXPORT = """Date(UTC),Symbol,Side,Price,Quantity,Amount,Fee,Realized Profit,Order ID,Trade ID
+2024-05-01 10:00:00,BTCUSDT,BUY,60000,0.01,600,0.24 USDT,0,11,101
+2024-05-01 11:00:00,BTCUSDT,SELL,61000,0.01,610,0.0004 BNB,10,12,102
+2024-06-02 09:30:00,ETHUSDT,SELL,3000,0.5,1500,0.6 USDT,-5.5,13,103
+"""
+
+
+def write_archive(path):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('readme.txt', 'not trades')
+        archive.writestr('trades.csv', EXPORT)
+
+
+def test_read_trade_archive_normalizes_export(tmp_path):
+    write_archive(tmp_path / 'trades.zip')
+    chunks = list(read_trade_archive(tmp_path / 'trades.zip', chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    df = pd.concat(chunks, ignore_index=True)
+    assert list(df['side']) == ['buy', 'sell', 'sell']
+    assert list(df['commission']) == [0.24, 0.0004, 0.6]
+    assert list(df['commissionAsset']) == ['USDT', 'BNB', 'USDT']
+    assert list(df['realizedPnl']) == [0.0, 10.0, -5.5]
+
+
+class StubFutures:
+    def __init__(self, url):
+        self.url = url
+        self.polls = 0
+
+    def download_trade_asyn(self, startTime, endTime):
+        return {'avgCostTimestampOfLast30d': 1, 'downloadId': '42'}
+
+    def async_download_trade_id(self, downloadId):
+        self.polls += 1
+        if self.polls < 2:
+            return {'downloadId': downloadId, 'status': 'processing', 'url': ''}
+        return {'downloadId': downloadId, 'status': 'completed', 'url': self.url}
+
+
+def test_ingest_futures_archive_from_local_server(tmp_path, monkeypatch):
+    served = tmp_path / 'served'
+    served.mkdir()
+    write_archive(served / 'export.zip')
+    server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                 functools.partial(SimpleHTTPRequestHandler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('exchanges.binance.time.sleep', lambda seconds: None)
+    try:
+        ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2025-04-05")
+        ex.futures_client = StubFutures(f'http://127.0.0.1:{server.server_port}/export.zip')
+
+        assert ex.ingest_futures_trade_archive() == 3
+        assert ex.ingest_futures_trade_archive() == 3  # a second export replaces the months it covers
+    finally:
+        server.shutdown()
+
+    stored = read_trades('futures')
+    assert list(stored['id']) == [101, 102, 103]
+    assert list(stored['symbol']) == ['BTCUSDT', 'BTCUSDT', 'ETHUSDT']
+    assert not (tmp_path / 'data/raw/futures/trades.zip.part').exists()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from src.commission_valuation import PriceIndex, commission_assets, value_commissions, value_interest
+from src.gbp_conversion import convert_interest_to_gbp
+from src.price_cache import PriceCache
+from src.price_series import write_price_series
+
+
+def test_price_index_matches_asof_per_asset(tmp_path):
+    bnb = write_price_series(str(tmp_path / 'bnb'), pd.to_datetime(['2025-01-01 00:00', '2025-01-01 00:05']),
+                             [600.0, 610.0])
+    cache = PriceCache(str(tmp_path / 'prices'))
+    start = int(pd.Timestamp('2025-01-01 00:02').timestamp() * 1000)
+    cache.add('ETHUSDT', [[start, 0, 0, 0, '3300.5'], [start + 60_000, 0, 0, 0, '3301.5']], start, start + 60_000)
+    index = PriceIndex.from_price_cache(cache, ['ETH', 'BNB'], series={'BNB': bnb})
+
+    times = pd.to_datetime(['2025-01-01 00:01', '2025-01-01 00:01', '2025-01-01 00:03', '2025-01-01 00:09',
+                            '2025-01-01 00:09', '2025-01-01 00:09'])
+    rates = index.rates(['BNB', 'ETH', 'ETH', 'BNB', 'USDC', 'DOGE'], times)
+
+    np.testing.assert_array_equal(rates, [600.0, np.nan, 3301.5, 610.0, 1.0, np.nan])
+    assert index.assets == ['BNB', 'ETH']
+
+
+def test_value_commissions_prices_both_sides():
+    index = PriceIndex({'BNB': pd.DataFrame({'open_time': [0], 'close': [600.0]}),
+                        'ETH': pd.DataFrame({'open_time': [0], 'close': [3000.0]})})
+    lots = pd.DataFrame({
+        'open_time_minute': pd.to_datetime(['2025-01-01', '2025-01-02']),
+        'commission_sell': [0.001, 0.5],
+        'commission_asset_sell': ['BNB', 'XYZ'],
+        'commission_buy': [0.0002, 1.5],
+        'commission_asset_buy': ['ETH', 'USDT'],
+    })
+    lots = value_commissions(lots, index)
+
+    assert list(lots['commission_rate_sell']) == [600.0, 0.0]
+    assert list(lots['commission_rate_buy']) == [3000.0, 1.0]
+    assert commission_assets(lots['commission_asset_sell'], lots['commission_asset_buy']) == ['BNB', 'ETH', 'XYZ']
+
+
+def test_interest_is_valued_in_its_own_asset():
+    index = PriceIndex({'BNB': pd.DataFrame({'open_time': [0], 'close': [600.0]}),
+                        'BTC': pd.DataFrame({'open_time': [0], 'close': [90000.0]})})
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.to_datetime(['2025-01-01'] * 4),
+        'asset': ['BNB', 'USDT', 'BTC', 'XYZ'],
+        'interest': [0.01, 2.0, 0.0001, 5.0],
+        'bnb_usdt': 600.0,
+        'usd_to_gbp': 0.5,
+    })
+
+    interest = convert_interest_to_gbp(value_interest(interest, index))
+
+    # isolated USDT interest is worth 2 USDT, not 2 BNB; an unpriced asset counts 0
+    assert list(interest['interest_rate']) == [600.0, 1.0, 90000.0, 0.0]
+    assert [float(v) for v in interest['interest_in_gbp']] == [3.0, 1.0, 4.5, 0.0]
@@ -4,7 +4,9 @@ import pandas as pd
 
 
 
-from src.data_processing import calculate_pnl_2
+from src.data_processing import (
+    add_cum_qty, calculate_pnl_2, calculate_pnl_one, get_common_cum_qty, modify_trade_list
+)
 
 # Sample data
 data = """
@@ -194,3 +196,37 @@ def test_calculate_fifo_pnl_totals_fail():
     assert result['qty'].sum() != 38647.0 + 1
     assert not abs(result['profit'].sum() + 255.6037 + 0.1) < 1e-6
     assert not abs(result['commission_bnb'].sum() - (0.0205031799 + 0.01)) < 1e-10
+
+
+def test_calculate_pnl_2_matches_list_pipeline():
+    trades = pd.read_csv(StringIO(data))
+    result, result_summary = calculate_pnl_2(trades)
+
+    trades = trades.sort_values("datetime", kind="mergesort").reset_index(drop=True)
+    orders = {"sell": [], "buy": []}
+    for _, row in trades.iterrows():
+        orders[row["side"]].append({
+            "symbol": row["symbol"],
+            "qty": float(row["qty"]),
+            "price": float(row["price"]),
+            "commission": float(row["commission"]),
+            "quoteQty": float(row["quoteQty"]),
+            "commissionAsset": row["commissionAsset"],
+            "open_time": pd.to_datetime(row["datetime"]),
+        })
+    sell_orders = add_cum_qty(orders["sell"])
+    buy_orders = add_cum_qty(orders["buy"])
+    common_cum_qty = get_common_cum_qty(sell_orders, buy_orders)
+    modify_trade_list(common_cum_qty, sell_orders)
+    modify_trade_list(common_cum_qty, buy_orders)
+    expected, expected_summary = calculate_pnl_one(sell_orders, buy_orders)
+
+    assert len(result) == len(expected)
+    for row, expected_row in zip(result, expected):
+        assert row.keys() == expected_row.keys()
+        for key, value in expected_row.items():
+            if isinstance(value, float):
+                assert abs(row[key] - value) < 1e-9
+            else:
+                assert row[key] == value
+    assert abs(result_summary['profit'] - expected_summary['profit']) < 1e-6
@@ -0,0 +1,61 @@
+from binance.error import ClientError
+
+from exchanges.binance import BinanceExchange
+from exchanges.fetch_scheduler import WeightRateLimiter, fetch_symbols
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_spends_request_weight():
+    clock = FakeClock()
+    limiter = WeightRateLimiter(weight_per_minute=60, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        limiter.acquire(20)
+    assert clock.now == 0
+
+    # bucket is empty, 20 weight refills at 1 per second
+    limiter.acquire(20)
+    assert clock.now == 20
+
+    limiter.backoff(30)
+    limiter.acquire(1)
+    assert clock.now >= 50
+
+
+class RateLimitedSpot:
+    def __init__(self):
+        self.calls = 0
+
+    def my_trades(self, **params):
+        self.calls += 1
+        if self.calls == 1:
+            raise ClientError(429, -1003, 'Too many requests', {'Retry-After': '7'})
+        return [{'id': self.calls}]
+
+
+def test_fetch_backs_off_on_429_and_runs_symbols_concurrently():
+    clock = FakeClock()
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-08")
+    ex.rate_limiter = WeightRateLimiter(clock=clock, sleep=clock.sleep)
+    ex.client = RateLimitedSpot()
+
+    assert ex._fetch_with_retry(ex.client.my_trades, symbol='CTXCUSDT') == [{'id': 2}]
+    assert clock.now >= 7
+
+    def fetch(symbol):
+        if symbol == 'BADUSDT':
+            raise ValueError('Invalid symbol')
+        return symbol.lower()
+
+    results = fetch_symbols(fetch, ['CTXCUSDT', 'BADUSDT', 'ACAUSDT'], workers=2)
+    assert results == {'CTXCUSDT': 'ctxcusdt', 'ACAUSDT': 'acausdt'}
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pandas as pd
+
+from src.commission_valuation import PriceIndex
+from src.futures_processing import futures_daily_totals, futures_in_gbp
+from src.price_series import write_price_series
+from src.report_generation import generate_uk_crypto_tax_pdf_report
+from src.trade_store import write_trades
+from tests.test_report_generation import make_disposals
+
+
+def ms(values):
+    return (pd.to_datetime(values).astype('datetime64[ms]').astype('int64')).tolist()
+
+
+def write_futures_files(folder):
+    folder.mkdir(parents=True)
+    pd.DataFrame({
+        'symbol': 'BTCUSDT', 'time': ms(['2024-05-01 01:00', '2024-05-01 23:00', '2024-05-02 10:00']),
+        'side': 'SELL', 'realizedPnl': [10.0, -4.0, 2.5], 'commission': [0.5, 0.001, 0.25],
+        'commissionAsset': ['USDT', 'BNB', 'USDT'],
+    }).to_csv(folder / 'BTCUSDT_futures_trades.csv', index=False)
+    pd.DataFrame({
+        'symbol': ['ETHUSDT'] * 4, 'time': ms(['2024-05-01 00:00', '2024-05-01 08:00', '2024-05-01 08:00',
+                                              '2024-05-02 00:00']),
+        'incomeType': ['FUNDING_FEE', 'FUNDING_FEE', 'REALIZED_PNL', 'FUNDING_FEE'],
+        'income': [-0.25, 0.5, 99.0, -1.0], 'asset': 'USDT',
+    }).to_csv(folder / 'ETHUSDT_futures_income.csv', index=False)
+
+
+def test_futures_daily_totals_streams_files_in_chunks(tmp_path):
+    write_futures_files(tmp_path / 'futures')
+    index = PriceIndex({'BNB': pd.DataFrame({'open_time': [0], 'close': [600.0]})})
+
+    daily = futures_daily_totals(str(tmp_path / 'futures'), index, chunksize=2)
+
+    assert list(daily['symbol']) == ['BTCUSDT', 'ETHUSDT', 'BTCUSDT', 'ETHUSDT']
+    assert list(daily['day'].dt.strftime('%Y-%m-%d')) == ['2024-05-01', '2024-05-01', '2024-05-02', '2024-05-02']
+    assert list(daily['realized_pnl']) == [6.0, 0.0, 2.5, 0.0]
+    assert list(daily['commission']) == [0.5 + 0.001 * 600, 0.0, 0.25, 0.0]
+    assert list(daily['funding']) == [0.0, 0.25, 0.0, -1.0]
+
+
+def test_futures_rows_fill_other_gains(tmp_path):
+    write_futures_files(tmp_path / 'futures')
+    usd_gbp = write_price_series(str(tmp_path / 'usd_gbp'), pd.to_datetime(['2024-04-30']), [0.8])
+    futures = futures_in_gbp(futures_daily_totals(str(tmp_path / 'futures')), usd_gbp)
+
+    assert futures['market'].eq('futures').all()
+    assert futures['realized_pnl_in_gbp'].sum() == Decimal(8.5) * Decimal(0.8)
+
+    disposals = make_disposals(5)
+    disposals['profit_in_gbp'] = disposals['net_profit_in_gbp']
+    generate_uk_crypto_tax_pdf_report(pd.concat([disposals, futures], ignore_index=True),
+                                      output_path=str(tmp_path / 'report.pdf'))
+
+
+def test_futures_daily_totals_reads_fills_from_the_store(tmp_path):
+    write_futures_files(tmp_path / 'futures')
+    fills = pd.DataFrame({
+        'datetime': pd.to_datetime(['2024-05-01 01:00', '2024-05-03 09:00']), 'symbol': 'SOLUSDT', 'side': 'sell',
+        'price': 150.0, 'qty': 1.0, 'quoteQty': 150.0, 'commission': [0.1, 0.2], 'commissionAsset': 'USDT',
+        'realizedPnl': [3.0, float('nan')], 'orderId': [1, 2], 'id': [1, 2],
+    })
+    write_trades(fills, 'futures', root=str(tmp_path / 'store'))
+
+    daily = futures_daily_totals(str(tmp_path / 'futures'), store_root=str(tmp_path / 'store'))
+
+    # the store holds the futures fills, so the trade CSVs are not counted again; funding still comes from income
+    assert set(daily['symbol']) == {'SOLUSDT', 'ETHUSDT'}
+    assert daily['realized_pnl'].sum() == 3.0
+    assert round(daily['commission'].sum(), 10) == 0.3
+    assert daily['funding'].sum() == -0.75
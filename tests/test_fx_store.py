@@ -0,0 +1,57 @@
+import pandas as pd
+
+from src.fx_store import CsvFxProvider, FxProvider, FxStore
+
+
+def test_fx_store_fetches_only_missing_dates(tmp_path):
+    csv_path = tmp_path / 'usd_gbp.csv'
+    csv_path.write_text(',Date,USD_to_GBP\n,Ticker,GBPUSD=X\n'
+                        + ''.join(f'{i},{day.date()},{0.78 + i / 1000}\n'
+                                  for i, day in enumerate(pd.date_range('2024-04-01', '2024-04-30', freq='B'))))
+    provider = CsvFxProvider(str(csv_path))
+    store = FxStore(provider, root=str(tmp_path / 'fx'))
+
+    april = store.series('USD', 'GBP', '2024-04-01', '2024-04-14')
+    assert provider.calls == 1
+    # Saturday takes Friday's rate
+    assert list(april.asof(pd.to_datetime(['2024-04-05 10:00', '2024-04-06 10:00']))) == [0.784, 0.784]
+
+    # a stored range needs no provider, a longer one asks only for the new days
+    FxStore(provider, root=str(tmp_path / 'fx')).series('USD', 'GBP', '2024-04-03', '2024-04-10')
+    assert provider.calls == 1
+    longer = FxStore(provider, root=str(tmp_path / 'fx')).series('USD', 'GBP', '2024-04-01', '2024-04-30')
+    assert provider.calls == 2
+    assert len(longer) == 22
+    assert store.covered('USD', 'GBP') == [[int(pd.Timestamp('2024-04-01').timestamp() // 60),
+                                            int(pd.Timestamp('2024-05-01').timestamp() // 60) - 1]]
+
+
+class EmptyFxProvider(FxProvider):
+    """Returns no rows, as the Yahoo provider does when the download fails."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, base, quote, start, end, interval):
+        self.calls += 1
+        return pd.DataFrame({'datetime': pd.to_datetime([]), 'rate': []})
+
+
+def test_empty_response_is_fetched_again(tmp_path):
+    provider = EmptyFxProvider()
+    store = FxStore(provider, root=str(tmp_path / 'fx'))
+
+    assert len(store.series('USD', 'GBP', '2024-04-01', '2024-04-14')) == 0
+    assert store.covered('USD', 'GBP') == []
+    FxStore(provider, root=str(tmp_path / 'fx')).series('USD', 'GBP', '2024-04-01', '2024-04-14')
+    assert provider.calls == 2
+
+
+def test_days_after_the_last_rate_stay_uncovered(tmp_path):
+    csv_path = tmp_path / 'usd_gbp.csv'
+    csv_path.write_text('Date,USD_to_GBP\n2024-04-01,0.79\n2024-04-02,0.8\n')
+    store = FxStore(CsvFxProvider(str(csv_path)), root=str(tmp_path / 'fx'))
+
+    store.series('USD', 'GBP', '2024-04-01', '2024-04-10')
+    assert store.covered('USD', 'GBP') == [[int(pd.Timestamp('2024-04-01').timestamp() // 60),
+                                            int(pd.Timestamp('2024-04-03').timestamp() // 60) - 1]]
@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.gbp_conversion import add_interest_in_gbp, convert_trades_to_gbp, to_decimal
+
+
+def test_to_decimal_is_exact():
+    values = to_decimal(np.array([0.1, 0.79, 0.1, np.nan]))
+    assert values[0] == Decimal(0.1)
+    assert values[1] == Decimal(0.79)
+    assert values[2] is values[0]
+    assert values[3].is_nan()
+    assert list(to_decimal(pd.Series(['0.79', Decimal('1.5'), 0], dtype=object))) == [
+        Decimal('0.79'), Decimal('1.5'), Decimal(0)]
+
+
+def test_convert_trades_to_gbp_matches_per_cell_decimal():
+    df = pd.DataFrame({
+        'proceeds': [7.5625, 455.112, 116.7264],
+        'cost': [8.285, 498.757, 127.92],
+        'commission_usdt': [0.0, 0.0, 0.0123],
+        'commission_bnb': [7.93e-06, 0.00047754, 0.0],
+        'usd_gbp': [0.7912, 0.7912, 0.8034],
+        'bnb_usdt': [690.1, 690.1, 701.35],
+    })
+    df = convert_trades_to_gbp(df)
+
+    for row in df.itertuples():
+        usd_gbp = Decimal(row.usd_gbp)
+        proceeds_in_gbp = Decimal(row.proceeds) * usd_gbp
+        cost_in_gbp = Decimal(row.cost) * usd_gbp
+        commission_in_gbp = (Decimal(row.commission_usdt) * usd_gbp
+                             + Decimal(row.commission_bnb) * Decimal(row.bnb_usdt) * usd_gbp)
+        assert row.proceeds_in_gbp == proceeds_in_gbp
+        assert row.commission_in_gbp == commission_in_gbp
+        assert row.cost_in_gbp == cost_in_gbp + commission_in_gbp
+        assert row.net_profit_in_gbp == proceeds_in_gbp - cost_in_gbp - commission_in_gbp
+
+    df = add_interest_in_gbp(df, [Decimal('0.5'), 0, Decimal('0.25')])
+    assert df['net_profit_in_gbp'].iloc[0] == df['proceeds_in_gbp'].iloc[0] - df['cost_in_gbp'].iloc[0]
+    assert df['interest_in_gbp'].iloc[1] == 0
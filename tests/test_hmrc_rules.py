@@ -0,0 +1,16 @@
+import pandas as pd
+
+from src.hmrc_rules import RULES, classify_hmrc_rule
+
+
+def test_classify_hmrc_rule():
+    acquired = pd.Series(pd.to_datetime(['2024-05-01 09:00', '2024-05-01 23:59', '2024-05-01', '2024-05-01',
+                                         '2024-06-10', None], format='ISO8601'), index=[5, 4, 3, 2, 1, 0])
+    disposed = pd.Series(pd.to_datetime(['2024-05-01 18:00', '2024-05-02 00:01', '2024-05-31', '2024-06-01',
+                                         '2024-05-20', '2024-05-20'], format='ISO8601'), index=[5, 4, 3, 2, 1, 0])
+
+    notes = classify_hmrc_rule(acquired, disposed)
+    assert list(notes.cat.categories) == RULES
+    assert list(notes.index) == [5, 4, 3, 2, 1, 0]
+    assert notes.tolist()[:5] == ['Same Day', '30-Day Rule', '30-Day Rule', 'Section 104', '30-Day Rule']
+    assert pd.isna(notes.iloc[5])
@@ -0,0 +1,20 @@
+import json
+
+from src.instrumentation import StageTracer
+
+
+def test_stage_tracer_records_and_profiles(tmp_path):
+    tracer = StageTracer(profile_dir=str(tmp_path / 'profile'))
+    with tracer.stage('sum') as stage:
+        stage['rows'] = len([i * i for i in range(10_000)])
+    with tracer.stage('write', rows=3):
+        pass
+
+    tracer.write(str(tmp_path / 'trace.json'))
+    trace = json.loads((tmp_path / 'trace.json').read_text())
+
+    assert [s['stage'] for s in trace['stages']] == ['sum', 'write']
+    assert trace['stages'][0]['rows'] == 10_000
+    assert trace['stages'][0]['wall_s'] >= 0 and trace['stages'][0]['cpu_s'] >= 0
+    assert trace['peak_rss_mb'] > 0
+    assert sorted(p.name for p in (tmp_path / 'profile').iterdir()) == ['sum.prof', 'write.prof']
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.interest_allocation import InterestSweep, interest_per_trade, nearest, split_pair
+
+
+def test_nearest_matches_merge_asof():
+    rng = np.random.default_rng(3)
+    times = np.sort(rng.integers(0, 1000, 200))
+    targets = rng.integers(-50, 1050, 500)
+    merged = pd.merge_asof(pd.DataFrame({'t': np.sort(targets)}),
+                           pd.DataFrame({'t': times, 'pos': np.arange(len(times))}), on='t', direction='nearest')
+    assert (times[nearest(times, np.sort(targets))] == times[merged['pos'].to_numpy()]).all()
+
+
+def test_interest_stays_within_isolated_symbol_and_borrowed_asset():
+    trades = pd.DataFrame({
+        'market': ['margin', 'margin', 'spot', 'margin'],
+        'symbol': ['ETHUSDT', 'BTCUSDT', 'ETHUSDT', 'DOGEBTC'],
+        'disposal_date': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 12:00', '2025-01-01 11:00',
+                                         '2025-01-02 00:00']),
+    })
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.to_datetime(['2025-01-01 11:00', '2025-01-01 11:00', '2025-01-01 12:00',
+                                               '2025-01-03 00:00']),
+        'asset': ['USDT', 'USDT', 'BTC', 'XRP'],
+        'isolatedSymbol': ['ETHUSDT', None, None, None],
+        'interest_in_gbp': [Decimal('0.1'), Decimal('0.2'), Decimal('0.4'), Decimal('0.8')],
+    })
+
+    allocated = interest_per_trade(trades, interest)
+
+    # isolated ETHUSDT -> its only margin trade; cross USDT -> nearest USDT pair (tie goes earlier);
+    # BTC -> BTCUSDT; XRP is in no pair so it takes the nearest margin trade
+    assert list(allocated) == [Decimal('0.3'), Decimal('0.4'), Decimal(0), Decimal('0.8')]
+
+
+def test_cross_interest_paid_in_bnb_goes_to_the_borrowed_asset():
+    trades = pd.DataFrame({
+        'market': ['margin', 'margin', 'margin'],
+        'symbol': ['BNBUSDT', 'BTTCUSDT', 'ETHBTC'],
+        'disposal_date': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 20:00', '2025-01-01 11:00']),
+    })
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 11:00']),
+        'asset': ['BNB', 'BNB'],
+        'rawAsset': ['BTTC', None],
+        'interest_in_gbp': [Decimal('0.1'), Decimal('0.2')],
+    })
+
+    # BTTC was borrowed, paid in BNB: it goes to BTTCUSDT however far; no rawAsset falls back to asset
+    assert list(interest_per_trade(trades, interest)) == [Decimal('0.2'), Decimal('0.1'), Decimal(0)]
+
+
+def test_cross_interest_matches_whole_assets_not_prefixes():
+    assert split_pair('BTCDOMUSDT') == ('BTCDOM', 'USDT')
+    assert split_pair('ETHFDUSD') == ('ETH', 'FDUSD')
+    trades = pd.DataFrame({
+        'market': ['margin', 'margin', 'margin', 'margin'],
+        'symbol': ['BTCDOMUSDT', 'BTCUSDT', 'ETHFIUSDT', 'ETHUSDT'],
+        'disposal_date': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 20:00', '2025-01-01 10:00',
+                                         '2025-01-01 22:00']),
+    })
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 10:00']),
+        'asset': ['BTC', 'ETH'],
+        'interest_in_gbp': [Decimal('0.1'), Decimal('0.2')],
+    })
+
+    # BTC and ETH go to their own pairs, not the nearer BTCDOMUSDT and ETHFIUSDT that merely start with them
+    assert list(interest_per_trade(trades, interest)) == [Decimal(0), Decimal('0.1'), Decimal(0), Decimal('0.2')]
+
+
+def test_interest_sweep_over_batches_matches_whole_frame():
+    rng = np.random.default_rng(7)
+    n = 400
+    trades = pd.DataFrame({
+        'market': rng.choice(['margin', 'spot'], n, p=[0.8, 0.2]),
+        'symbol': rng.choice(['ETHUSDT', 'BTCUSDT', 'ETHBTC', 'DOGEUSDT'], n),
+        'disposal_date': pd.Timestamp('2025-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 30 * 24, n)), 'h'),
+    })
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.Timestamp('2024-12-31') + pd.to_timedelta(rng.integers(0, 33 * 24, 300), 'h'),
+        'asset': rng.choice(['USDT', 'BTC', 'XRP'], 300),
+        'isolatedSymbol': rng.choice([None, 'ETHUSDT', 'DOGEUSDT', 'ADAUSDT'], 300),
+        'interest_in_gbp': [Decimal(i) / 1000 for i in range(300)],
+    })
+
+    sweep = InterestSweep(interest)
+    for start in range(0, n, 37):
+        sweep.add(trades.iloc[start:start + 37])
+    allocated = sweep.allocation()
+
+    expected = interest_per_trade(trades, interest)
+    assert [allocated.get(i, Decimal(0)) for i in range(n)] == list(expected)
@@ -0,0 +1,138 @@
+import os
+from decimal import Decimal
+from io import StringIO
+
+import pandas as pd
+
+import main
+from src.instrumentation import StageTracer
+from src.price_cache import PriceCache
+from src.price_series import write_price_series
+from src.stage_cache import StageCache
+from tests.test_data_processing import data
+
+
+def write_symbol_files(folder, symbols):
+    folder.mkdir(parents=True)
+    trades = pd.read_csv(StringIO(data))
+    for symbol in symbols:
+        trades.assign(symbol=symbol).to_csv(folder / f"{symbol}_margin_trades.csv", index=False)
+
+
+def test_calculate_pnl_parallel_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_symbol_files(tmp_path / 'data' / 'raw' / 'margin', ['CTXCUSDT', 'ACAUSDT', 'BTTCUSDT', 'ADAUSDT'])
+    usd_gbp = write_price_series(str(tmp_path / 'usd_gbp'), pd.to_datetime(['2025-01-01']), [0.79])
+    bnb_usdt = write_price_series(str(tmp_path / 'bnb_usdt'), pd.to_datetime(['2025-01-01']), [690.0])
+
+    serial = main.calculate_pnl('margin', usd_gbp, bnb_usdt)
+    parallel = main.calculate_pnl('margin', usd_gbp, bnb_usdt, workers=2)
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert set(serial['symbol']) == {'ACAUSDT', 'ADAUSDT', 'BTTCUSDT', 'CTXCUSDT'}
+
+
+def test_chunked_report_matches_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_symbol_files(tmp_path / 'data' / 'raw' / 'margin', ['CTXCUSDT', 'ACAUSDT', 'BTTCUSDT'])
+    write_symbol_files(tmp_path / 'data' / 'raw' / 'spot', ['ADAUSDT'])
+    usd_gbp = write_price_series(str(tmp_path / 'usd_gbp'), pd.to_datetime(['2025-01-01']), [0.79])
+    bnb_usdt = write_price_series(str(tmp_path / 'bnb_usdt'), pd.to_datetime(['2025-01-01']), [690.0])
+    interest = pd.DataFrame({
+        'interestAccuredTime': pd.to_datetime(['2025-01-04 22:00', '2025-01-05 03:00', '2025-01-05 09:00']),
+        'asset': ['USDT', 'CTXC', 'USDT'],
+        'isolatedSymbol': [None, None, 'ACAUSDT'],
+        'interest_in_gbp': [Decimal('0.5'), Decimal('0.25'), Decimal('0.125')],
+    })
+
+    main.build_report(StageTracer(), usd_gbp, bnb_usdt, None, interest, pd.DataFrame())
+    with open('combined.csv', 'rb') as f:
+        in_memory = f.read()
+    # runs read a few rows at a time, so lots tied on disposal_date straddle merge steps
+    monkeypatch.setattr('src.chunked_pipeline.MIN_RUN_ROWS', 8)
+    main.build_report_chunked(StageTracer(), usd_gbp, bnb_usdt, None, interest, pd.DataFrame(), batch_rows=7)
+    with open('combined.csv', 'rb') as f:
+        chunked = f.read()
+
+    assert chunked == in_memory
+    combined = pd.read_csv('combined.csv', dtype={'interest_in_gbp': str})
+    assert pd.to_datetime(combined['disposal_date']).is_monotonic_increasing
+    assert combined['interest_in_gbp'].map(Decimal).sum() == Decimal('0.875')
+    assert os.path.exists('uk_crypto_tax_report.pdf')
+
+
+def test_pnl_per_symbol_rematches_only_changed_symbols(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_symbol_files(tmp_path / 'data' / 'raw' / 'margin', ['CTXCUSDT', 'ACAUSDT'])
+    matched = []
+    task = main.calculate_pnl_file
+    monkeypatch.setattr(main, 'calculate_pnl_file', lambda path: matched.append(os.path.basename(path)) or task(path))
+    cache = StageCache(str(tmp_path / 'cache'))
+
+    first = list(main.pnl_per_symbol('margin', cache=cache))
+    trades = pd.read_csv(tmp_path / 'data' / 'raw' / 'margin' / 'ACAUSDT_margin_trades.csv')
+    trades.iloc[:-1].to_csv(tmp_path / 'data' / 'raw' / 'margin' / 'ACAUSDT_margin_trades.csv', index=False)
+    second = list(main.pnl_per_symbol('margin', cache=cache))
+
+    assert matched == ['ACAUSDT_margin_trades.csv', 'CTXCUSDT_margin_trades.csv', 'ACAUSDT_margin_trades.csv']
+    assert second[1][1] == first[1][1]
+    assert second[0][1] != first[0][1]
+
+
+def test_read_interest_files_keeps_isolated_symbols(tmp_path):
+    pd.DataFrame({'interestAccuredTime': ['2025-01-01'], 'asset': ['USDT'], 'interest': [0.1]}).to_csv(
+        tmp_path / 'interest_margin.csv', index=False)
+    pd.DataFrame({'interestAccuredTime': ['2025-01-02'], 'asset': ['USDT'], 'interest': [0.2],
+                  'isolatedSymbol': ['ETHUSDT']}).to_csv(tmp_path / 'interest_margin_ETHUSDT.csv', index=False)
+    pd.DataFrame({'interestAccuredTime': ['2025-01-03'], 'asset': ['BTC'], 'interest': [0.3]}).to_csv(
+        tmp_path / 'interest_margin_ETHBTC.csv', index=False)
+
+    interest = main.read_interest_files(str(tmp_path))
+
+    assert list(interest['isolatedSymbol'].fillna('')) == ['', 'ETHBTC', 'ETHUSDT']
+
+
+def test_raw_commission_assets_reads_every_raw_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / 'data' / 'raw' / 'futures'
+    folder.mkdir(parents=True)
+    pd.DataFrame({'symbol': ['BTCUSDT'], 'commissionAsset': ['BNB']}).to_csv(folder / 'BTCUSDT.csv', index=False)
+    pd.DataFrame({'symbol': ['ETHUSDT'], 'commissionAsset': ['USDT']}).to_csv(folder / 'ETHUSDT_trades.csv',
+                                                                              index=False)
+    pd.DataFrame({'incomeType': ['FUNDING_FEE'], 'asset': ['USDT']}).to_csv(folder / 'income.csv', index=False)
+
+    assert main.raw_commission_assets(['futures']) == ['BNB']
+
+
+class OfflineClient:
+    def __getattr__(self, name):
+        raise AssertionError(f"the report requested {name}")
+
+
+def test_commission_price_index_only_reads_the_price_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / 'data' / 'raw' / 'spot'
+    folder.mkdir(parents=True)
+    pd.DataFrame({'symbol': ['ETHBTC', 'ADABTC'], 'commissionAsset': ['ETH', 'ADA']}).to_csv(
+        folder / 'ETHBTC.csv', index=False)
+    cache = PriceCache(root=str(tmp_path / 'prices'))
+    start_ms, end_ms = main.exchange.price_period()
+    cache.add('ETHUSDT', [[start_ms, '', '', '', '3000.0']], start_ms, end_ms)
+    monkeypatch.setattr(main.exchange, 'price_cache', cache)
+    monkeypatch.setattr(main.exchange, 'client', OfflineClient())
+
+    index = main.commission_price_index(['spot'], cache.load('BNBUSDT'))
+
+    assert index.assets == ['ADA', 'BNB', 'ETH']
+    assert list(index.rates(['ETH', 'ADA'], pd.to_datetime([main.end_time] * 2))[:1]) == [3000.0]
+    assert 'ADA are not cached' in capsys.readouterr().out
+
+
+def test_chunked_report_for_a_year_without_disposals(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    usd_gbp = write_price_series(str(tmp_path / 'usd_gbp'), pd.to_datetime(['2025-01-01']), [0.79])
+    interest = pd.DataFrame({'interestAccuredTime': pd.to_datetime([]), 'asset': [], 'interest_in_gbp': []})
+
+    main.build_report_chunked(StageTracer(), usd_gbp, usd_gbp, None, interest, pd.DataFrame())
+
+    assert os.path.exists('uk_crypto_tax_report.pdf')
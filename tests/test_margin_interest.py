@@ -1,5 +1,6 @@
 import pandas as pd
 from exchanges.binance import BinanceExchange
+from src.sync_manifest import SyncManifest
 
 
 import random
@@ -91,4 +92,70 @@ def test_margin_interest_pagination():
     df = ex.get_margin_interest_history_all_year()
     # Assertions
     assert isinstance(df, pd.DataFrame)
-    assert len(df) == 720
\ No newline at end of file
+    assert len(df) == 720
+
+class StubIsolatedSpot:
+    """exchange_info with three margin pairs; one interest record a day for the pairs in `borrowed`."""
+
+    def __init__(self, borrowed):
+        self.borrowed = borrowed
+        self.calls = []
+
+    def exchange_info(self):
+        return {"symbols": [
+            {"symbol": "ETHUSDT", "quoteAsset": "USDT", "isMarginTradingAllowed": True},
+            {"symbol": "DOGEUSDT", "quoteAsset": "USDT", "isMarginTradingAllowed": True},
+            {"symbol": "XYZUSDT", "quoteAsset": "USDT", "isMarginTradingAllowed": False},
+            {"symbol": "ETHBTC", "quoteAsset": "BTC", "isMarginTradingAllowed": True},
+        ]}
+
+    def margin_interest_history(self, isolatedSymbol=None, startTime=None, endTime=None, current=1, size=100):
+        self.calls.append((isolatedSymbol, startTime))
+        if isolatedSymbol not in self.borrowed:
+            return {"total": 0, "rows": []}
+        days = range(startTime // 86_400_000 * 86_400_000, endTime + 1, 86_400_000)
+        rows = [{"txId": ts, "interestAccuredTime": ts, "asset": "USDT", "rawAsset": "USDT",
+                 "principal": "100", "interest": "0.01", "interestRate": "0.0001", "type": "PERIODIC"}
+                for ts in days if ts >= startTime]
+        return {"total": len(rows), "rows": rows[(current - 1) * size:current * size]}
+
+
+def test_isolated_interest_syncs_symbols_from_exchange_info(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2025-04-05")
+    ex.client = StubIsolatedSpot(borrowed={"ETHUSDT"})
+
+    assert ex.get_all_isolated_margin_interest_history_all_year(workers=2) == {"DOGEUSDT": 0, "ETHUSDT": 365}
+    df = pd.read_csv(tmp_path / "data/raw/interest/interest_margin_ETHUSDT.csv")
+    assert len(df) == 365 and df["txId"].is_unique and set(df["isolatedSymbol"]) == {"ETHUSDT"}
+    assert not (tmp_path / "data/raw/interest/interest_margin_DOGEUSDT.csv").exists()
+
+    # a second run resumes after the stored windows and requests nothing
+    calls = len(ex.client.calls)
+    assert ex.get_all_isolated_margin_interest_history_all_year() == {"DOGEUSDT": 0, "ETHUSDT": 0}
+    assert len(ex.client.calls) == calls
+
+
+def test_margin_interest_returns_every_window(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2025-04-05")
+    ex.client = StubIsolatedSpot(borrowed={None})
+
+    df = ex.get_margin_interest_history_all_year()
+
+    assert len(df) == 365 and df["txId"].is_unique
+    assert len(ex.client.calls) == 13  # one request per 30 day window
+    assert len(pd.read_csv(tmp_path / "data/raw/interest/interest_margin.csv")) == 365
+
+
+def test_interest_sync_stops_at_now(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    today = pd.Timestamp.now().normalize()
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time=(today - pd.Timedelta(days=40)).strftime("%Y-%m-%d"),
+                         end_time=(today + pd.Timedelta(days=100)).strftime("%Y-%m-%d"))
+    ex.client = StubIsolatedSpot(borrowed={None})
+
+    ex.sync_margin_interest()
+
+    assert len(ex.client.calls) == 2
+    assert SyncManifest("interest").get("CROSS")["synced_until"] < time.time() * 1000
@@ -0,0 +1,80 @@
+import math
+
+import pandas as pd
+
+from exchanges.binance import BinanceExchange
+from src.price_cache import MINUTE_MS, PriceCache, missing_ranges
+
+
+class StubKlines:
+    """klines of GET /api/v3/klines with a close equal to the minute index."""
+
+    def __init__(self):
+        self.calls = []
+
+    def klines(self, symbol, interval, startTime, endTime, limit):
+        self.calls.append((startTime, endTime))
+        first = -(-startTime // MINUTE_MS)
+        last = min(endTime // MINUTE_MS, first + limit - 1)
+        return [[m * MINUTE_MS, '0', '0', '0', str(float(m)), '0'] for m in range(first, last + 1)]
+
+
+def test_missing_ranges():
+    assert missing_ranges([], 0, 99) == [[0, 99]]
+    assert missing_ranges([[10, 19], [40, 49]], 0, 99) == [[0, 9], [20, 39], [50, 99]]
+    assert missing_ranges([[0, 99]], 10, 20) == []
+
+
+def test_prices_at_is_backward_as_of(tmp_path):
+    cache = PriceCache(root=str(tmp_path))
+    cache.add('BNBUSDT', [[0, '', '', '', '1.5'], [MINUTE_MS, '', '', '', '2.5']], 0, 2 * MINUTE_MS - 1)
+
+    prices = cache.prices_at('BNBUSDT', [-1, 0, 59_999, MINUTE_MS, 10 * MINUTE_MS])
+    assert math.isnan(prices[0])
+    assert list(prices[1:]) == [1.5, 1.5, 2.5, 2.5]
+    assert PriceCache(root=str(tmp_path)).covered('BNBUSDT') == [[0, 2 * MINUTE_MS - 1]]
+
+
+def test_get_price_minute_fetches_only_gaps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-06")
+    ex.client = StubKlines()
+
+    df = ex.get_price_minute('BNB', 'USDT')
+    assert len(df) == 1440
+    assert len(ex.client.calls) == 2
+    assert len(pd.read_csv(tmp_path / 'data' / 'bnb_usdt.csv', index_col=0)) == 1440
+
+    ex.client = StubKlines()
+    ex.get_price_minute('BNB', 'USDT')
+    assert ex.client.calls == []
+
+    ex.end_time = "2024-04-07"
+    assert len(ex.get_price_minute('BNB', 'USDT')) == 2880
+    day_two = int(pd.Timestamp("2024-04-07").timestamp() * 1000)
+    assert ex.client.calls[0][0] == day_two
+
+
+class InvalidSymbolKlines(StubKlines):
+    """klines answering like Binance for a pair it does not list."""
+
+    def klines(self, symbol, interval, startTime, endTime, limit):
+        self.calls.append((startTime, endTime))
+        error = Exception('APIError(code=-1121): Invalid symbol.')
+        error.error_code = -1121
+        raise error
+
+
+def test_invalid_symbol_is_not_fetched_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-06")
+    ex.client = InvalidSymbolKlines()
+
+    ex.cache_price_minute('LUNA', 'USDT')
+    assert len(ex.client.calls) == 1
+    assert PriceCache().is_unavailable('LUNAUSDT')
+
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-06")
+    ex.client = InvalidSymbolKlines()
+    ex.cache_price_minute('LUNA', 'USDT')
+    assert ex.client.calls == []
@@ -0,0 +1,32 @@
+import math
+import pickle
+
+import pandas as pd
+
+from src.price_series import series_from_csv, write_price_series
+
+
+def test_asof_matches_merge_asof_backward(tmp_path):
+    prices = pd.DataFrame({'datetime': pd.to_datetime(['2025-01-01 00:02', '2025-01-01 00:00', '2025-01-01 00:05']),
+                           'close': [2.0, 1.0, 3.0]})
+    series = write_price_series(str(tmp_path / 'bnb_usdt'), prices['datetime'], prices['close'])
+    lookups = pd.DataFrame({'t': pd.to_datetime(['2024-12-31 23:59', '2025-01-01 00:01:30', '2025-01-01 00:02',
+                                                 '2025-01-02'], format='ISO8601')}).astype('datetime64[ns]')
+
+    expected = pd.merge_asof(lookups, prices.sort_values('datetime').astype({'datetime': 'datetime64[ns]'}),
+                             left_on='t', right_on='datetime', direction='backward')['close']
+    result = series.asof(lookups['t'])
+    assert math.isnan(result[0])
+    assert list(result[1:]) == list(expected[1:])
+
+    # pickles by path, so pool workers map the same files
+    assert list(pickle.loads(pickle.dumps(series)).asof(lookups['t'])[1:]) == list(result[1:])
+
+
+def test_series_from_csv_skips_unparsable_rows(tmp_path):
+    csv_path = tmp_path / 'usd_gbp.csv'
+    csv_path.write_text(',Date,USD_to_GBP\n0,Ticker,GBPUSD=X\n1,2025-01-02,0.8\n2,2025-01-03,0.81\n')
+
+    series = series_from_csv(str(csv_path), 'Date', 'USD_to_GBP', root=str(tmp_path / 'series'))
+    assert len(series) == 2
+    assert list(series.asof(pd.to_datetime(['2025-01-02 12:00', '2025-01-05 00:00']))) == [0.8, 0.81]
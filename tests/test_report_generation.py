@@ -0,0 +1,35 @@
+import re
+
+import pandas as pd
+
+from src.report_generation import DATA_ROW_HEIGHT, HEADER_ROW_HEIGHT, DisposalTable, generate_uk_crypto_tax_pdf_report
+
+
+def make_disposals(n):
+    times = pd.date_range('2024-05-01', periods=n, freq='h')
+    return pd.DataFrame({
+        'exchange': 'BINANCE', 'market': 'margin', 'disposal_date': times, 'acquired_date': times,
+        'asset': 'CTXC', 'amount': 25.0, 'proceeds_in_gbp': 6.0, 'cost_in_gbp': 5.5,
+        'net_profit_in_gbp': 0.5, 'notes': 'Same Day',
+    })
+
+
+def test_disposal_table_splits_a_page_at_a_time():
+    table = DisposalTable(make_disposals(100), 0, [''] * 11)
+    page, rest = table.split(540, HEADER_ROW_HEIGHT + 10.5 * DATA_ROW_HEIGHT)
+
+    assert len(page._cellvalues) == 11  # header and 10 disposals
+    assert rest.start == 10
+
+    # the last disposal stays with the totals row
+    last_page, last_rest = DisposalTable(make_disposals(100), 90, [''] * 11).split(540, 10_000)
+    assert last_rest.start == 99
+
+
+def test_report_builds(tmp_path):
+    path = tmp_path / 'report.pdf'
+    df = make_disposals(250)
+    df['profit_in_gbp'] = df['net_profit_in_gbp']
+    generate_uk_crypto_tax_pdf_report(df, output_path=str(path))
+    # summary page plus 250 disposals at roughly 24 a page
+    assert len(re.findall(rb'/Type /Page\b', path.read_bytes())) == 12
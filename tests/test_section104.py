@@ -0,0 +1,63 @@
+import pandas as pd
+
+from src.price_series import write_price_series
+from src.section104 import Section104Pool, section104_disposals
+
+
+def fills(rows, usd_gbp=1.0):
+    return pd.DataFrame(rows, columns=['datetime', 'asset', 'side', 'qty', 'price']).assign(usd_gbp=usd_gbp)
+
+
+TRADES = fills([
+    ('2024-04-10 09:00', 'BTC', 'buy', 100, 1.0),
+    ('2024-04-20 09:00', 'BTC', 'buy', 100, 2.0),
+    ('2024-04-20 10:00', 'ETH', 'buy', 10, 5.0),
+    ('2024-06-01 09:00', 'BTC', 'sell', 50, 3.0),
+    ('2024-06-01 15:00', 'BTC', 'buy', 20, 2.5),
+    ('2024-06-11 09:00', 'BTC', 'buy', 10, 4.0),
+    ('2024-08-01 09:00', 'ETH', 'sell', 4, 6.0),
+])
+
+
+def test_same_day_then_30_days_then_pool():
+    result = section104_disposals(TRADES)
+    rows = [(r.asset, r.rule, r.qty, r.proceeds, r.cost) for r in result.itertuples()]
+
+    assert rows == [
+        ('BTC', 'Same Day', 20, 60.0, 50.0),
+        ('BTC', '30-Day Rule', 10, 30.0, 40.0),
+        ('BTC', 'Section 104', 20, 60.0, 30.0),
+        ('ETH', 'Section 104', 4, 24.0, 20.0),
+    ]
+    assert str(result.loc[1, 'acquired_date'].date()) == '2024-06-11'
+
+
+def test_streamed_fills_match_one_pass():
+    pool = Section104Pool()
+    parts = [pool.add_fills(TRADES.iloc[start:start + 2]) for start in range(0, len(TRADES), 2)]
+    streamed = pd.concat(parts + [pool.finish()], ignore_index=True)
+
+    pd.testing.assert_frame_equal(streamed, section104_disposals(TRADES))
+    # 200 bought into the pool, 20 of them sold
+    assert pool.holding('BTC') == (180.0, 270.0)
+    assert pool.holding('ETH') == (6.0, 30.0)
+
+
+def test_pool_cost_is_gbp_at_each_acquisition_date(tmp_path):
+    usd_gbp = write_price_series(str(tmp_path / 'usd_gbp'), pd.to_datetime(['2024-04-10', '2024-04-20', '2024-06-01']),
+                                 [0.8, 0.75, 0.7])
+    trades = pd.DataFrame([
+        ('2024-04-10 09:00', 'BTC', 'buy', 100, 1.0),
+        ('2024-04-20 09:00', 'BTC', 'buy', 100, 2.0),
+        ('2024-06-01 09:00', 'BTC', 'sell', 50, 3.0),
+    ], columns=['datetime', 'asset', 'side', 'qty', 'price'])
+
+    result = section104_disposals(trades, usd_gbp)
+
+    # pool: 100 x $1 x 0.8 + 100 x $2 x 0.75 = GBP 230 for 200; a quarter of it is GBP 57.50, not
+    # the USD cost of $75 at the disposal's 0.7 (GBP 52.50)
+    row = result.iloc[0]
+    assert (row.rule, row.qty) == ('Section 104', 50)
+    assert round(row.proceeds, 10) == 105.0
+    assert round(row.cost, 10) == 57.5
+    assert round(row.gain_loss, 10) == 47.5
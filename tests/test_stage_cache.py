@@ -0,0 +1,48 @@
+import hashlib
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.price_series import write_price_series
+from src.stage_cache import StageCache, file_digest, fingerprint, folder_digest
+
+
+def test_fingerprint_follows_content(tmp_path):
+    series = write_price_series(str(tmp_path / 'a'), pd.to_datetime(['2025-01-01']), [0.79])
+    same = write_price_series(str(tmp_path / 'b'), pd.to_datetime(['2025-01-01']), [0.79])
+    other = write_price_series(str(tmp_path / 'a'), pd.to_datetime(['2025-01-01']), [0.8])
+    frame = pd.DataFrame({'interest_in_gbp': [Decimal('0.1'), Decimal('0.2')]})
+
+    assert fingerprint(frame, np.arange(3)) == fingerprint(frame.copy(), np.arange(3))
+    assert fingerprint(frame) != fingerprint(frame.iloc[::-1])
+    assert fingerprint(series.times, series.closes) == fingerprint(same.times, same.closes)
+    assert fingerprint(series.closes) != fingerprint(other.closes)
+    assert fingerprint(['a', 'b']) != fingerprint('ab')
+
+    (tmp_path / 'trades').mkdir()
+    (tmp_path / 'trades' / 'x.csv').write_text('1')
+    before = folder_digest(str(tmp_path / 'trades'))
+    (tmp_path / 'trades' / 'x.csv').write_text('2')
+    assert folder_digest(str(tmp_path / 'trades')) != before
+    assert file_digest(str(tmp_path / 'trades' / 'x.csv')) == hashlib.blake2b(b'2', digest_size=16).hexdigest()
+
+
+def test_stage_cache_recomputes_only_on_new_key(tmp_path):
+    cache = StageCache(str(tmp_path / 'cache'))
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return pd.DataFrame({'cost_in_gbp': [Decimal(value) / 3]})
+
+    first = cache.get('gbp/margin', 'k1', lambda: compute(1))
+    again = StageCache(str(tmp_path / 'cache')).get('gbp/margin', 'k1', lambda: compute(1))
+    pd.testing.assert_frame_equal(first, again)
+    assert calls == [1]
+
+    cache.get('gbp/margin', 'k2', lambda: compute(2))
+    assert calls == [1, 2]
+    # the stage keeps only its latest result
+    assert not cache.has('gbp/margin', 'k1')
+    assert cache.misses == {'gbp/margin'}
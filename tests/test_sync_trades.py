@@ -0,0 +1,165 @@
+import time
+
+import pandas as pd
+
+from exchanges.binance import BinanceExchange, binance_fill_batch
+from src.data_processing import calculate_pnl_fills
+from src.sync_manifest import SyncManifest
+from src.trade_store import read_trades, write_trades
+
+DAY_MS = 86_400_000
+
+
+def make_trades(first_id, start_ms, count, step_ms=1_000):
+    return [
+        {
+            "symbol": "CTXCUSDT", "id": first_id + i, "orderId": 1000 + (first_id + i) // 10,
+            "price": "0.3025", "qty": "25.0", "quoteQty": "7.5625", "commission": "0.00000793",
+            "commissionAsset": "BNB", "time": start_ms + i * step_ms, "isBuyer": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+class StubSpot:
+    """my_trades with the startTime/endTime and fromId paging of GET /api/v3/myTrades."""
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.calls = []
+
+    def my_trades(self, symbol, limit=500, fromId=None, startTime=None, endTime=None):
+        self.calls.append({"fromId": fromId, "startTime": startTime, "endTime": endTime})
+        rows = self.trades
+        if fromId is not None:
+            rows = [t for t in rows if t["id"] >= fromId]
+        if startTime is not None:
+            rows = [t for t in rows if startTime <= t["time"] <= endTime]
+        return rows[:limit]
+
+
+def test_sync_trades_resumes_from_high_water_mark(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-15")
+    year_start = int(pd.Timestamp("2024-04-06").timestamp() * 1000)
+
+    trades = make_trades(1, year_start + 2 * DAY_MS, 3) + make_trades(4, year_start + 4 * DAY_MS, 1500)
+    ex.client = StubSpot(trades)
+
+    assert ex.sync_trades("spot", "CTXCUSDT") == 1503
+    # three day windows to find the first fill, then fromId pages
+    assert [call["fromId"] is None for call in ex.client.calls] == [True, True, True, False, False]
+    assert SyncManifest("spot").get("CTXCUSDT")["last_id"] == 1503
+
+    ex.client = StubSpot(trades + make_trades(1504, year_start + 7 * DAY_MS, 10))
+    assert ex.sync_trades("spot", "CTXCUSDT") == 10
+    assert ex.client.calls == [{"fromId": 1504, "startTime": None, "endTime": None}]
+
+    stored = read_trades("spot", symbol="CTXCUSDT")
+    assert len(stored) == 1513
+    assert stored["id"].is_unique
+
+
+def test_sync_trades_without_fills_keeps_window_mark(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-08")
+    ex.client = StubSpot([])
+
+    assert ex.sync_trades("spot", "ACAUSDT") == 0
+    assert len(ex.client.calls) == 3
+
+    ex.client = StubSpot([])
+    ex.sync_trades("spot", "ACAUSDT")
+    assert ex.client.calls == []
+
+
+def test_sync_trades_resumes_after_fills_stored_by_a_full_fetch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-15")
+    year_start = int(pd.Timestamp("2024-04-06").timestamp() * 1000)
+    trades = make_trades(1, year_start + DAY_MS, 20)
+    write_trades(binance_fill_batch(trades, "CTXCUSDT").to_pandas(), "spot")
+
+    ex.client = StubSpot(trades + make_trades(21, year_start + 3 * DAY_MS, 5))
+    assert ex.sync_trades("spot", "CTXCUSDT") == 5
+    assert ex.client.calls == [{"fromId": 21, "startTime": None, "endTime": None}]
+    assert len(read_trades("spot", symbol="CTXCUSDT")) == 25
+
+
+def test_sync_trades_stops_windows_at_now(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    today = pd.Timestamp.now().normalize()
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time=(today - pd.Timedelta(days=2)).strftime("%Y-%m-%d"),
+                         end_time=(today + pd.Timedelta(days=30)).strftime("%Y-%m-%d"))
+    ex.client = StubSpot([])
+
+    ex.sync_trades("spot", "ACAUSDT")
+    assert len(ex.client.calls) == 3
+    assert SyncManifest("spot").get("ACAUSDT")["synced_until"] < time.time() * 1000
+
+
+def test_get_spot_trades_probes_first_fill(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2025-04-05")
+    year_start = int(pd.Timestamp("2024-04-06").timestamp() * 1000)
+
+    # first fill inside the year: one probe, then id pages instead of 365 day windows
+    ex.client = StubSpot(make_trades(1, year_start + 100 * DAY_MS, 1200))
+    df = ex.get_spot_trades("CTXCUSDT", "2024-04-06", "2025-04-05")
+    assert len(df) == 1200
+    assert len(ex.client.calls) == 3
+
+    # never traded: the probe alone answers
+    ex.client = StubSpot([])
+    assert ex.get_spot_trades("CTXCUSDT", "2024-04-06", "2025-04-05").empty
+    assert len(ex.client.calls) == 1
+
+
+def test_fetch_trades_yields_normalized_batches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("exchanges.binance.time.sleep", lambda seconds: None)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2025-04-05")
+    year_start = int(pd.Timestamp("2024-04-06").timestamp() * 1000)
+    ex.client = StubSpot(make_trades(1, year_start + DAY_MS, 10))
+
+    batches = list(ex.fetch_trades(["CTXCUSDT"], "2024-04-06", "2025-04-05"))
+    assert [batch.schema for batch in batches] == [ex.schema]
+
+    df = ex.get_trades("CTXCUSDT", "2024-04-06", "2025-04-05")
+    assert list(df["side"][:2]) == ["buy", "sell"]
+    assert df["price"].iloc[0] == 0.3025 and df["realizedPnl"].isna().all()
+
+    lots, summary = calculate_pnl_fills(batches)
+    assert len(lots) == 5 and summary["symbol"] == "CTXCUSDT"
+
+
+class StubFutures:
+    """get_account_trades of GET /fapi/v1/userTrades, fills carrying side and realizedPnl."""
+
+    def __init__(self, trades):
+        self.trades = trades
+
+    def get_account_trades(self, symbol, startTime, endTime, limit):
+        return [t for t in self.trades if startTime <= t["time"] <= endTime][:limit]
+
+
+def test_get_futures_trades_stores_normalized_fills(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ex = BinanceExchange(api_key="X", api_secret="Y", start_time="2024-04-06", end_time="2024-04-15")
+    year_start = int(pd.Timestamp("2024-04-06").timestamp() * 1000)
+    trades = [{**{k: v for k, v in t.items() if k != "isBuyer"}, "side": "BUY" if t["isBuyer"] else "SELL",
+               "realizedPnl": "0.5"} for t in make_trades(1, year_start + DAY_MS, 4)]
+    ex.futures_client = StubFutures(trades)
+
+    df = ex.get_futures_trades("CTXCUSDT")
+    assert list(df["side"]) == ["buy", "sell", "buy", "sell"]
+    assert (df["realizedPnl"] == 0.5).all()
+
+    stored = read_trades("futures", symbol="CTXCUSDT")
+    assert list(stored["id"]) == [1, 2, 3, 4]
+    assert stored["realizedPnl"].sum() == 2.0
@@ -0,0 +1,60 @@
+from io import StringIO
+
+import pandas as pd
+
+from src.data_processing import calculate_pnl_2, calculate_pnl_stored
+from src.trade_store import list_symbols, read_trades, write_trades
+from tests.test_data_processing import data
+
+
+def test_write_and_read_trades(tmp_path):
+    trades = pd.read_csv(StringIO(data))
+    write_trades(trades, 'margin', root=str(tmp_path))
+    write_trades(trades.assign(symbol='ACAUSDT'), 'margin', root=str(tmp_path))
+
+    assert list_symbols('margin', root=str(tmp_path)) == ['ACAUSDT', 'CTXCUSDT']
+    assert sorted(p.name for p in (tmp_path / 'market=margin' / 'symbol=CTXCUSDT').iterdir()) == [
+        'month=2025-01', 'month=2025-02']
+
+    stored = read_trades('margin', symbol='CTXCUSDT', root=str(tmp_path))
+    assert len(stored) == len(trades)
+    assert stored['datetime'].dtype.kind == 'M'
+    assert stored['qty'].dtype == 'float64'
+    assert stored['orderId'].dtype == 'int64'
+
+    # writing a month again replaces it instead of appending
+    write_trades(trades, 'margin', root=str(tmp_path))
+    assert len(read_trades('margin', symbol='CTXCUSDT', root=str(tmp_path))) == len(trades)
+
+    january = read_trades('margin', symbol='CTXCUSDT', columns=['datetime', 'qty'],
+                          start='2025-01-01', end='2025-01-31', root=str(tmp_path))
+    assert list(january.columns) == ['datetime', 'qty']
+    assert len(january) == (pd.to_datetime(trades['datetime']) < '2025-02-01').sum()
+
+
+def test_write_trades_keeps_the_rest_of_a_month(tmp_path):
+    def fills(ids, days):
+        return pd.DataFrame({'datetime': [f'2024-04-{day:02d}' for day in days], 'symbol': 'BNBUSDT', 'id': ids,
+                             'orderId': ids, 'side': 'buy', 'price': 1.0, 'qty': 1.0, 'quoteQty': 1.0,
+                             'commission': 0.0, 'commissionAsset': 'BNB'})
+
+    # the 2023 tax year's fetch, then the 2024 year's from the 6th, overlapping on the 5th
+    write_trades(fills([1, 2, 3], [2, 4, 5]), 'spot', root=str(tmp_path))
+    write_trades(fills([3, 4], [5, 10]), 'spot', root=str(tmp_path))
+
+    stored = read_trades('spot', symbol='BNBUSDT', root=str(tmp_path))
+    assert list(stored['id']) == [1, 2, 3, 4]
+    assert list(stored['datetime'].dt.day) == [2, 4, 5, 10]
+
+
+def test_calculate_pnl_stored_matches_csv(tmp_path, monkeypatch):
+    trades = pd.read_csv(StringIO(data))
+    write_trades(trades, 'margin', root=str(tmp_path))
+    monkeypatch.setattr('src.data_processing.read_trades',
+                        lambda *args, **kwargs: read_trades(*args, root=str(tmp_path), **kwargs))
+
+    result, summary = calculate_pnl_stored('margin', 'CTXCUSDT')
+    expected, expected_summary = calculate_pnl_2(trades)
+
+    assert result == expected
+    assert summary == expected_summary
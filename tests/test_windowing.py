@@ -0,0 +1,65 @@
+import pytest
+
+from exchanges.windowing import DAY_MS, WindowFetchError, fetch_adaptive
+
+
+def make_fetch(rows, limit, calls):
+    def fetch(start_ms, end_ms):
+        calls.append((start_ms, end_ms))
+        return [row for row in rows if start_ms <= row['time'] <= end_ms][:limit]
+    return fetch
+
+
+def test_quiet_range_needs_few_requests():
+    calls = []
+    rows = [{'id': 1, 'time': 200 * DAY_MS + 5}]
+    result = fetch_adaptive(make_fetch(rows, 10, calls), 0, 365 * DAY_MS - 1, 10, 30 * DAY_MS)
+
+    assert result == rows
+    assert len(calls) == 13
+
+
+def test_full_pages_split_the_window():
+    calls = []
+    rows = [{'id': i, 'time': 1000 * i} for i in range(25)]
+    result = fetch_adaptive(make_fetch(rows, 10, calls), 0, DAY_MS - 1, 10, DAY_MS, min_window_ms=1000)
+
+    assert [row['id'] for row in result] == list(range(25))
+    assert any(end - start + 1 < DAY_MS for start, end in calls)
+
+
+def test_busy_minute_pages_on_by_time():
+    calls = []
+    rows = [{'id': i, 'time': 500 + i // 4} for i in range(30)]
+    result = fetch_adaptive(make_fetch(rows, 10, calls), 0, 59_999, 10, 60_000)
+
+    assert [row['id'] for row in result] == list(range(30))
+
+
+def test_busy_millisecond_pages_on_by_id():
+    calls = []
+    rows = [{'id': i, 'time': 500} for i in range(10)] + [{'id': 10, 'time': 900}]
+
+    def fetch_from_id(from_id):
+        return [row for row in rows if row['id'] >= from_id][:3]
+
+    result = fetch_adaptive(make_fetch(rows, 3, calls), 0, 59_999, 3, 60_000, fetch_from_id=fetch_from_id)
+    assert [row['id'] for row in result] == list(range(11))
+
+    # without an id endpoint the millisecond cannot be finished, so it is not skipped either
+    with pytest.raises(WindowFetchError) as error:
+        fetch_adaptive(make_fetch(rows, 3, []), 0, 59_999, 3, 60_000)
+    assert error.value.start_ms == 500
+
+
+def test_failing_window_raises():
+    calls = []
+    rows = [{'id': 1, 'time': 5}, {'id': 2, 'time': 40 * DAY_MS}]
+    fetch = make_fetch(rows, 10, calls)
+
+    def flaky(start_ms, end_ms):
+        return None if start_ms <= 35 * DAY_MS <= end_ms else fetch(start_ms, end_ms)
+
+    with pytest.raises(WindowFetchError) as error:
+        fetch_adaptive(flaky, 0, 60 * DAY_MS - 1, 10, 30 * DAY_MS)
+    assert error.value.start_ms == 30 * DAY_MS